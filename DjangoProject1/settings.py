@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Nombre et durée des requêtes par vue (voir templates_app/metrics.py)
+    'templates_app.metrics.MetricsMiddleware',
+    # Compte aussi les requêtes des sessions et de l'authentification
+    'templates_app.instrumentation.QueryBudgetMiddleware',
+    # Juste après : reprend le temps SQL mesuré ci-dessus (en-tête Server-Timing)
+    'templates_app.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +57,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Après l'authentification : profilage à la demande du staff (jeton signé)
+    'templates_app.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'DjangoProject1.urls'
@@ -80,6 +89,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Les workers (manage.py run_workers) écrivent en même temps que le
+        # serveur web : attendre le verrou SQLite plutôt qu'échouer aussitôt
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
@@ -178,6 +192,84 @@ MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
+# Configuration du cache
+# Le rendu des documents est mis en cache dans l'alias RENDERED_DOCUMENT_CACHE_ALIAS.
+# LocMemCache par défaut ; pour partager le cache entre workers, utiliser par exemple :
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR / 'cache' / 'rendered_documents',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'rendered_documents': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rendered-documents',
+        'TIMEOUT': 60 * 60 * 24,  # 24 heures
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+RENDERED_DOCUMENT_CACHE_ALIAS = 'rendered_documents'
+
+# Rendu PDF dans un pool de processus (voir templates_app/pdf_service.py)
+# 0 = rendu dans le processus web, sans pool. Le pool existe dans CHAQUE
+# processus web : N workers gunicorn démarrent N x PDF_RENDER_WORKERS
+# processus de rendu. Garder une petite valeur (≈ cœurs / workers web).
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_START_METHOD = 'spawn'
+PDF_RENDER_TIMEOUT = 120  # secondes
+
+# Cache disque des fichiers exportés (voir templates_app/export_store.py)
+EXPORT_CACHE_ENABLED = True
+EXPORT_CACHE_DIR = MEDIA_ROOT / 'export_cache'
+EXPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 Mo
+# Attente maximale du verrou d'un export en cours ailleurs, puis rendu sans verrou
+EXPORT_LOCK_TIMEOUT = 30  # secondes
+# Un export en cours d'écriture passe de la mémoire à un fichier temporaire
+# au-delà de cette taille (voir templates_app/exports.py)
+EXPORT_SPOOL_MAX_SIZE = 1024 * 1024  # 1 Mo
+
+# Moteur DOCX : 'xml' (écriture directe, voir templates_app/docx_writer.py)
+# ou 'python-docx' (modèle objet, plus lent sur les longues lettres)
+DOCX_ENGINE = 'xml'
+
+# Rendu en flux (voir templates_app/rendering.py) : au-delà de ce nombre de
+# caractères rendus, le détail et l'export HTML d'un document sont diffusés
+# par morceaux (StreamingHttpResponse) au lieu d'être construits en entier
+STREAMING_RENDER_THRESHOLD = 1024 * 1024
+
+# Budgets de requêtes SQL par nom d'URL (voir templates_app/instrumentation.py),
+# ajoutés aux budgets par défaut. Dépassements et N+1 sont journalisés ;
+# en mode strict (activé par les tests) ils font échouer la requête.
+QUERY_BUDGETS = {}
+QUERY_BUDGET_STRICT = False
+
+# Durée des étapes de chaque requête : en-tête Server-Timing et une ligne de
+# journal par requête plus longue que SERVER_TIMING_LOG_MIN_MS
+# (voir templates_app/timing.py)
+SERVER_TIMING = True
+SERVER_TIMING_LOG_MIN_MS = 250
+
+# Métriques exposées sur /metrics (voir templates_app/metrics.py). Avec
+# plusieurs workers, METRICS_DIR est un répertoire partagé par les processus,
+# vidé à chaque déploiement. Accès : staff connecté ou en-tête
+# "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Profilage à la demande (voir templates_app/profiling.py) : jetons sur
+# /admin/profiles/, rapports hors de MEDIA_ROOT (non servis publiquement)
+PROFILING_ENABLED = True
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_TOKEN_MAX_AGE = 3600  # 1 heure
+PROFILING_MAX_REPORTS = 50
+
+# Fichiers des tâches en arrière-plan (CSV déposés, archives produites) :
+# données personnelles, hors de MEDIA_ROOT, servies seulement par job_download
+JOBS_DIR = BASE_DIR / 'jobs'
+
 # Configuration de session
 SESSION_COOKIE_AGE = 86400  # 24 heures
 SESSION_SAVE_EVERY_REQUEST = True
@@ -202,5 +294,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'templates_app.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 from django.shortcuts import redirect
 from django.http import HttpResponse
+from templates_app import views as templates_views
 
 
 def home_redirect(request):
@@ -30,7 +31,9 @@ def test_view(request):
 
 
 urlpatterns = [
-    # Administration Django
+    # Administration Django (les pages ajoutées avant le catch-all de l'admin)
+    path('admin/profiles/', templates_views.profile_list, name='admin_profiles'),
+    path('admin/profiles/<str:filename>', templates_views.profile_download, name='admin_profile_download'),
     path('admin/', admin.site.urls),
 
     # Vue de test
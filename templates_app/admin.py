@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Template, TemplateField, Document, DocumentFieldValue, TemplateCategory
+from .models import Template, TemplateField, Document, DocumentFieldValue, TemplateCategory, Job
 
 @admin.register(TemplateCategory)
 class TemplateCategoryAdmin(admin.ModelAdmin):
@@ -23,3 +23,8 @@ class DocumentAdmin(admin.ModelAdmin):
     list_filter = ['template', 'is_completed', 'created_at']
     search_fields = ['title']
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'state', 'created_by', 'progress', 'total', 'created_at', 'finished_at']
+    list_filter = ['kind', 'state', 'created_at']
+    readonly_fields = ['worker', 'started_at', 'finished_at']
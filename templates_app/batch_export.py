@@ -0,0 +1,144 @@
+# templates_app/batch_export.py - Export par lots en archive ZIP diffusée en continu
+"""
+Export de nombreux documents dans une seule archive ZIP.
+
+L'archive est écrite dans un tampon non positionnable : ``zipfile`` utilise
+alors des descripteurs de données et chaque entrée peut être envoyée au client
+dès qu'elle est terminée. La mémoire utilisée reste celle d'un seul document,
+quel que soit le nombre de documents exportés.
+"""
+import logging
+import zipfile
+
+from . import pdf_service
+from .exports import render_export, export_filename
+from .metrics import EXPORT_FILES
+from .rendering import render_document_uncached
+
+logger = logging.getLogger(__name__)
+
+# Les PDF et DOCX sont déjà compressés : inutile de les recompresser
+COMPRESSION = {
+    'pdf': zipfile.ZIP_STORED,
+    'docx': zipfile.ZIP_STORED,
+    'html': zipfile.ZIP_DEFLATED,
+}
+
+# Nombre de documents lus par requête SQL
+ITERATOR_CHUNK_SIZE = 200
+
+ERRORS_FILENAME = 'ERREURS.txt'
+
+
+class ZipStreamBuffer:
+    """Tampon d'écriture non positionnable vidé après chaque entrée de l'archive"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Retourner et oublier les octets écrits depuis le dernier appel"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def unique_name(name, used_names):
+    """Éviter les doublons de noms de fichiers dans l'archive"""
+    if name not in used_names:
+        used_names.add(name)
+        return name
+
+    stem, dot, extension = name.rpartition('.')
+    counter = 2
+    while f'{stem}_{counter}{dot}{extension}' in used_names:
+        counter += 1
+    name = f'{stem}_{counter}{dot}{extension}'
+    used_names.add(name)
+    return name
+
+
+def iter_rendered_documents(documents):
+    """Générer (document, contenu rendu ou exception) pour chaque document"""
+    for document in documents.select_related('template').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        try:
+            # Sans passer par le cache : un lot ne doit pas en évincer les documents consultés
+            rendered_content, _ = render_document_uncached(document)
+        except Exception as e:
+            yield document, e
+        else:
+            yield document, rendered_content
+
+
+def iter_export_files(documents, export_format):
+    """Générer (document, octets du fichier ou exception) dans l'ordre des documents"""
+    if export_format == 'pdf':
+        # Les PDF sont rendus en parallèle par le pool de processus
+        failed = []
+
+        def jobs():
+            for document, content in iter_rendered_documents(documents):
+                if isinstance(content, Exception):
+                    failed.append((document, content))
+                else:
+                    yield document, (document.title, content, document.template.title)
+
+        yield from pdf_service.render_many(jobs())
+        yield from failed
+        return
+
+    for document, content in iter_rendered_documents(documents):
+        if isinstance(content, Exception):
+            yield document, content
+            continue
+        try:
+            yield document, render_export(export_format, document.title, content, document.template.title)
+        except Exception as e:
+            yield document, e
+
+
+def stream_zip_export(documents, export_format, progress=None):
+    """Générateur d'octets d'une archive ZIP contenant un fichier par document
+
+    ``progress``, si fourni, est appelé avec le nombre de documents traités.
+    """
+    buffer = ZipStreamBuffer()
+    compression = COMPRESSION.get(export_format, zipfile.ZIP_DEFLATED)
+    used_names = set()
+    errors = []
+
+    with zipfile.ZipFile(buffer, mode='w', compression=compression) as archive:
+        for done, (document, data) in enumerate(iter_export_files(documents, export_format), start=1):
+            if progress is not None:
+                progress(done)
+
+            if isinstance(data, Exception):
+                # Un document en erreur ne doit pas interrompre toute l'archive
+                logger.error("Export par lots : échec du document %s : %s", document.pk, data)
+                errors.append(f'{document.title} (#{document.pk}) : {data}')
+                EXPORT_FILES.inc(format=export_format, mode='batch', result='error')
+                continue
+
+            EXPORT_FILES.inc(format=export_format, mode='batch', result='ok')
+
+            filename = export_filename(document.title, export_format)
+            archive.writestr(unique_name(filename, used_names), data)
+            yield buffer.drain()
+
+        if errors:
+            archive.writestr(ERRORS_FILENAME, '\n'.join(errors))
+
+    # Répertoire central de l'archive
+    yield buffer.drain()
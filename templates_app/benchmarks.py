@@ -0,0 +1,189 @@
+# templates_app/benchmarks.py - Suite de mesures des vues et du rendu
+"""
+Mesures reproductibles des vues principales et du chemin de rendu, à
+plusieurs volumes de données (``manage.py bench_perf``).
+
+Pour chaque volume, un jeu de données est généré (``perf_data``) dans une
+transaction annulée à la fin, puis chaque vue est appelée par le client de
+test (middlewares compris) : une fois pour chauffer les caches, puis
+``repeat`` fois. On retient médiane, p95, minimum et nombre de requêtes SQL.
+
+Les résultats sont un JSON comparable d'un commit à l'autre
+(``compare_results``) : une mesure est en régression si sa médiane dépasse
+celle de la référence de plus de ``threshold`` (en proportion) et de plus
+de ``min_delta_ms`` (bruit des petites mesures).
+"""
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .exports import CONTENT_TYPES, format_available
+from .models import Document
+from .perf_data import seed_perf_data
+from .rendering import render_document, render_document_uncached
+
+# Rendus par échantillon pour le chemin de rendu (quelques dizaines de µs l'un)
+RENDER_LOOPS = 50
+
+# Documents de l'export par lots mesuré
+BATCH_DOCUMENTS = 20
+
+
+class Rollback(Exception):
+    pass
+
+
+def view_benchmarks(user):
+    """[(nom, URL)] des vues mesurées pour ``user``"""
+    documents = Document.objects.filter(created_by=user).order_by('-updated_at', '-id')
+    document = documents.first()
+    batch_ids = '&'.join(f'ids={pk}' for pk in documents.values_list('pk', flat=True)[:BATCH_DOCUMENTS])
+
+    benchmarks = [
+        ('template_list', reverse('templates_app:template_list')),
+        ('document_list', reverse('templates_app:document_list')),
+        ('dashboard', reverse('templates_app:dashboard')),
+        ('document_detail', reverse('templates_app:document_detail', args=[document.pk])),
+    ]
+    for export_format in sorted(CONTENT_TYPES):
+        if format_available(export_format):
+            benchmarks.append((f'document_export_{export_format}',
+                               reverse(f'templates_app:document_export_{export_format}', args=[document.pk])))
+    benchmarks.append(('document_export_batch_html',
+                       f"{reverse('templates_app:document_export_batch')}?format=html&{batch_ids}"))
+    return benchmarks
+
+
+def summarize(samples, queries=None):
+    """Médiane, p95 et minimum (ms) d'une liste de durées en secondes"""
+    ordered = sorted(samples)
+    result = {
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'samples': len(ordered),
+    }
+    if queries is not None:
+        result['queries'] = queries
+    return result
+
+
+def time_view(client, url, repeat):
+    """Mesurer une vue ; le corps des réponses en flux est lu entièrement"""
+    def fetch():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} : statut {response.status_code}")
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    fetch()  # Chauffe : compilation des templates, caches
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fetch()
+        samples.append(time.perf_counter() - start)
+    with CaptureQueriesContext(connection) as queries:
+        fetch()
+    return summarize(samples, len(queries))
+
+
+def time_render(document, repeat):
+    """Chemin de rendu : sans cache (substitution) et avec le cache de rendu"""
+    results = {}
+    for name, render in (('render_uncached', render_document_uncached), ('render_cached', render_document)):
+        render(document)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(RENDER_LOOPS):
+                render(document)
+            samples.append((time.perf_counter() - start) / RENDER_LOOPS)
+        results[name] = summarize(samples)
+    return results
+
+
+def run_size(size, repeat, users, templates, placeholders):
+    """Mesures pour ``size`` documents par utilisateur ; données annulées ensuite"""
+    results = {}
+    try:
+        with transaction.atomic():
+            seeded = seed_perf_data(
+                users=users, templates=templates, placeholders=placeholders, documents=size,
+                prefix=f'bench-{size}-{time.time_ns()}',
+            )
+            user = seeded[0]
+            for cache in caches.all():
+                cache.clear()
+
+            client = Client()
+            client.force_login(user)
+            for name, url in view_benchmarks(user):
+                results[name] = time_view(client, url, repeat)
+
+            document = Document.objects.select_related('template').filter(created_by=user).first()
+            results.update(time_render(document, repeat))
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, repeat=15, users=2, templates=10, placeholders=10, progress=None):
+    """Résultats {meta, results: {taille: {mesure: {...}}}} prêts à sérialiser en JSON"""
+    data = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': f'{connection.vendor} {connection.Database.sqlite_version}'
+            if connection.vendor == 'sqlite' else connection.vendor,
+            'options': {'repeat': repeat, 'users': users, 'templates': templates, 'placeholders': placeholders},
+        },
+        'results': {},
+    }
+    # Le client de test se présente comme « testserver » ; caches d'export et
+    # journal des requêtes lentes coupés pour mesurer le rendu lui-même
+    with override_settings(ALLOWED_HOSTS=['testserver', *settings.ALLOWED_HOSTS],
+                           EXPORT_CACHE_ENABLED=False, SERVER_TIMING_LOG_MIN_MS=float('inf')):
+        for size in sizes:
+            data['results'][str(size)] = run_size(size, repeat, users, templates, placeholders)
+            if progress is not None:
+                progress(size, data['results'][str(size)])
+    return data
+
+
+def compare_results(baseline, current, threshold=0.2, min_delta_ms=2.0):
+    """Comparer deux résultats ; retourne [(taille, mesure, ancienne, nouvelle, ratio, régression)]"""
+    rows = []
+    for size, measures in current['results'].items():
+        previous = baseline.get('results', {}).get(size, {})
+        for name, result in measures.items():
+            if name not in previous:
+                continue
+            old, new = previous[name]['median_ms'], result['median_ms']
+            ratio = new / old if old else float('inf')
+            regression = ratio > 1 + threshold and new - old > min_delta_ms
+            rows.append((size, name, old, new, ratio, regression))
+    return rows
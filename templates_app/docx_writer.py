@@ -0,0 +1,142 @@
+# templates_app/docx_writer.py - Écriture directe des fichiers DOCX
+"""
+Écriture d'un DOCX sans modèle objet : le WordprocessingML est produit
+directement, paragraphe par paragraphe, dans l'entrée ``word/document.xml``
+de l'archive.
+
+Les parties fixes du paquet (types de contenu, relations, styles, réglages)
+sont compressées une seule fois par processus dans une archive « squelette »
+(``package_skeleton``) ; chaque export recopie ces octets puis y ajoute le
+document en mode ajout de ``zipfile``. Seule la bibliothèque standard est
+utilisée : python-docx reste disponible comme moteur de repli
+(``settings.DOCX_ENGINE``, voir exports.py).
+"""
+import io
+import re
+import zipfile
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+# À incrémenter quand la mise en page produite change (clé du cache d'export)
+LAYOUT_VERSION = 1
+
+# Octets XML accumulés avant chaque écriture dans l'entrée compressée
+WRITE_BUFFER_SIZE = 64 * 1024
+
+W_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+CONTENT_TYPES_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\
+<Default Extension="xml" ContentType="application/xml"/>\
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>\
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>\
+<Override PartName="/word/settings.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.settings+xml"/>\
+</Types>"""
+
+PACKAGE_RELS_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>\
+</Relationships>"""
+
+DOCUMENT_RELS_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>\
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/settings" Target="settings.xml"/>\
+</Relationships>"""
+
+# Styles Normal et Title proches du modèle par défaut de python-docx
+STYLES_XML = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:styles xmlns:w="{W_NAMESPACE}">\
+<w:docDefaults>\
+<w:rPrDefault><w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:eastAsia="Calibri" w:cs="Times New Roman"/>\
+<w:sz w:val="22"/><w:szCs w:val="22"/><w:lang w:val="fr-FR"/></w:rPr></w:rPrDefault>\
+<w:pPrDefault><w:pPr><w:spacing w:after="200" w:line="276" w:lineRule="auto"/></w:pPr></w:pPrDefault>\
+</w:docDefaults>\
+<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>\
+<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>\
+<w:next w:val="Normal"/><w:qFormat/>\
+<w:pPr><w:pBdr><w:bottom w:val="single" w:sz="8" w:space="4" w:color="4F81BD"/></w:pBdr>\
+<w:spacing w:after="300" w:line="240" w:lineRule="auto"/><w:contextualSpacing/></w:pPr>\
+<w:rPr><w:rFonts w:ascii="Cambria" w:hAnsi="Cambria" w:eastAsia="Cambria" w:cs="Times New Roman"/>\
+<w:color w:val="17365D"/><w:spacing w:val="5"/><w:kern w:val="28"/><w:sz w:val="52"/><w:szCs w:val="52"/></w:rPr>\
+</w:style>\
+</w:styles>"""
+
+SETTINGS_XML = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:settings xmlns:w="{W_NAMESPACE}">\
+<w:defaultTabStop w:val="720"/><w:characterSpacingControl w:val="doNotCompress"/>\
+<w:compat><w:compatSetting w:name="compatibilityMode" w:uri="http://schemas.microsoft.com/office/word" w:val="15"/></w:compat>\
+</w:settings>"""
+
+DOCUMENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<w:document xmlns:w="{W_NAMESPACE}"><w:body>'
+)
+
+# Page Letter, marges du modèle python-docx
+DOCUMENT_TAIL = (
+    '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+    '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" w:header="720" w:footer="720" w:gutter="0"/>'
+    '<w:cols w:space="720"/><w:docGrid w:linePitch="360"/></w:sectPr>'
+    '</w:body></w:document>'
+)
+
+SKELETON_PARTS = (
+    ('[Content_Types].xml', CONTENT_TYPES_XML),
+    ('_rels/.rels', PACKAGE_RELS_XML),
+    ('word/_rels/document.xml.rels', DOCUMENT_RELS_XML),
+    ('word/styles.xml', STYLES_XML),
+    ('word/settings.xml', SETTINGS_XML),
+)
+
+# Caractères interdits en XML 1.0 (python-docx refuse le texte qui en contient)
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+@lru_cache(maxsize=None)
+def package_skeleton():
+    """Archive ZIP des parties fixes du paquet, construite une fois par processus"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in SKELETON_PARTS:
+            archive.writestr(name, xml)
+    return buffer.getvalue()
+
+
+def paragraph_xml(text, style=None, centered=False):
+    """WordprocessingML d'un paragraphe (texte brut, tabulations conservées)"""
+    properties = ''
+    if style or centered:
+        properties = '<w:pPr>{}{}</w:pPr>'.format(
+            f'<w:pStyle w:val="{style}"/>' if style else '',
+            '<w:jc w:val="center"/>' if centered else '',
+        )
+    if not text:
+        return f'<w:p>{properties}</w:p>'
+    text = escape(INVALID_XML_CHARS.sub('', text))
+    runs = '<w:tab/>'.join(f'<w:t xml:space="preserve">{part}</w:t>' if part else '' for part in text.split('\t'))
+    return f'<w:p>{properties}<w:r>{runs}</w:r></w:p>'
+
+
+def write_package(out, paragraphs):
+    """Écrire un DOCX dans ``out`` (fichier binaire vide, avec seek)
+
+    ``paragraphs`` produit des (texte, style, centré) ; ils sont convertis et
+    compressés au fil de l'eau, le document XML complet n'existe jamais.
+    """
+    out.write(package_skeleton())
+    with zipfile.ZipFile(out, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('word/document.xml', 'w') as entry:
+            pending = [DOCUMENT_HEAD]
+            pending_size = len(DOCUMENT_HEAD)
+            for text, style, centered in paragraphs:
+                xml = paragraph_xml(text, style, centered)
+                pending.append(xml)
+                pending_size += len(xml)
+                if pending_size >= WRITE_BUFFER_SIZE:
+                    entry.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    pending_size = 0
+            pending.append(DOCUMENT_TAIL)
+            entry.write(''.join(pending).encode('utf-8'))
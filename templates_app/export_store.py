@@ -0,0 +1,310 @@
+# templates_app/export_store.py - Cache disque des fichiers exportés
+"""
+Stockage adressé par contenu des fichiers PDF/DOCX/HTML exportés.
+
+La clé est un hash SHA-256 de (contenu rendu, titre du document, titre du
+template, format, version du moteur de rendu) : un document inchangé exporté
+deux fois n'est mis en page qu'une seule fois. Les fichiers sont rangés sous
+``EXPORT_CACHE_DIR`` dans des sous-répertoires ``ab/cd/``; la taille totale
+est plafonnée (``EXPORT_CACHE_MAX_BYTES``) avec éviction des fichiers les
+moins récemment utilisés (date de modification mise à jour à chaque accès).
+
+La date « Généré le … » imprimée dans les fichiers ne fait pas partie de la
+clé : un fichier servi depuis le cache garde la date de son premier rendu,
+jusqu'à son éviction ou à une modification du document.
+
+Les demandes simultanées d'un même fichier absent ne déclenchent qu'un rendu :
+regroupement des threads (``SingleFlight``) puis verrou fichier entre
+processus, sous ``.locks/``.
+
+Les fonctions de rendu retournent des octets ou un fichier ouvert (export
+écrit dans un fichier temporaire) ; un fichier est recopié par blocs, sans
+être chargé en mémoire.
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from . import exports
+from .singleflight import LockTimeout, SingleFlight, file_lock
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter quand la mise en page des exports change
+EXPORT_LAYOUT_VERSION = 1
+
+# Après éviction, la taille totale redescend à cette fraction du plafond
+EVICTION_TARGET = 0.9
+
+# Répertoire des verrous entre processus : un fichier par clé, supprimé par
+# son détenteur après l'écriture (file_lock(remove=True))
+LOCKS_DIRNAME = '.locks'
+
+# Attente maximale (s) du verrou d'une clé ; au-delà, rendu sans verrou
+DEFAULT_LOCK_TIMEOUT = 30
+
+# Rendus en cours dans ce processus quand le cache disque est désactivé
+_inflight_renders = SingleFlight()
+
+# Taille des blocs recopiés d'un fichier rendu vers le cache ou vers la réponse
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def renderer_version(export_format):
+    """Identifiant du moteur de rendu utilisé pour un format"""
+    if export_format == 'pdf':
+        if exports.WEASYPRINT_AVAILABLE:
+            backend = f'weasyprint-{exports.weasyprint.__version__}'
+        else:
+            import reportlab
+            backend = f'reportlab-{reportlab.Version}'
+    elif export_format == 'docx':
+        if exports.docx_engine() == 'python-docx':
+            import docx
+            backend = f"python-docx-{getattr(docx, '__version__', '')}"
+        else:
+            backend = f'xml-{exports.docx_writer.LAYOUT_VERSION}'
+    else:
+        backend = export_format
+    return f'{EXPORT_LAYOUT_VERSION}:{backend}'
+
+
+def artifact_key(export_format, title, content, template_title):
+    """Hash identifiant un fichier exporté"""
+    digest = hashlib.sha256()
+    for part in (renderer_version(export_format), export_format, title, template_title, content):
+        data = part.encode('utf-8')
+        # Longueur en préfixe : aucune ambiguïté entre les parties
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ExportStore:
+    """Répertoire de fichiers exportés avec plafond de taille et éviction LRU"""
+
+    def __init__(self, root, max_bytes, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self._written_since_sweep = 0
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+
+    def path_for(self, key, export_format):
+        return self.root / key[:2] / key[2:4] / f'{key}.{export_format}'
+
+    def lock_path(self, key):
+        return self.root / LOCKS_DIRNAME / f'{key}.lock'
+
+    def open(self, key, export_format):
+        """Ouvrir un fichier du cache (None si absent) et le marquer comme utilisé"""
+        path = self.path_for(key, export_format)
+        try:
+            artifact = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return artifact
+
+    def put(self, key, export_format, data):
+        """Enregistrer un fichier (octets ou fichier ouvert) de façon atomique ; retourne son chemin"""
+        path = self.path_for(key, export_format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                if isinstance(data, bytes):
+                    tmp_file.write(data)
+                else:
+                    with data:
+                        shutil.copyfileobj(data, tmp_file, COPY_CHUNK_SIZE)
+                size = tmp_file.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._written_since_sweep += size
+            sweep = self._written_since_sweep >= self.max_bytes * (1 - EVICTION_TARGET)
+            if sweep:
+                self._written_since_sweep = 0
+        if sweep:
+            self.evict()
+        return path
+
+    def open_or_render(self, export_format, title, content, template_title, render):
+        """Ouvrir le fichier exporté, en le générant avec ``render`` si absent
+
+        Retourne ``(fichier, trouvé)`` : ``trouvé`` est vrai si le fichier
+        existait déjà (éventuellement produit par un autre processus pendant
+        l'attente du verrou), faux s'il a fallu attendre un rendu, même lancé
+        par une autre demande. Le fichier est retourné ouvert : une éviction
+        concurrente ne peut plus le faire disparaître avant l'envoi.
+        """
+        key = artifact_key(export_format, title, content, template_title)
+        artifact = self.open(key, export_format)
+        if artifact is not None:
+            return artifact, True
+
+        def render_once():
+            # Un autre processus a pu produire le fichier pendant l'attente du verrou
+            try:
+                with file_lock(self.lock_path(key), timeout=self.lock_timeout, remove=True):
+                    path = self.path_for(key, export_format)
+                    if path.exists():
+                        return path, True
+                    return self.put(key, export_format, render(title, content, template_title)), False
+            except LockTimeout:
+                # Rendu bloqué ailleurs : rendre sans attendre (put() est atomique)
+                logger.warning("Verrou d'export %s non obtenu en %s s : rendu sans verrou", key, self.lock_timeout)
+                return self.put(key, export_format, render(title, content, template_title)), False
+
+        path, found = self._inflight.do(key, render_once)
+        try:
+            return open(path, 'rb'), found
+        except FileNotFoundError:
+            # Évincé entre le rendu et l'ouverture : cas rare, rendu direct
+            path = self.put(key, export_format, render(title, content, template_title))
+            return open(path, 'rb'), False
+
+    def iter_files(self):
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories[:] = [name for name in subdirectories if name != LOCKS_DIRNAME]
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def total_size(self):
+        return sum(size for _, size, _ in self.iter_files())
+
+    def evict(self):
+        """Supprimer les fichiers les moins récemment utilisés au-delà du plafond"""
+        files = list(self.iter_files())
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+
+        target = self.max_bytes * EVICTION_TARGET
+        removed = 0
+        for path, size, _ in sorted(files, key=lambda item: item[2]):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        logger.info("Cache des exports : %d fichiers évincés, %d octets restants", removed, total)
+        return removed
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_export_store():
+    """Cache des exports configuré dans les settings (None si désactivé)"""
+    if not getattr(settings, 'EXPORT_CACHE_ENABLED', True):
+        return None
+
+    root = str(getattr(settings, 'EXPORT_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'export_cache'))
+    max_bytes = getattr(settings, 'EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+    lock_timeout = getattr(settings, 'EXPORT_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+    with _stores_lock:
+        store = _stores.get((root, max_bytes, lock_timeout))
+        if store is None:
+            store = _stores[(root, max_bytes, lock_timeout)] = ExportStore(root, max_bytes, lock_timeout)
+        return store
+
+
+class SharedFile:
+    """Fichier rendu partagé entre les demandes simultanées ; chacune le lit avec ``reader()``"""
+
+    def __init__(self, file):
+        self.file = file
+        self._lock = threading.Lock()
+
+    def read_at(self, position, size):
+        with self._lock:
+            self.file.seek(position)
+            return self.file.read(size)
+
+    def reader(self):
+        return SharedFileReader(self)
+
+    def __del__(self):
+        # Dernier lecteur fermé : le fichier temporaire est supprimé
+        self.file.close()
+
+
+class SharedFileReader(io.RawIOBase):
+    """Lecture d'un ``SharedFile`` avec sa propre position"""
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            with self.shared._lock:
+                offset += self.shared.file.seek(0, io.SEEK_END)
+        elif whence == io.SEEK_CUR:
+            offset += self.position
+        self.position = offset
+        return offset
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        data = self.shared.read_at(self.position, len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        self.shared = None
+        super().close()
+
+
+def render_shared(export_format, title, content, template_title, render):
+    """Rendu sans cache disque : les demandes simultanées partagent le rendu
+
+    Retourne des octets ou, si ``render`` produit un fichier, un lecteur de
+    ce fichier propre à l'appelant.
+    """
+    key = artifact_key(export_format, title, content, template_title)
+
+    def render_once():
+        data = render(title, content, template_title)
+        return data if isinstance(data, bytes) else SharedFile(data)
+
+    result = _inflight_renders.do(key, render_once)
+    return result.reader() if isinstance(result, SharedFile) else result
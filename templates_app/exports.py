@@ -0,0 +1,467 @@
+# templates_app/exports.py - Backends d'export (PDF, DOCX, HTML)
+"""
+Génération des fichiers exportés à partir d'un contenu déjà rendu.
+
+Chaque backend prend des données simples (titre du document, contenu rendu,
+titre du template) et écrit le fichier dans un objet fichier
+(``write_pdf``, ``write_docx``, ``write_html``), sans dépendre de la requête
+HTTP : les vues d'export et l'export par lots les partagent. Le DOCX est
+écrit directement en XML (docx_writer.py), python-docx restant disponible.
+
+``render_export_file`` écrit dans un ``SpooledTemporaryFile`` qui passe sur
+disque au-delà de ``EXPORT_SPOOL_MAX_SIZE`` : un gros export n'est jamais
+gardé en entier en mémoire. ``render_export`` retourne les octets (archives
+ZIP, pool de processus).
+"""
+import io
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import docx_writer
+
+# Imports pour PDF
+try:
+    from reportlab.lib.pagesizes import letter, A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+# Imports pour DOCX
+try:
+    from docx import Document as DocxDocument
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+    PYTHON_DOCX_AVAILABLE = True
+except ImportError:
+    PYTHON_DOCX_AVAILABLE = False
+
+# Alternative avec WeasyPrint - AVEC GESTION D'ERREUR
+try:
+    import weasyprint
+
+    WEASYPRINT_AVAILABLE = True
+except (ImportError, OSError):
+    WEASYPRINT_AVAILABLE = False
+    print("WeasyPrint non disponible - utilisation de ReportLab pour les PDFs")
+
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'html': 'text/html',
+}
+
+
+# Taille au-delà de laquelle un export en cours d'écriture passe sur disque
+DEFAULT_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Tranches de contenu (caractères) converties puis écrites une à une
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+def export_filename(title, extension):
+    """Nom de fichier proposé au téléchargement"""
+    return f"{title.replace(' ', '_')}.{extension}"
+
+
+def generated_at():
+    return timezone.now().strftime('%d/%m/%Y à %H:%M')
+
+
+def format_available(export_format):
+    """Indiquer si les bibliothèques nécessaires au format sont installées"""
+    if export_format == 'pdf':
+        return REPORTLAB_AVAILABLE or WEASYPRINT_AVAILABLE
+    if export_format == 'docx':
+        return True  # Écriture directe sans dépendance (python-docx facultatif)
+    return export_format in CONTENT_TYPES
+
+
+# ===============================
+# PDF
+# ===============================
+
+WEASYPRINT_CSS = """
+    @page {
+        margin: 2cm;
+        size: A4;
+    }
+    body {
+        font-family: 'Times New Roman', serif;
+        font-size: 12pt;
+        line-height: 1.6;
+        color: #333;
+    }
+    h1, h2, h3 {
+        color: #2c3e50;
+        margin-top: 1em;
+        margin-bottom: 0.5em;
+    }
+    h1 { font-size: 18pt; }
+    h2 { font-size: 16pt; }
+    h3 { font-size: 14pt; }
+    p { margin-bottom: 1em; }
+    .header {
+        text-align: center;
+        margin-bottom: 2em;
+        padding-bottom: 1em;
+        border-bottom: 2px solid #3498db;
+    }
+    .footer {
+        margin-top: 3em;
+        padding-top: 1em;
+        border-top: 1px solid #bdc3c7;
+        font-size: 10pt;
+        color: #7f8c8d;
+    }
+"""
+
+
+@lru_cache(maxsize=None)
+def get_weasyprint_stylesheet():
+    """Feuille de style WeasyPrint, analysée une seule fois par processus"""
+    return weasyprint.CSS(string=WEASYPRINT_CSS)
+
+
+def write_pdf_weasyprint(out, title, content, template_title):
+    """Export PDF avec WeasyPrint (recommandé pour le CSS)"""
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+    </head>
+    <body>
+        <div class="header">
+            <h1>{title}</h1>
+            <p>Généré le {generated_at()}</p>
+        </div>
+
+        <div class="content">
+            {content.replace(chr(10), '<br>')}
+        </div>
+
+        <div class="footer">
+            <p>Document généré par DocBuilder - {template_title}</p>
+        </div>
+    </body>
+    </html>
+    """
+
+    # Générer le PDF
+    weasyprint.HTML(string=html_content).write_pdf(out, stylesheets=[get_weasyprint_stylesheet()])
+
+
+@lru_cache(maxsize=None)
+def get_reportlab_styles():
+    """Styles ReportLab (titre, texte), construits une seule fois par processus"""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1  # Centré
+    )
+
+    normal_style = styles['Normal']
+    normal_style.fontSize = 12
+    normal_style.leading = 18
+
+    return title_style, normal_style
+
+
+def write_pdf_reportlab(out, title, content, template_title):
+    """Export PDF avec ReportLab (plus basique)"""
+    # Créer le document PDF
+    doc = SimpleDocTemplate(out, pagesize=A4, topMargin=1 * inch)
+
+    # Styles
+    title_style, normal_style = get_reportlab_styles()
+
+    # Contenu
+    story = []
+
+    # Titre
+    story.append(Paragraph(title, title_style))
+
+    # Date
+    story.append(Paragraph(f"Généré le {generated_at()}", normal_style))
+    story.append(Spacer(1, 20))
+
+    # Contenu principal (diviser par lignes)
+    for line in content.split('\n'):
+        if line.strip():
+            story.append(Paragraph(line.strip(), normal_style))
+        else:
+            story.append(Spacer(1, 12))
+
+    # Footer
+    story.append(Spacer(1, 30))
+    story.append(Paragraph(f"Document généré par DocBuilder - {template_title}", normal_style))
+
+    # Construire le PDF
+    doc.build(story)
+
+
+def load_pdf_resources():
+    """Précharger styles ReportLab et CSS WeasyPrint (démarrage d'un worker)"""
+    if REPORTLAB_AVAILABLE:
+        get_reportlab_styles()
+    if WEASYPRINT_AVAILABLE:
+        get_weasyprint_stylesheet()
+
+
+def pdf_engine():
+    """Backend PDF utilisé par render_pdf"""
+    return 'weasyprint' if WEASYPRINT_AVAILABLE else 'reportlab'
+
+
+def write_pdf(out, title, content, template_title):
+    """Export PDF avec le meilleur backend disponible"""
+    if WEASYPRINT_AVAILABLE:
+        write_pdf_weasyprint(out, title, content, template_title)
+    else:
+        write_pdf_reportlab(out, title, content, template_title)
+
+
+def render_pdf(title, content, template_title):
+    return render_to_bytes(write_pdf, title, content, template_title)
+
+
+def export_engine(export_format):
+    """Backend utilisé pour un format (étiquette des métriques et du Server-Timing)"""
+    if export_format == 'pdf':
+        return pdf_engine()
+    if export_format == 'docx':
+        return docx_engine()
+    return export_format
+
+
+# ===============================
+# DOCX
+# ===============================
+
+def write_docx_python_docx(out, title, content, template_title):
+    """Export DOCX avec python-docx"""
+    doc = DocxDocument()
+
+    # Titre
+    heading = doc.add_heading(title, 0)
+    heading.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    # Date
+    date_para = doc.add_paragraph(f"Généré le {generated_at()}")
+    date_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    # Contenu principal
+    for line in content.split('\n'):
+        if line.strip():
+            doc.add_paragraph(line.strip())
+
+    # Footer
+    doc.add_paragraph()
+    footer = doc.add_paragraph(f"Document généré par DocBuilder - {template_title}")
+    footer.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    doc.save(out)
+
+
+def iter_lines(text):
+    """Lignes de ``text`` une à une, comme ``text.split('\n')`` sans la liste complète"""
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def write_docx_xml(out, title, content, template_title):
+    """Export DOCX écrit directement en WordprocessingML (même mise en page)"""
+    def paragraphs():
+        yield title, 'Title', True
+        yield f"Généré le {generated_at()}", None, True
+        for line in iter_lines(content):
+            if line.strip():
+                yield line.strip(), None, False
+        yield '', None, False
+        yield f"Document généré par DocBuilder - {template_title}", None, True
+
+    docx_writer.write_package(out, paragraphs())
+
+
+def docx_engine():
+    """Backend DOCX utilisé par write_docx : écriture directe, ou python-docx
+    si ``settings.DOCX_ENGINE = 'python-docx'`` et la bibliothèque est installée"""
+    if getattr(settings, 'DOCX_ENGINE', 'xml') == 'python-docx' and PYTHON_DOCX_AVAILABLE:
+        return 'python-docx'
+    return 'xml'
+
+
+def write_docx(out, title, content, template_title):
+    """Export DOCX avec le backend configuré"""
+    if docx_engine() == 'python-docx':
+        write_docx_python_docx(out, title, content, template_title)
+    else:
+        write_docx_xml(out, title, content, template_title)
+
+
+def render_docx(title, content, template_title):
+    return render_to_bytes(write_docx, title, content, template_title)
+
+
+# ===============================
+# HTML
+# ===============================
+
+def html_export_parts(title, template_title):
+    """(début, fin) de la page HTML exportée, autour du contenu"""
+    head = f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>
+        body {{
+            font-family: 'Times New Roman', serif;
+            line-height: 1.6;
+            max-width: 800px;
+            margin: 2em auto;
+            padding: 2em;
+            color: #333;
+        }}
+        .document-header {{
+            text-align: center;
+            margin-bottom: 2em;
+            padding-bottom: 1em;
+            border-bottom: 2px solid #3498db;
+        }}
+        .document-header h1 {{
+            color: #2c3e50;
+            margin-bottom: 0.5em;
+            font-size: 2em;
+        }}
+        .document-content {{
+            margin: 2em 0;
+            text-align: justify;
+        }}
+        .document-footer {{
+            margin-top: 3em;
+            padding-top: 1em;
+            border-top: 1px solid #bdc3c7;
+            font-size: 0.9em;
+            color: #7f8c8d;
+            text-align: center;
+        }}
+        h1, h2, h3 {{ color: #2c3e50; }}
+        p {{ margin-bottom: 1em; }}
+
+        @media print {{
+            body {{ margin: 1cm; }}
+            .no-print {{ display: none; }}
+        }}
+    </style>
+</head>
+<body>
+    <div class="document-header">
+        <h1>{title}</h1>
+        <p><em>Généré le {generated_at()}</em></p>
+    </div>
+
+    <div class="document-content">
+        """
+    tail = f"""
+    </div>
+
+    <div class="document-footer">
+        <p><strong>Document généré par DocBuilder</strong></p>
+        <p>Template source : {template_title}</p>
+        <p class="no-print">
+            <button onclick="window.print()" style="padding: 10px 20px; background: #3498db; color: white; border: none; border-radius: 5px; cursor: pointer;">
+                Imprimer ce document
+            </button>
+        </p>
+    </div>
+</body>
+</html>"""
+    return head, tail
+
+
+def iter_html(title, chunks, template_title):
+    """Export HTML en flux : octets de la page, un morceau de contenu à la fois"""
+    head, tail = html_export_parts(title, template_title)
+    yield head.encode('utf-8')
+    for chunk in chunks:
+        yield chunk.replace(chr(10), '<br>').encode('utf-8')
+    yield tail.encode('utf-8')
+
+
+def write_html(out, title, content, template_title):
+    """Export HTML avec styles intégrés, écrit par tranches du contenu"""
+    slices = (content[start:start + WRITE_CHUNK_SIZE] for start in range(0, len(content), WRITE_CHUNK_SIZE))
+    out.writelines(iter_html(title, slices, template_title))
+
+
+def render_html(title, content, template_title):
+    return b''.join(iter_html(title, [content], template_title))
+
+
+# ===============================
+# FICHIERS EXPORTÉS
+# ===============================
+
+WRITERS = {
+    'pdf': write_pdf,
+    'docx': write_docx,
+    'html': write_html,
+}
+
+RENDERERS = {
+    'pdf': render_pdf,
+    'docx': render_docx,
+    'html': render_html,
+}
+
+
+def render_to_bytes(write, title, content, template_title):
+    """Octets d'un export écrit par ``write``"""
+    buffer = io.BytesIO()
+    write(buffer, title, content, template_title)
+    # getvalue() reprend le tampon du BytesIO (pas de seconde copie en CPython)
+    return buffer.getvalue()
+
+
+def render_export(export_format, title, content, template_title):
+    """Générer le fichier d'un format donné ; retourne des octets"""
+    return RENDERERS[export_format](title, content, template_title)
+
+
+def spool_max_size():
+    return getattr(settings, 'EXPORT_SPOOL_MAX_SIZE', DEFAULT_SPOOL_MAX_SIZE)
+
+
+def render_export_file(export_format, title, content, template_title):
+    """Générer le fichier d'un format donné dans un fichier temporaire
+
+    Retourne un ``SpooledTemporaryFile`` positionné au début, en mémoire
+    jusqu'à ``EXPORT_SPOOL_MAX_SIZE`` puis sur disque ; supprimé à la fermeture.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_size(), prefix='export-')
+    try:
+        WRITERS[export_format](spool, title, content, template_title)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
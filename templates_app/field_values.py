@@ -0,0 +1,120 @@
+# templates_app/field_values.py - Enregistrement des valeurs de champs d'un document
+"""
+Valeurs de champs d'un document enregistrées par différence.
+
+Plutôt que de supprimer puis recréer toutes les lignes à chaque
+modification, on compare les valeurs soumises aux lignes existantes et l'on
+n'écrit que ce qui change : un ``bulk_create`` pour les champs nouvellement
+remplis, un ``bulk_update`` pour les valeurs modifiées et une suppression
+filtrée pour les champs vidés.
+
+``bulk_create``/``bulk_update`` n'émettent pas de signaux : l'appelant
+enregistre ensuite le document (``document.save()``), ce qui invalide son
+rendu en cache (voir ``signals.py``).
+
+``Document.values`` est une copie dénormalisée {field_name: valeur} des
+lignes ``DocumentFieldValue`` : le rendu lit une seule ligne. Chaque chemin
+d'écriture la renseigne (``values_snapshot``) ; les modifications isolées
+(admin, renommage ou suppression d'un champ) la remettent à NULL par les
+signaux et elle est recalculée à la lecture suivante.
+``manage.py backfill_document_values`` la remplit et la vérifie.
+"""
+from django.db import transaction
+
+from .models import Document, DocumentFieldValue
+
+# Documents traités par requête lors des recalculs en lot
+SNAPSHOT_BATCH_SIZE = 500
+
+
+def posted_field_values(data, fields):
+    """Valeurs soumises par le formulaire : {template_field_id: valeur}"""
+    return {field.id: data.get(f'field_{field.id}', '') for field in fields}
+
+
+def is_document_complete(fields, values):
+    """Tous les champs obligatoires ont-ils une valeur ?"""
+    return all(values.get(field.id) for field in fields if field.is_required)
+
+
+def values_snapshot(fields, values):
+    """Copie {field_name: valeur} des valeurs non vides, pour ``Document.values``"""
+    return {field.field_name: values[field.id] for field in fields if values.get(field.id)}
+
+
+def diff_field_values(document, fields, existing, values):
+    """Lignes à créer, lignes à modifier et ids à supprimer
+
+    ``existing`` : {template_field_id: DocumentFieldValue} des lignes
+    actuelles ; ``values`` : {template_field_id: valeur}. Un champ vide n'a
+    pas de ligne, comme à la création du document.
+    """
+    to_create, to_update, kept = [], [], set()
+    for field in fields:
+        value = values.get(field.id, '')
+        if not value:
+            continue
+        row = existing.get(field.id)
+        if row is None:
+            to_create.append(DocumentFieldValue(document=document, template_field=field, value=value))
+            continue
+        kept.add(field.id)
+        if row.value != value:
+            row.value = value
+            to_update.append(row)
+
+    # Champs vidés, ou qui n'appartiennent plus au template
+    to_delete = [row.pk for field_id, row in existing.items() if field_id not in kept]
+    return to_create, to_update, to_delete
+
+
+def save_field_values(document, fields, existing, values):
+    """Appliquer la différence en au plus trois requêtes ; retourne le nombre de lignes écrites"""
+    to_create, to_update, to_delete = diff_field_values(document, fields, existing, values)
+    # Sans point de sauvegarde : les vues appellent déjà dans leur transaction
+    with transaction.atomic(savepoint=False):
+        if to_delete:
+            DocumentFieldValue.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            DocumentFieldValue.objects.bulk_update(to_update, ['value'])
+        if to_create:
+            DocumentFieldValue.objects.bulk_create(to_create)
+    return len(to_create) + len(to_update) + len(to_delete)
+
+
+# ===============================
+# COPIE DÉNORMALISÉE (Document.values)
+# ===============================
+
+def normalized_values(document_ids):
+    """Valeurs lues dans DocumentFieldValue : {document_id: {field_name: valeur}}"""
+    values = {document_id: {} for document_id in document_ids}
+    rows = DocumentFieldValue.objects.filter(document_id__in=document_ids).values_list(
+        'document_id', 'template_field__field_name', 'value'
+    )
+    for document_id, field_name, value in rows:
+        values[document_id][field_name] = value
+    return values
+
+
+def refresh_value_snapshots(document_ids):
+    """Recalculer la copie des documents donnés ; retourne le nombre de documents"""
+    document_ids = list(document_ids)
+    for start in range(0, len(document_ids), SNAPSHOT_BATCH_SIZE):
+        batch = normalized_values(document_ids[start:start + SNAPSHOT_BATCH_SIZE])
+        Document.objects.bulk_update(
+            [Document(pk=document_id, values=values) for document_id, values in batch.items()], ['values']
+        )
+    return len(document_ids)
+
+
+def stale_value_snapshots(document_ids):
+    """Ids des documents dont la copie diffère des DocumentFieldValue (NULL exclus)"""
+    document_ids = list(document_ids)
+    stale = []
+    for start in range(0, len(document_ids), SNAPSHOT_BATCH_SIZE):
+        batch = document_ids[start:start + SNAPSHOT_BATCH_SIZE]
+        expected = normalized_values(batch)
+        snapshots = Document.objects.filter(pk__in=batch, values__isnull=False).values_list('pk', 'values')
+        stale.extend(document_id for document_id, values in snapshots if values != expected[document_id])
+    return sorted(stale)
@@ -256,4 +256,38 @@ class TemplateCategoryForm(forms.ModelForm):
                 'type': 'color',
                 'value': '#007bff'
             })
-        }
\ No newline at end of file
+        }
+
+class MailMergeForm(forms.Form):
+    """Formulaire d'import CSV pour le publipostage"""
+
+    DELIMITER_CHOICES = [
+        (',', 'Virgule (,)'),
+        (';', 'Point-virgule (;)'),
+        ('\t', 'Tabulation'),
+    ]
+
+    csv_file = forms.FileField(
+        label='Fichier CSV',
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,text/csv'
+        })
+    )
+
+    delimiter = forms.ChoiceField(
+        label='Séparateur',
+        choices=DELIMITER_CHOICES,
+        initial=';',
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        })
+    )
+
+    background = forms.BooleanField(
+        label='Traiter en arrière-plan (recommandé pour les gros fichiers)',
+        required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input'
+        })
+    )
@@ -0,0 +1,139 @@
+# templates_app/instrumentation.py - Requêtes SQL par requête HTTP
+"""
+Comptage et chronométrage des requêtes SQL de chaque requête HTTP.
+
+``QueryBudgetMiddleware`` enregistre les requêtes exécutées pendant une vue
+(``connection.execute_wrapper``, actif aussi sans DEBUG), puis vérifie :
+
+- le budget de la vue, par nom d'URL (``DEFAULT_QUERY_BUDGETS``, complétés
+  ou remplacés par ``settings.QUERY_BUDGETS``) ;
+- les formes de requêtes répétées (même SQL aux paramètres près) au moins
+  ``N_PLUS_ONE_THRESHOLD`` fois : symptôme d'un N+1.
+
+En production un dépassement est journalisé ; avec
+``settings.QUERY_BUDGET_STRICT`` (activé pour les tests) il lève
+``QueryBudgetExceeded``. Les requêtes exécutées pendant la lecture d'une
+réponse en flux (``StreamingHttpResponse``) ne sont pas comptées.
+"""
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Une même forme de requête exécutée au moins autant de fois : N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+# Budgets par nom d'URL, session et utilisateur compris (requêtes SQL)
+DEFAULT_QUERY_BUDGETS = {
+    'templates_app:dashboard': 14,
+    'templates_app:search_global': 8,
+    'templates_app:template_list': 12,
+    'templates_app:template_detail': 9,
+    'templates_app:document_list': 12,
+    'templates_app:document_detail': 10,
+    'templates_app:document_preview': 8,
+    'templates_app:document_create': 16,
+    'templates_app:document_edit': 18,
+    'templates_app:document_duplicate': 16,
+    'templates_app:template_duplicate': 16,
+    'templates_app:document_export_pdf': 8,
+    'templates_app:document_export_docx': 8,
+    'templates_app:document_export_html': 8,
+    'templates_app:document_export_batch': 8,
+    'templates_app:job_list': 8,
+    'templates_app:job_detail': 7,
+    'templates_app:job_status': 7,
+    'templates_app:category_list': 8,
+}
+
+_PLACEHOLDER_GROUP = re.compile(r'\((?:%s, )*%s\)')
+_GROUP_LIST = re.compile(r'\(\.\.\.\)(?:, \(\.\.\.\))+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Vue au-delà de son budget de requêtes, ou N+1 détecté (mode strict)"""
+
+
+def statement_shape(sql):
+    """(SQL sans le nombre de paramètres des ``IN (...)`` et des ``VALUES``,
+    requête multi-lignes ?)"""
+    shape = _PLACEHOLDER_GROUP.sub('(...)', sql)
+    return _GROUP_LIST.sub('(...)', shape), _GROUP_LIST.search(shape) is not None
+
+
+def get_query_budget(view_name):
+    budgets = dict(DEFAULT_QUERY_BUDGETS, **getattr(settings, 'QUERY_BUDGETS', {}))
+    return budgets.get(view_name)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` : nombre, durée et formes des requêtes exécutées
+
+    Un ``bulk_create`` trop grand pour la limite de paramètres de SQLite est
+    découpé en plusieurs INSERT multi-lignes : ces lots comptent pour une
+    seule requête et ne sont pas des N+1.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.batches = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            shape, multi_row = statement_shape(sql)
+            (self.batches if multi_row else self.shapes)[shape] += 1
+
+    @property
+    def budget_count(self):
+        """Nombre de requêtes, lots d'un même INSERT multi-lignes comptés une fois"""
+        return self.count - sum(count - 1 for count in self.batches.values())
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(forme, nombre)] des requêtes répétées au moins ``threshold`` fois"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryBudgetMiddleware:
+    """Compte les requêtes SQL de chaque requête et applique le budget de la vue"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = request.sql_queries = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        problems = self.check(view_name, recorder)
+
+        logger.debug("%s %s : %d requêtes SQL en %.1f ms",
+                     request.method, view_name or request.path, recorder.count, recorder.duration * 1000)
+        if problems:
+            message = f"{request.method} {view_name or request.path} : " + ' ; '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def check(self, view_name, recorder):
+        problems = []
+        budget = get_query_budget(view_name)
+        if budget is not None and recorder.budget_count > budget:
+            problems.append(f"{recorder.budget_count} requêtes SQL pour un budget de {budget}")
+        for shape, count in recorder.repeated():
+            problems.append(f"N+1 probable ({count} fois) : {shape[:200]}")
+        return problems
@@ -0,0 +1,279 @@
+# templates_app/jobs.py - File de tâches en base de données, sans broker externe
+"""
+Exécution en arrière-plan des traitements longs (export par lots, publipostage).
+
+Les vues créent un ``Job`` en attente ; ``manage.py run_workers`` réclame les
+tâches et les exécute. La réclamation est un « compare-and-swap » :
+``UPDATE ... SET state='running' WHERE id=... AND state='pending'`` ; une seule
+mise à jour peut réussir pour une tâche donnée, ce qui fonctionne aussi bien
+sous SQLite (verrou global en écriture) que sous PostgreSQL.
+
+Pendant l'exécution, un thread met à jour ``heartbeat_at`` toutes les
+``HEARTBEAT_INTERVAL`` secondes. Au démarrage, ``run_workers`` ne reprend que
+les tâches dont le signe de vie est trop ancien (worker arrêté) : une tâche
+longue encore en cours ailleurs n'est jamais exécutée deux fois. Un
+publipostage interrompu n'est pas rejoué (documents déjà créés) : il passe
+en échec.
+"""
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .batch_export import stream_zip_export
+from .exports import format_available
+from .mail_merge import run_mail_merge
+from .models import Job, Template
+from .queries import select_documents
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux écritures de la progression en base
+PROGRESS_INTERVAL = 1.0
+
+# Intervalle (s) entre deux signes de vie d'une tâche en cours
+HEARTBEAT_INTERVAL = 30.0
+
+# Tâches sans effet de bord, relancées sans risque après l'arrêt d'un worker
+REQUEUE_SAFE_KINDS = {'batch_export'}
+
+
+def enqueue(kind, user, params):
+    """Créer une tâche en attente"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Type de tâche inconnu : {kind}")
+    return Job.objects.create(kind=kind, created_by=user, params=params)
+
+
+def claim_next(worker_id):
+    """Réclamer la plus ancienne tâche en attente ; None si la file est vide"""
+    while True:
+        candidate = (
+            Job.objects.filter(state=Job.STATE_PENDING)
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=candidate, state=Job.STATE_PENDING).update(
+            state=Job.STATE_RUNNING,
+            worker=worker_id,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=candidate)
+        # Un autre worker a pris cette tâche entre-temps : essayer la suivante
+
+
+def requeue_stale(max_age):
+    """Reprendre les tâches « en cours » sans signe de vie depuis ``max_age`` secondes
+
+    Les tâches de REQUEUE_SAFE_KINDS sont remises en attente, les autres
+    passent en échec. Retourne (remises en attente, passées en échec).
+    """
+    limit = timezone.now() - timedelta(seconds=max_age)
+    stale = Job.objects.filter(state=Job.STATE_RUNNING).filter(
+        Q(heartbeat_at__lt=limit) | Q(heartbeat_at__isnull=True, started_at__lt=limit)
+    )
+    requeued = stale.filter(kind__in=REQUEUE_SAFE_KINDS).update(
+        state=Job.STATE_PENDING, worker='', started_at=None, heartbeat_at=None, progress=0,
+    )
+    abandoned = list(stale.exclude(kind__in=REQUEUE_SAFE_KINDS).values_list('pk', 'params'))
+    failed = Job.objects.filter(pk__in=[pk for pk, _ in abandoned], state=Job.STATE_RUNNING).update(
+        state=Job.STATE_FAILED, finished_at=timezone.now(),
+        error="Worker arrêté pendant l'exécution ; tâche non relancée (résultat partiel possible).",
+    )
+    # Fichiers déposés des tâches abandonnées : plus jamais lus
+    for _, params in abandoned:
+        if params.get('csv_file'):
+            discard_upload(params['csv_file'])
+    return requeued, failed
+
+
+class Heartbeat:
+    """Thread mettant à jour ``heartbeat_at`` d'une tâche tant qu'elle s'exécute"""
+
+    def __init__(self, job, interval=None):
+        self.job_id = job.pk
+        self.interval = interval or HEARTBEAT_INTERVAL
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                Job.objects.filter(pk=self.job_id, state=Job.STATE_RUNNING).update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class ProgressReporter:
+    """Enregistre la progression d'une tâche au plus une fois par intervalle"""
+
+    def __init__(self, job, total):
+        self.job = job
+        self.last_write = 0.0
+        job.total = total
+        Job.objects.filter(pk=job.pk).update(total=total)
+
+    def __call__(self, done):
+        self.job.progress = done
+        now = time.monotonic()
+        if now - self.last_write >= PROGRESS_INTERVAL or done == self.job.total:
+            self.last_write = now
+            Job.objects.filter(pk=self.job.pk).update(progress=done, heartbeat_at=timezone.now())
+
+
+def job_file_path(relative):
+    """Chemin absolu d'un fichier de tâche, relatif à JOBS_DIR (hors de MEDIA_ROOT)"""
+    path = Path(settings.JOBS_DIR) / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save_upload(uploaded_file, extension):
+    """Enregistrer un fichier déposé avant la création de sa tâche
+
+    Retourne le chemin relatif à JOBS_DIR (``uploads/<uuid>.<ext>``) : la
+    tâche est créée ensuite avec tous ses paramètres, jamais incomplète.
+    """
+    relative = f'uploads/{uuid.uuid4().hex}.{extension}'
+    with open(job_file_path(relative), 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    return relative
+
+
+def discard_upload(relative):
+    """Supprimer un fichier déposé dont la tâche est terminée"""
+    try:
+        os.remove(Path(settings.JOBS_DIR) / relative)
+    except FileNotFoundError:
+        pass
+
+
+def job_output_path(job, filename):
+    """Chemin (absolu, relatif à JOBS_DIR) d'un fichier produit par une tâche"""
+    relative = f'results/{job.pk}/{filename}'
+    return job_file_path(relative), relative
+
+
+# ===============================
+# TYPES DE TÂCHES
+# ===============================
+
+def run_batch_export_job(job):
+    """Export par lots : écrit l'archive ZIP dans JOBS_DIR/results/<id>/"""
+    params = job.params
+    export_format = params.get('format', 'pdf')
+    if not format_available(export_format):
+        raise RuntimeError(f"Export {export_format} indisponible : bibliothèque manquante.")
+
+    documents = select_documents(
+        job.created_by,
+        ids=params.get('ids'),
+        search=params.get('search', ''),
+        template=params.get('template', ''),
+        status=params.get('status', ''),
+    )
+    progress = ProgressReporter(job, documents.count())
+
+    path, relative = job_output_path(job, f'documents_{job.pk}_{export_format}.zip')
+    with open(path, 'wb') as archive:
+        for chunk in stream_zip_export(documents, export_format, progress=progress):
+            archive.write(chunk)
+
+    job.result_file.name = relative
+    job.result = {'documents': job.total, 'size': os.path.getsize(path)}
+
+
+def run_mail_merge_job(job):
+    """Publipostage à partir d'un CSV déposé dans JOBS_DIR/uploads/
+
+    Le CSV (données personnelles) est supprimé à la fin, succès ou échec :
+    un publipostage n'est jamais rejoué.
+    """
+    params = job.params
+    try:
+        template = Template.objects.get(pk=params['template_id'])
+        with open(Path(settings.JOBS_DIR) / params['csv_file'], 'rb') as raw:
+            csv_file = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            result = run_mail_merge(template, csv_file, job.created_by, delimiter=params.get('delimiter', ','))
+    finally:
+        discard_upload(params['csv_file'])
+
+    job.total = job.progress = result.rows
+    job.result = {
+        'created': result.created,
+        'error_count': result.error_count,
+        'errors': result.errors,
+        'ignored_columns': result.ignored_columns,
+        'rows_per_second': round(result.rows_per_second, 1),
+    }
+
+
+JOB_HANDLERS = {
+    'batch_export': run_batch_export_job,
+    'mail_merge': run_mail_merge_job,
+}
+
+
+def run_job(job):
+    """Exécuter une tâche réclamée et enregistrer son état final"""
+    try:
+        with Heartbeat(job):
+            JOB_HANDLERS[job.kind](job)
+    except Exception as e:
+        logger.exception("Tâche %s en échec", job.pk)
+        job.state = Job.STATE_FAILED
+        job.error = str(e)
+    else:
+        job.state = Job.STATE_SUCCEEDED
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'state', 'error', 'result', 'result_file', 'progress', 'total', 'finished_at',
+    ])
+    logger.info("Tâche %s : %s en %s", job.pk, job.state, job.run_time)
+    return job
+
+
+def work(worker_id, poll_interval=1.0, once=False, stop=None):
+    """Boucle d'un worker : réclamer, exécuter, recommencer
+
+    ``once`` : s'arrêter dès que la file est vide. ``stop`` : threading.Event
+    optionnel demandant l'arrêt.
+    """
+    processed = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        job = claim_next(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    close_old_connections()
+    return processed
@@ -0,0 +1,357 @@
+# templates_app/loadtest.py - Générateur de charge sur un serveur local
+"""
+Test de charge de bout en bout (``manage.py loadtest``).
+
+Des utilisateurs virtuels (tâches asyncio) se connectent avec les comptes
+générés par ``seed_perf_data`` puis rejouent un mélange pondéré des routes de
+``urls.py`` : listes, documents, aperçus, édition, exports. Chaque
+utilisateur a sa connexion HTTP/1.1 persistante et ses cookies ; le client
+HTTP est écrit sur ``asyncio.open_connection`` (bibliothèque standard).
+
+Les cibles (ids de documents et de templates, valeurs des formulaires
+d'édition) sont lues dans la base avant le lancement : le serveur testé
+doit utiliser la même base.
+
+Le rapport donne par route le débit, les percentiles de latence et le taux
+d'erreurs (statut >= 400, redirection vers la connexion, délai dépassé,
+connexion perdue). Une rampe de concurrence enchaîne plusieurs paliers et
+indique le point de saturation : le dernier palier qui apporte encore au
+moins ``RAMP_MIN_GAIN`` de débit.
+"""
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+from .models import Document, TemplateField
+from .queries import visible_templates
+
+# Gain de débit minimal d'un palier de la rampe sur le précédent
+RAMP_MIN_GAIN = 0.10
+
+# Cibles lues par utilisateur
+MAX_TARGETS = 200
+MAX_EDIT_TARGETS = 50
+
+DEFAULT_TIMEOUT = 30.0
+
+# Poids des routes (proportion des requêtes) : consultation surtout
+DEFAULT_MIX = {
+    'template_list': 12,
+    'document_list': 14,
+    'dashboard': 8,
+    'search_global': 5,
+    'template_detail': 8,
+    'template_preview_page': 4,
+    'document_detail': 16,
+    'document_preview': 8,
+    'document_edit': 5,
+    'document_export_html': 6,
+    'document_export_pdf': 5,
+    'document_export_docx': 5,
+    'job_list': 2,
+}
+
+# Routes qui prennent l'id d'un document
+DOCUMENT_ROUTES = {
+    'document_detail', 'document_preview', 'document_export_html', 'document_export_pdf', 'document_export_docx',
+}
+
+SEARCH_TERMS = ['courrier', 'client', 'modèle', 'salutations', 'contrat']
+
+
+class LoadTestError(Exception):
+    """Réponse HTTP illisible ou connexion impossible"""
+
+
+# ===============================
+# CLIENT HTTP
+# ===============================
+
+class HttpClient:
+    """Connexion HTTP/1.1 persistante avec cookies, pour un utilisateur virtuel"""
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise LoadTestError(f"Seul http:// est pris en charge : {base_url}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None):
+        """(statut, en-têtes {nom en minuscules: [valeurs]}, corps)"""
+        body = urlencode(data).encode() if data is not None else b''
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                # Connexion persistante fermée par le serveur entre deux requêtes
+                if not reused or attempt == 2:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+    async def _exchange(self, method, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        headers = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+            'Accept-Encoding: identity',
+        ]
+        if self.cookies:
+            headers.append('Cookie: ' + '; '.join(f'{name}={value}' for name, value in self.cookies.items()))
+        if method == 'POST':
+            headers.append('Content-Type: application/x-www-form-urlencoded')
+            headers.append(f'Referer: http://{self.host}:{self.port}{path}')
+            if 'csrftoken' in self.cookies:
+                headers.append(f"X-CSRFToken: {self.cookies['csrftoken']}")
+        headers.append(f'Content-Length: {len(body)}')
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connexion fermée par le serveur")
+        try:
+            version, status = status_line.decode('latin-1').split()[:2]
+            status = int(status)
+        except ValueError:
+            raise LoadTestError(f"Ligne de statut invalide : {status_line!r}")
+
+        response_headers = defaultdict(list)
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()].append(value.strip())
+
+        for cookie in response_headers.get('set-cookie', []):
+            name, _, rest = cookie.partition('=')
+            self.cookies[name.strip()] = rest.split(';', 1)[0]
+
+        chunked = 'chunked' in ','.join(response_headers.get('transfer-encoding', [])).lower()
+        content = await self._read_body(response_headers, chunked)
+        keep_alive = (version != 'HTTP/1.0'
+                      and 'close' not in ','.join(response_headers.get('connection', [])).lower()
+                      and (chunked or 'content-length' in response_headers))
+        if not keep_alive:
+            await self.close()
+        return status, response_headers, content
+
+    async def _read_body(self, headers, chunked):
+        if chunked:
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    return b''.join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+        if 'content-length' in headers:
+            return await self.reader.readexactly(int(headers['content-length'][0]))
+        # Réponse en flux sans longueur : jusqu'à la fermeture
+        return await self.reader.read()
+
+    async def login(self, username, password):
+        login_path = reverse('templates_app:login')
+        await self.request('GET', login_path)
+        status, headers, _ = await self.request('POST', login_path, {
+            'username': username, 'password': password,
+            'csrfmiddlewaretoken': self.cookies.get('csrftoken', ''),
+        })
+        if status != 302 or 'sessionid' not in self.cookies:
+            raise LoadTestError(f"Connexion de {username} refusée (statut {status})")
+
+
+# ===============================
+# SCÉNARIO
+# ===============================
+
+class UserTargets:
+    """Objets d'un utilisateur visés par les routes, lus dans la base"""
+
+    def __init__(self, user):
+        self.username = user.username
+        documents = list(
+            Document.objects.filter(created_by=user).order_by('-updated_at', '-id')
+            .values_list('pk', 'title', 'template_id', 'values')[:MAX_TARGETS]
+        )
+        if not documents:
+            raise LoadTestError(f"{user.username} n'a aucun document : lancez seed_perf_data")
+        self.document_ids = [pk for pk, _, _, _ in documents]
+        self.template_ids = list(visible_templates(user).values_list('pk', flat=True)[:MAX_TARGETS])
+
+        # Formulaires d'édition : mêmes valeurs, seule l'écriture est mesurée
+        editable = documents[:MAX_EDIT_TARGETS]
+        fields = defaultdict(list)
+        for template_id, field_id, field_name in TemplateField.objects.filter(
+            template_id__in={template_id for _, _, template_id, _ in editable}
+        ).values_list('template_id', 'pk', 'field_name'):
+            fields[template_id].append((field_id, field_name))
+        self.edit_forms = [
+            (pk, dict({f'field_{field_id}': (values or {}).get(name, '') for field_id, name in fields[template_id]},
+                      document_title=title))
+            for pk, title, template_id, values in editable
+        ]
+
+
+def build_request(route, targets, rng):
+    """(méthode, chemin, données POST) d'une route pour un utilisateur"""
+    document_id = rng.choice(targets.document_ids)
+    if route in ('template_detail', 'template_preview_page'):
+        return 'GET', reverse(f'templates_app:{route}', args=[rng.choice(targets.template_ids)]), None
+    if route == 'search_global':
+        return 'GET', reverse('templates_app:search_global') + '?' + urlencode({'q': rng.choice(SEARCH_TERMS)}), None
+    if route == 'document_edit':
+        document_id, form = rng.choice(targets.edit_forms)
+        return 'POST', reverse('templates_app:document_edit', args=[document_id]), form
+    if route in DOCUMENT_ROUTES:
+        return 'GET', reverse(f'templates_app:{route}', args=[document_id]), None
+    return 'GET', reverse(f'templates_app:{route}'), None
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.error_samples = []
+
+    def record(self, latency, error=None):
+        self.latencies.append(latency)
+        if error:
+            self.errors += 1
+            if len(self.error_samples) < 3:
+                self.error_samples.append(error)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(stats, elapsed):
+    """{route: {requests, errors, error_rate, rps, p50_ms, p90_ms, p99_ms, max_ms}} et le total"""
+    report = {}
+    everything = RouteStats()
+    for route, route_stats in sorted(stats.items()):
+        everything.latencies.extend(route_stats.latencies)
+        everything.errors += route_stats.errors
+        everything.error_samples.extend(route_stats.error_samples)
+        report[route] = _summary(route_stats, elapsed)
+    report['TOTAL'] = _summary(everything, elapsed)
+    return report
+
+
+def _summary(stats, elapsed):
+    ordered = sorted(stats.latencies)
+    count = len(ordered)
+    if not count:
+        return {'requests': 0, 'errors': 0, 'error_rate': 0.0, 'rps': 0.0}
+    return {
+        'requests': count,
+        'errors': stats.errors,
+        'error_rate': round(stats.errors / count, 4),
+        'rps': round(count / elapsed, 2),
+        'p50_ms': round(statistics.median(ordered) * 1000, 1),
+        'p90_ms': round(percentile(ordered, 0.90) * 1000, 1),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1),
+        'error_samples': stats.error_samples[:3],
+    }
+
+
+async def virtual_user(number, client, targets, mix, deadline, stats, think_time, seed):
+    """Boucle d'un utilisateur connecté : une route tirée selon ``mix`` à chaque tour"""
+    rng = random.Random(seed * 1000 + number)
+    routes, weights = zip(*mix.items())
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, data = build_request(route, targets, rng)
+        start = time.perf_counter()
+        error = None
+        try:
+            status, headers, _ = await client.request(method, path, data)
+            location = headers.get('location', [''])[0]
+            if status in (301, 302) and '/login/' in location:
+                error = 'redirection vers la connexion'
+            elif method == 'POST' and status == 302:
+                # Comme un navigateur : page de destination (et son message) comprise
+                status, _, _ = await client.request('GET', location)
+            if status >= 400:
+                error = f'HTTP {status}'
+        except asyncio.TimeoutError:
+            error = 'délai dépassé'
+        except (OSError, asyncio.IncompleteReadError, LoadTestError) as e:
+            error = f'{type(e).__name__}: {e}'
+        stats[route].record(time.perf_counter() - start, error)
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+
+
+async def run_step(base_url, targets, password, concurrency, duration, mix=None, think_time=0.0,
+                   timeout=DEFAULT_TIMEOUT, seed=42):
+    """Un palier : ``concurrency`` utilisateurs pendant ``duration`` secondes ; retourne le rapport"""
+    mix = {route: weight for route, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+    users = [(HttpClient(base_url, timeout), targets[number % len(targets)]) for number in range(concurrency)]
+    try:
+        # Connexions (hachage du mot de passe côté serveur) hors chronométrage
+        logins = await asyncio.gather(
+            *(client.login(user_targets.username, password) for client, user_targets in users),
+            return_exceptions=True,
+        )
+        failures = [result for result in logins if isinstance(result, BaseException)]
+        active = [user for user, result in zip(users, logins) if not isinstance(result, BaseException)]
+        if not active:
+            raise LoadTestError(f"Aucun utilisateur connecté : {failures[0]}")
+
+        stats = defaultdict(RouteStats)
+        start = time.monotonic()
+        await asyncio.gather(*(
+            virtual_user(number, client, user_targets, mix, start + duration, stats, think_time, seed)
+            for number, (client, user_targets) in enumerate(active)
+        ))
+        elapsed = time.monotonic() - start
+    finally:
+        await asyncio.gather(*(client.close() for client, _ in users))
+
+    report = summarize(stats, elapsed)
+    report['TOTAL']['concurrency'] = concurrency
+    report['TOTAL']['failed_logins'] = len(failures)
+    return report
+
+
+def saturation_point(steps):
+    """Concurrence du dernier palier ayant gagné au moins RAMP_MIN_GAIN de débit"""
+    best = None
+    previous_rps = None
+    for step in steps:
+        total = step['TOTAL']
+        if previous_rps is None or total['rps'] >= previous_rps * (1 + RAMP_MIN_GAIN):
+            best = total['concurrency']
+        else:
+            break
+        previous_rps = total['rps']
+    return best
@@ -0,0 +1,41 @@
+# templates_app/management/commands/backfill_document_values.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from templates_app.field_values import refresh_value_snapshots, stale_value_snapshots
+from templates_app.models import Document
+
+
+class Command(BaseCommand):
+    help = "Remplir la copie Document.values et la comparer aux DocumentFieldValue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Signaler les copies divergentes sans rien modifier")
+        parser.add_argument('--all', action='store_true',
+                            help="Recalculer toutes les copies, pas seulement celles qui manquent")
+
+    def handle(self, *args, **options):
+        documents = Document.objects.order_by('pk')
+        missing = list(documents.filter(values__isnull=True).values_list('pk', flat=True))
+        stale = stale_value_snapshots(documents.values_list('pk', flat=True))
+
+        for document_id in stale[:20]:
+            self.stdout.write(self.style.WARNING(f"Document {document_id} : copie divergente"))
+        if len(stale) > 20:
+            self.stdout.write(self.style.WARNING(f"... et {len(stale) - 20} autre(s)"))
+
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS(
+                f"{documents.count()} document(s) vérifié(s) : {len(stale)} copie(s) divergente(s), "
+                f"{len(missing)} manquante(s)"
+            ))
+            return
+
+        if options['all']:
+            targets = list(documents.values_list('pk', flat=True))
+        else:
+            targets = missing + stale
+        with transaction.atomic():
+            refreshed = refresh_value_snapshots(targets)
+        self.stdout.write(self.style.SUCCESS(f"{refreshed} copie(s) recalculée(s)"))
@@ -0,0 +1,87 @@
+# templates_app/management/commands/bench_batch_export.py
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from templates_app.batch_export import stream_zip_export
+from templates_app.exports import CONTENT_TYPES, format_available
+from templates_app.models import Template, TemplateField, Document, DocumentFieldValue
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mesurer le temps avant le premier octet et la mémoire de l'export ZIP par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 10000])
+        parser.add_argument('--format', default='html', choices=sorted(CONTENT_TYPES))
+        parser.add_argument('--lines', type=int, default=40, help="Lignes par document")
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        if not format_available(export_format):
+            raise CommandError(f"Export {export_format} indisponible : bibliothèque manquante.")
+
+        self.stdout.write(
+            f"{'documents':>10} {'1er octet (ms)':>15} {'total (s)':>10} {'taille (Mo)':>12} "
+            f"{'pic Python (Mo)':>16} {'RSS max (Mo)':>13}"
+        )
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    documents = self.seed(size, options['lines'])
+                    self.measure(size, documents, export_format)
+                    # Les données de mesure ne sont jamais conservées
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def seed(self, size, lines):
+        user = User.objects.create_user(f'bench-export-{size}-{time.time_ns()}')
+        content = '\n'.join(f'Ligne {i} pour {{{{nom_client}}}} à {{{{ville}}}}.' for i in range(lines))
+        template = Template.objects.create(title='Bench export', content=content, created_by=user)
+        nom = TemplateField.objects.create(template=template, field_name='nom_client', field_label='Nom')
+        ville = TemplateField.objects.create(template=template, field_name='ville', field_label='Ville')
+
+        documents = Document.objects.bulk_create([
+            Document(
+                template=template, title=f'Lettre {i}', created_by=user, is_completed=True,
+                values={field.field_name: f'{field.field_name} {i}' for field in (nom, ville)},
+            )
+            for i in range(size)
+        ])
+        DocumentFieldValue.objects.bulk_create([
+            DocumentFieldValue(document=document, template_field=field, value=f'{field.field_name} {i}')
+            for i, document in enumerate(documents)
+            for field in (nom, ville)
+        ])
+        return Document.objects.filter(created_by=user).order_by('-updated_at', '-id')
+
+    def measure(self, size, documents, export_format):
+        tracemalloc.start()
+        start = time.perf_counter()
+        first_byte = None
+        total_bytes = 0
+
+        for chunk in stream_zip_export(documents, export_format):
+            if first_byte is None and chunk:
+                first_byte = time.perf_counter() - start
+            # Simule l'envoi au client : les octets ne sont pas conservés
+            total_bytes += len(chunk)
+
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        self.stdout.write(
+            f"{size:>10} {first_byte * 1000:>15.1f} {elapsed:>10.2f} {total_bytes / 1e6:>12.2f} "
+            f"{peak / 1e6:>16.2f} {max_rss:>13.1f}"
+        )
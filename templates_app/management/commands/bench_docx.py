@@ -0,0 +1,77 @@
+# templates_app/management/commands/bench_docx.py
+import multiprocessing
+import resource
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from templates_app.exports import (
+    PYTHON_DOCX_AVAILABLE, render_to_bytes, write_docx_python_docx, write_docx_xml,
+)
+
+# python-docx d'abord : c'est la référence du gain
+ENGINES = {
+    'python-docx': write_docx_python_docx,
+    'xml': write_docx_xml,
+}
+
+
+def _peak_rss_child(write, args, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    render_to_bytes(write, *args)
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+
+
+def peak_rss(write, args):
+    """Hausse du pic de mémoire résidente (Ko) pendant un rendu, mesurée dans un
+    processus fils : tracemalloc ne voit pas la mémoire allouée par lxml"""
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_peak_rss_child, args=(write, args, queue))
+    process.start()
+    delta = queue.get()
+    process.join()
+    return delta
+
+
+class Command(BaseCommand):
+    help = "Comparer l'écriture DOCX directe et python-docx sur des lettres de plusieurs tailles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1000, 50000], help="Lignes par lettre")
+        parser.add_argument('--repeat', type=int, default=3, help="Rendus mesurés par moteur et taille")
+
+    def handle(self, *args, **options):
+        engines = dict(ENGINES)
+        if not PYTHON_DOCX_AVAILABLE:
+            self.stdout.write(self.style.WARNING("python-docx non installé : seule l'écriture directe est mesurée"))
+            del engines['python-docx']
+        if options['repeat'] < 1:
+            raise CommandError("--repeat doit être au moins 1")
+
+        self.stdout.write(
+            f"{'lignes':>8} {'moteur':<12} {'médiane (ms)':>13} {'pic RSS (Mo)':>13} {'taille (Ko)':>12} {'accélération':>13}"
+        )
+        for lines in options['lines']:
+            content = '\n'.join(
+                f'Ligne {i} : Madame, Monsieur, nous accusons réception de votre courrier du {i % 28 + 1}/03.'
+                for i in range(lines)
+            )
+            reference = None
+            for name, write in engines.items():
+                args = (f'Lettre de {lines} lignes', content, 'Bench DOCX')
+                data = render_to_bytes(write, *args)  # Chauffe (squelette, styles)
+
+                samples = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    render_to_bytes(write, *args)
+                    samples.append(time.perf_counter() - start)
+                median = statistics.median(samples)
+                reference = reference or median
+
+                self.stdout.write(
+                    f"{lines:>8} {name:<12} {median * 1000:>13.1f} {peak_rss(write, args) / 1024:>13.1f} "
+                    f"{len(data) / 1024:>12.1f} {reference / median:>12.1f}x"
+                )
@@ -0,0 +1,102 @@
+# templates_app/management/commands/bench_export_coalescing.py
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from templates_app.exports import format_available, RENDERERS
+
+
+def _fire(export_format, concurrency, cache_dir, counter, delay, barrier=None):
+    """Lancer ``concurrency`` téléchargements simultanés du même export"""
+    # Import tardif : un processus enfant « spawn » configure Django avant
+    from templates_app.views import export_download
+
+    renderer = RENDERERS[export_format]
+    template = SimpleNamespace(title='Bench coalescing')
+    document = SimpleNamespace(title='Lettre partagée', template=template)
+    content = '\n'.join(f'Ligne {i} : Madame, Monsieur,' for i in range(60))
+
+    def counting_render(title, rendered_content, template_title):
+        with counter.get_lock():
+            counter.value += 1
+        time.sleep(delay)  # Rendu lent : maximise le recouvrement des demandes
+        return renderer(title, rendered_content, template_title)
+
+    # Entre processus, la barrière partagée aligne toutes les demandes
+    barrier = barrier or threading.Barrier(concurrency)
+    sizes = []
+
+    def request():
+        barrier.wait()
+        response = export_download(export_format, document, content, counting_render)
+        sizes.append(len(b''.join(response)))
+        response.close()
+
+    with override_settings(EXPORT_CACHE_ENABLED=cache_dir is not None, EXPORT_CACHE_DIR=cache_dir):
+        threads = [threading.Thread(target=request) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return sizes
+
+
+def _fire_in_child(export_format, concurrency, cache_dir, counter, delay, barrier):
+    import django
+    django.setup()
+    _fire(export_format, concurrency, cache_dir, counter, delay, barrier)
+
+
+class Command(BaseCommand):
+    help = "Test de charge : N demandes simultanées du même export ne doivent produire qu'un rendu"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='pdf', choices=sorted(RENDERERS))
+        parser.add_argument('--concurrency', type=int, default=50, help="Demandes simultanées par processus")
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--delay', type=float, default=0.2, help="Durée ajoutée à chaque rendu (s)")
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        if not format_available(export_format):
+            raise CommandError(f"Export {export_format} indisponible : bibliothèque manquante.")
+
+        total = options['concurrency'] * options['processes']
+        self.stdout.write(f"{total} demandes simultanées ({options['processes']} processus), format {export_format}")
+
+        scenarios = [('cache disque + verrou fichier', True)]
+        if options['processes'] == 1:
+            scenarios.append(('sans cache disque', False))
+
+        context = multiprocessing.get_context('spawn')
+        for label, use_store in scenarios:
+            cache_dir = tempfile.mkdtemp() if use_store else None
+            counter = context.Value('i', 0)
+            start = time.perf_counter()
+            try:
+                if options['processes'] == 1:
+                    _fire(export_format, options['concurrency'], cache_dir, counter, options['delay'])
+                else:
+                    barrier = context.Barrier(total)
+                    children = [
+                        context.Process(target=_fire_in_child, args=(
+                            export_format, options['concurrency'], cache_dir, counter, options['delay'], barrier,
+                        ))
+                        for _ in range(options['processes'])
+                    ]
+                    for child in children:
+                        child.start()
+                    for child in children:
+                        child.join()
+            finally:
+                if cache_dir:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(f"  {label:<32} {counter.value:>4} rendu(s) pour {total} demandes en {elapsed:.2f} s")
@@ -0,0 +1,52 @@
+# templates_app/management/commands/bench_pdf_pool.py
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from templates_app import pdf_service
+from templates_app.exports import format_available
+
+
+class Command(BaseCommand):
+    help = "Mesurer le débit du rendu PDF par lots selon le nombre de workers"
+
+    def add_arguments(self, parser):
+        cpus = os.cpu_count() or 1
+        parser.add_argument('--workers', type=int, nargs='+', default=sorted({0, 1, min(2, cpus), cpus}),
+                            help="0 = rendu dans le processus courant, sans pool")
+        parser.add_argument('--documents', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=60, help="Lignes par document")
+
+    def handle(self, *args, **options):
+        if not format_available('pdf'):
+            raise CommandError("Aucune bibliothèque PDF installée (reportlab ou weasyprint).")
+
+        content = '\n'.join(
+            f'Ligne {i} : Madame, Monsieur, nous accusons réception de votre courrier.'
+            for i in range(options['lines'])
+        )
+        jobs = [(i, (f'Lettre {i}', content, 'Bench PDF')) for i in range(options['documents'])]
+
+        self.stdout.write(f"CPU disponibles : {os.cpu_count()}")
+        self.stdout.write(f"{'workers':>10} {'durée (s)':>10} {'docs/s':>8} {'accélération':>13}")
+
+        baseline = None
+        for workers in options['workers']:
+            with override_settings(PDF_RENDER_WORKERS=workers):
+                pdf_service.shutdown()
+                # Démarrage et chargement des ressources hors mesure
+                list(pdf_service.render_many(jobs[:max(workers, 1)]))
+
+                start = time.perf_counter()
+                for _, result in pdf_service.render_many(jobs):
+                    if isinstance(result, Exception):
+                        raise CommandError(f"Échec du rendu : {result}")
+                elapsed = time.perf_counter() - start
+                pdf_service.shutdown()
+
+            rate = len(jobs) / elapsed
+            baseline = baseline or rate
+            label = 'sans pool' if workers == 0 else str(workers)
+            self.stdout.write(f"{label:>10} {elapsed:>10.2f} {rate:>8.1f} {rate / baseline:>12.2f}x")
@@ -0,0 +1,67 @@
+# templates_app/management/commands/bench_perf.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from templates_app.benchmarks import compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Mesurer les vues principales et le rendu à plusieurs volumes ; comparer à une référence JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000],
+                            help="Documents par utilisateur, un jeu de mesures par valeur")
+        parser.add_argument('--repeat', type=int, default=15, help="Appels mesurés par vue")
+        parser.add_argument('--users', type=int, default=2)
+        parser.add_argument('--templates', type=int, default=10, help="Templates par utilisateur")
+        parser.add_argument('--placeholders', type=int, default=10, help="Placeholders par template")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+        parser.add_argument('--baseline', help="Résultats JSON de référence (commit précédent)")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Ralentissement toléré de la médiane (0.2 : +20 %%)")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="Écart minimal (ms) pour signaler une régression")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        self.stdout.write(f"{'documents':>10} {'mesure':<28} {'médiane (ms)':>13} {'p95 (ms)':>10} {'SQL':>5}")
+
+        def progress(size, results):
+            for name, result in results.items():
+                self.stdout.write(
+                    f"{size:>10} {name:<28} {result['median_ms']:>13.2f} {result['p95_ms']:>10.2f} "
+                    f"{result.get('queries', ''):>5}"
+                )
+
+        data = run_benchmarks(
+            options['sizes'], repeat=options['repeat'], users=options['users'],
+            templates=options['templates'], placeholders=options['placeholders'], progress=progress,
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(data, file, indent=2, sort_keys=True)
+            self.stdout.write(f"Résultats écrits dans {options['output']}")
+
+        if baseline is None:
+            return
+
+        rows = compare_results(baseline, data, options['threshold'], options['min_delta_ms'])
+        self.stdout.write(f"\nComparaison avec {options['baseline']} (commit {baseline['meta'].get('commit')})")
+        regressions = 0
+        for size, name, old, new, ratio, regression in rows:
+            line = f"{size:>10} {name:<28} {old:>10.2f} -> {new:>10.2f} ms ({ratio:.2f}x)"
+            if regression:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + " RÉGRESSION"))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{regressions} mesure(s) au-delà du seuil de {options['threshold']:.0%}")
+        self.stdout.write(self.style.SUCCESS("Aucune régression"))
@@ -0,0 +1,56 @@
+# templates_app/management/commands/bench_render.py
+import random
+import string
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from templates_app.rendering import compile_content, render_with_replace
+
+
+def build_sample(placeholders, words_between):
+    """Construire un contenu synthétique et ses valeurs"""
+    rng = random.Random(42)
+    names = [f'champ_{i}' for i in range(placeholders)]
+    chunks = []
+    for name in names:
+        words = ' '.join(
+            ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+            for _ in range(words_between)
+        )
+        chunks.append(f'{words} {{{{{name}}}}}')
+    content = '\n'.join(chunks)
+    values = {name: f'Valeur {i}' for i, name in enumerate(names)}
+    return content, values
+
+
+class Command(BaseCommand):
+    help = "Comparer le moteur de rendu compilé à l'ancienne boucle str.replace"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--placeholders', type=int, nargs='+', default=[10, 50, 200, 500])
+        parser.add_argument('--words', type=int, default=20, help="Mots entre deux placeholders")
+        parser.add_argument('--number', type=int, default=200, help="Rendus par mesure")
+
+    def handle(self, *args, **options):
+        number = options['number']
+        self.stdout.write(f"{'placeholders':>12} {'replace (ms)':>14} {'compilé (ms)':>14} {'gain':>8}")
+
+        for count in options['placeholders']:
+            content, values = build_sample(count, options['words'])
+            compiled = compile_content(content)
+
+            # Vérifier que les deux implémentations produisent le même texte
+            assert compiled.render(values) == render_with_replace(content, values)
+
+            replace_time = min(timeit.repeat(
+                lambda: render_with_replace(content, values), number=number, repeat=3
+            )) / number
+            compiled_time = min(timeit.repeat(
+                lambda: compiled.render(values), number=number, repeat=3
+            )) / number
+
+            self.stdout.write(
+                f"{count:>12} {replace_time * 1000:>14.3f} {compiled_time * 1000:>14.3f} "
+                f"{replace_time / compiled_time:>7.1f}x"
+            )
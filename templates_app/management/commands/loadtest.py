@@ -0,0 +1,148 @@
+# templates_app/management/commands/loadtest.py
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from templates_app.loadtest import (
+    DEFAULT_MIX, RAMP_MIN_GAIN, LoadTestError, UserTargets, run_step, saturation_point,
+)
+from templates_app.perf_data import perf_users
+
+
+def parse_mix(value):
+    """``route=poids,route=poids`` ; les routes absentes gardent leur poids par défaut"""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, value.split(',')):
+        route, _, weight = item.partition('=')
+        route = route.strip()
+        if route not in DEFAULT_MIX:
+            raise CommandError(f"Route inconnue : {route} (routes : {', '.join(DEFAULT_MIX)})")
+        try:
+            mix[route] = float(weight)
+        except ValueError:
+            raise CommandError(f"Poids invalide pour {route} : {weight!r}")
+    return mix
+
+
+class Command(BaseCommand):
+    help = "Test de charge : utilisateurs virtuels sur un serveur local, débit et latences par route"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Serveur testé")
+        parser.add_argument('--start-server', action='store_true',
+                            help="Démarrer runserver (--noreload) sur l'adresse de --url pendant le test")
+        parser.add_argument('--prefix', default='perf', help="Comptes <prefix>-<n> créés par seed_perf_data")
+        parser.add_argument('--password', help="Mot de passe des comptes (par défaut <prefix>-password)")
+        parser.add_argument('--concurrency', type=int, default=10, help="Utilisateurs simultanés")
+        parser.add_argument('--ramp', type=int, nargs='+',
+                            help="Paliers de concurrence (ex. 1 2 4 8 16) : recherche du point de saturation")
+        parser.add_argument('--duration', type=float, default=30.0, help="Durée de chaque palier (secondes)")
+        parser.add_argument('--think-ms', type=float, default=0.0,
+                            help="Temps de réflexion moyen entre deux requêtes d'un utilisateur")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Délai maximal d'une requête (secondes)")
+        parser.add_argument('--mix', default='', help="Poids des routes : document_detail=20,document_edit=0")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Fichier JSON où écrire les rapports")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        users = perf_users(prefix)
+        if not users.exists():
+            raise CommandError(f"Aucun compte {prefix}-<n> : lancez d'abord manage.py seed_perf_data")
+        try:
+            targets = [UserTargets(user) for user in users]
+        except LoadTestError as e:
+            raise CommandError(str(e))
+
+        mix = parse_mix(options['mix'])
+        password = options['password'] or f'{prefix}-password'
+        steps = options['ramp'] or [options['concurrency']]
+
+        server = self.start_server(options['url']) if options['start_server'] else None
+        reports = []
+        try:
+            for concurrency in steps:
+                self.stdout.write(f"\n{concurrency} utilisateur(s) pendant {options['duration']:.0f} s sur {options['url']}")
+                try:
+                    report = asyncio.run(run_step(
+                        options['url'], targets, password, concurrency, options['duration'], mix=mix,
+                        think_time=options['think_ms'] / 1000, timeout=options['timeout'], seed=options['seed'],
+                    ))
+                except (LoadTestError, OSError) as e:
+                    raise CommandError(f"Test de charge interrompu : {e}")
+                self.print_report(report)
+                reports.append(report)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        if len(reports) > 1:
+            self.stdout.write(f"\n{'utilisateurs':>12} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'erreurs':>8}")
+            for report in reports:
+                total = report['TOTAL']
+                self.stdout.write(
+                    f"{total['concurrency']:>12} {total['rps']:>9.1f} {total.get('p50_ms', 0):>9.1f} "
+                    f"{total.get('p99_ms', 0):>9.1f} {total['error_rate']:>8.1%}"
+                )
+            saturation = saturation_point(reports)
+            if saturation == reports[-1]['TOTAL']['concurrency']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Pas de saturation jusqu'à {saturation} utilisateur(s) : prolongez la rampe"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Saturation vers {saturation} utilisateur(s) simultané(s) "
+                    f"(au-delà, le débit progresse de moins de {RAMP_MIN_GAIN:.0%})"
+                ))
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'url': options['url'], 'mix': mix, 'duration': options['duration'], 'steps': reports},
+                          file, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Rapports écrits dans {options['output']}")
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'route':<24} {'requêtes':>9} {'req/s':>8} {'p50 (ms)':>9} {'p90 (ms)':>9} "
+            f"{'p99 (ms)':>9} {'max (ms)':>9} {'erreurs':>8}"
+        )
+        for route, stats in report.items():
+            if not stats['requests']:
+                continue
+            line = (
+                f"{route:<24} {stats['requests']:>9} {stats['rps']:>8.1f} {stats['p50_ms']:>9.1f} "
+                f"{stats['p90_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f} {stats['error_rate']:>8.1%}"
+            )
+            self.stdout.write(self.style.ERROR(line) if stats['errors'] else line)
+            for sample in stats['error_samples'] if route != 'TOTAL' else []:
+                self.stdout.write(f"{'':<24} {sample}")
+        if report['TOTAL'].get('failed_logins'):
+            self.stdout.write(self.style.WARNING(f"{report['TOTAL']['failed_logins']} connexion(s) refusée(s)"))
+
+    def start_server(self, url):
+        """runserver sur l'hôte et le port de ``url`` ; attend qu'il accepte les connexions"""
+        parts = urlsplit(url)
+        address = f'{parts.hostname}:{parts.port or 80}'
+        server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', '--noreload', address],
+            cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection((parts.hostname, parts.port or 80), timeout=1).close()
+                return server
+            except OSError:
+                if server.poll() is not None:
+                    break
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"Le serveur de développement n'a pas démarré sur {address}")
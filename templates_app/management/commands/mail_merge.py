@@ -0,0 +1,48 @@
+# templates_app/management/commands/mail_merge.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from templates_app.mail_merge import run_mail_merge, MailMergeError, DEFAULT_CHUNK_SIZE
+from templates_app.models import Template
+
+
+class Command(BaseCommand):
+    help = "Créer un document par ligne d'un fichier CSV (publipostage)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_id', type=int)
+        parser.add_argument('csv_path')
+        parser.add_argument('--user', required=True, help="Nom de l'utilisateur propriétaire des documents")
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            template = Template.objects.get(pk=options['template_id'])
+        except Template.DoesNotExist:
+            raise CommandError(f"Template {options['template_id']} introuvable.")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur {options['user']} introuvable.")
+
+        delimiter = '\t' if options['delimiter'] == '\\t' else options['delimiter']
+        try:
+            with open(options['csv_path'], encoding=options['encoding'], newline='') as csv_file:
+                result = run_mail_merge(
+                    template, csv_file, user,
+                    delimiter=delimiter, chunk_size=options['chunk_size'],
+                )
+        except (OSError, MailMergeError) as e:
+            raise CommandError(str(e))
+
+        for line_number, message in result.errors:
+            self.stderr.write(f"Ligne {line_number} : {message}")
+        if result.ignored_columns:
+            self.stdout.write("Colonnes ignorées : " + ', '.join(result.ignored_columns))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} documents créés, {result.error_count} lignes en erreur "
+            f"en {result.elapsed:.2f}s ({result.rows_per_second:.0f} lignes/s)"
+        ))
@@ -0,0 +1,24 @@
+# templates_app/management/commands/rebuild_search_index.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from templates_app.models import Template, Document
+from templates_app.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Reconstruire l'index de recherche plein texte des templates et documents"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        start = time.perf_counter()
+        with transaction.atomic():
+            backend.rebuild()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Index {type(backend).__name__} reconstruit : {Template.objects.count()} templates, "
+            f"{Document.objects.count()} documents en {elapsed:.2f} s"
+        ))
@@ -0,0 +1,45 @@
+# templates_app/management/commands/rebuild_stats.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from templates_app.models import UserStats
+from templates_app.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recalculer les compteurs d'activité (UserStats) depuis les templates et documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', default=[],
+                            help="Nom d'utilisateur (répétable) ; tous les utilisateurs par défaut")
+        parser.add_argument('--check', action='store_true',
+                            help="Signaler les écarts sans rien modifier")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+            missing = set(options['users']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Utilisateur(s) introuvable(s) : {', '.join(sorted(missing))}")
+
+        fields = ['template_count', 'public_template_count', 'document_count', 'completed_document_count']
+        drifted = 0
+        for user_id, username in users.values_list('pk', 'username'):
+            before = UserStats.objects.filter(user_id=user_id).values(*fields).first()
+            if options['check']:
+                # Reconstruction dans une transaction annulée : aucun effet
+                with transaction.atomic():
+                    after = rebuild_user_stats(user_id)
+                    transaction.set_rollback(True)
+            else:
+                after = rebuild_user_stats(user_id)
+
+            after = {field: getattr(after, field) for field in fields}
+            if before != after:
+                drifted += 1
+                self.stdout.write(self.style.WARNING(f"{username} : {before} -> {after}"))
+
+        action = "écart(s) détecté(s)" if options['check'] else "utilisateur(s) corrigé(s)"
+        self.stdout.write(self.style.SUCCESS(f"{users.count()} utilisateur(s) vérifié(s), {drifted} {action}"))
@@ -0,0 +1,57 @@
+# templates_app/management/commands/run_workers.py
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+
+from templates_app import jobs
+
+
+class Command(BaseCommand):
+    help = "Exécuter les tâches en arrière-plan (exports par lots, publipostages)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Nombre de threads de traitement")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Attente (s) quand la file est vide")
+        parser.add_argument('--once', action='store_true',
+                            help="S'arrêter dès que la file est vide")
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help="Reprendre les tâches en cours sans signe de vie depuis N secondes "
+                                 f"(signe de vie toutes les {jobs.HEARTBEAT_INTERVAL:.0f} s)")
+
+    def handle(self, *args, **options):
+        requeued, failed = jobs.requeue_stale(options['stale_after'])
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"{requeued} tâche(s) interrompue(s) remise(s) en attente"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} tâche(s) interrompue(s) passée(s) en échec (non relançables)"))
+
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: stop.set())
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        processed = []
+
+        def target(index):
+            processed.append(jobs.work(
+                f'{prefix}:{index}',
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                stop=stop,
+            ))
+
+        threads = [threading.Thread(target=target, args=(i,), daemon=True) for i in range(options['workers'])]
+        self.stdout.write(f"{len(threads)} worker(s) démarré(s) ({prefix})")
+        for thread in threads:
+            thread.start()
+        # join() avec délai : les signaux restent traités par le thread principal
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+
+        self.stdout.write(self.style.SUCCESS(f"{sum(processed)} tâche(s) traitée(s)"))
@@ -0,0 +1,43 @@
+# templates_app/management/commands/seed_perf_data.py
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from templates_app.perf_data import delete_perf_data, seed_perf_data
+
+
+class Command(BaseCommand):
+    help = "Générer un jeu de données de mesure (utilisateurs <prefix>-<n>, templates, documents)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--templates', type=int, default=20, help="Templates par utilisateur")
+        parser.add_argument('--placeholders', type=int, default=10, help="Placeholders par template")
+        parser.add_argument('--documents', type=int, default=200, help="Documents par utilisateur")
+        parser.add_argument('--paragraphs', type=int, default=12, help="Paragraphes par template")
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur (données reproductibles)")
+        parser.add_argument('--prefix', default='perf', help="Préfixe des noms d'utilisateur")
+        parser.add_argument('--replace', action='store_true',
+                            help="Supprimer d'abord les utilisateurs <prefix>-<n> existants")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['replace']:
+            deleted = delete_perf_data(prefix)
+            self.stdout.write(f"{deleted} utilisateur(s) {prefix}-<n> supprimé(s)")
+        elif User.objects.filter(username=f'{prefix}-1').exists():
+            raise CommandError(f"Des utilisateurs {prefix}-<n> existent déjà : utilisez --replace ou --prefix.")
+
+        start = time.perf_counter()
+        users = seed_perf_data(
+            users=options['users'], categories=options['categories'], templates=options['templates'],
+            placeholders=options['placeholders'], documents=options['documents'],
+            paragraphs=options['paragraphs'], seed=options['seed'], prefix=prefix,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} utilisateur(s), {len(users) * options['templates']} template(s), "
+            f"{len(users) * options['documents']} document(s) créés en {time.perf_counter() - start:.1f} s "
+            f"(mot de passe : {prefix}-password)"
+        ))
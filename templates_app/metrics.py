@@ -0,0 +1,378 @@
+# templates_app/metrics.py - Métriques de l'application (format texte Prometheus)
+"""
+Registre de métriques en mémoire : compteurs, jauges et histogrammes à
+étiquettes, exposés au format texte Prometheus par la vue ``/metrics``.
+
+Plusieurs processus (workers gunicorn, ``run_workers``) : avec
+``settings.METRICS_DIR``, chaque processus écrit ses valeurs dans
+``<METRICS_DIR>/metrics-<pid>.json`` (écriture atomique, au plus une fois par
+``METRICS_FLUSH_INTERVAL`` secondes et à la sortie) ; l'exposition additionne
+les fichiers de tous les processus. Les compteurs et histogrammes d'un
+processus terminé restent comptés, ses jauges non. Vider le répertoire à
+chaque déploiement, comme pour le mode multiprocessus de prometheus_client.
+Sans ``METRICS_DIR``, seules les valeurs du processus courant sont exposées.
+
+Les jauges calculées à la lecture (``collect``), comme la file des tâches,
+sont évaluées par le processus qui répond à ``/metrics``.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Écriture du fichier du processus au plus une fois par intervalle (secondes)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+FILE_PREFIX = 'metrics-'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+    """Métrique à étiquettes ; les valeurs sont gardées par le registre"""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} : étiquettes attendues {self.labelnames}, reçues {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry._add(self, self._key(labels), amount)
+
+
+class Gauge(Metric):
+    """Jauge : valeur courante, ou calculée à la lecture si ``collect`` est fourni
+
+    ``collect()`` retourne {tuple des valeurs d'étiquettes: valeur}.
+    """
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, labelnames=(), collect=None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        self.registry._set(self, self._key(labels), value)
+
+    def inc(self, amount=1, **labels):
+        self.registry._add(self, self._key(labels), amount)
+
+    def dec(self, amount=1, **labels):
+        self.registry._add(self, self._key(labels), -amount)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self.registry._observe(self, self._key(labels), value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observer la durée du bloc (ou de la fonction décorée)"""
+        key = self._key(labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registry._observe(self, key, time.perf_counter() - start)
+
+
+class Registry:
+    """Métriques déclarées et valeurs du processus courant"""
+
+    def __init__(self):
+        self.metrics = {}
+        # {nom: {valeurs d'étiquettes: valeur}} ; histogrammes :
+        # {valeurs d'étiquettes: [comptes par borne..., somme, nombre]}
+        self.values = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._dirty = False
+
+    # Déclaration
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Métrique déjà déclarée : {metric.name}")
+        self.metrics[metric.name] = metric
+        self.values[metric.name] = {}
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self._register(Gauge(self, name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    # Mise à jour
+
+    def _add(self, metric, key, amount):
+        with self._lock:
+            series = self.values[metric.name]
+            series[key] = series.get(key, 0) + amount
+            self._dirty = True
+        self.flush_if_due()
+
+    def _set(self, metric, key, value):
+        with self._lock:
+            self.values[metric.name][key] = value
+            self._dirty = True
+        self.flush_if_due()
+
+    def _observe(self, metric, key, value):
+        with self._lock:
+            series = self.values[metric.name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(metric.buckets) + [0.0, 0]
+            for index, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+            self._dirty = True
+        self.flush_if_due()
+
+    # Fichiers partagés entre processus
+
+    def directory(self):
+        path = getattr(settings, 'METRICS_DIR', None)
+        return Path(path) if path else None
+
+    def snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {
+                name: [[list(key), list(value) if isinstance(value, list) else value]
+                       for key, value in series.items()]
+                for name, series in self.values.items() if series
+            }
+
+    def flush(self):
+        """Écrire les valeurs du processus dans METRICS_DIR (écriture atomique)"""
+        directory = self.directory()
+        if directory is None:
+            return
+        self._last_flush = time.monotonic()
+        data = json.dumps({'pid': os.getpid(), 'values': self.snapshot()})
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, directory / f'{FILE_PREFIX}{os.getpid()}.json')
+        except OSError:
+            logger.exception("Écriture des métriques impossible dans %s", directory)
+
+    def flush_if_due(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        if self._dirty and time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def process_values(self):
+        """[(pid, processus vivant ?, valeurs)] de tous les processus"""
+        directory = self.directory()
+        if directory is None:
+            return [(os.getpid(), True, self.snapshot())]
+
+        self.flush()
+        processes = []
+        for path in sorted(directory.glob(f'{FILE_PREFIX}*.json')):
+            try:
+                data = json.loads(path.read_text())
+                processes.append((data['pid'], process_alive(data['pid']), data['values']))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return processes
+
+    # Exposition
+
+    def merged_values(self):
+        """{nom: {valeurs d'étiquettes: valeur}} additionnées sur les processus"""
+        merged = {name: {} for name in self.metrics}
+        for _, alive, values in self.process_values():
+            for name, series in values.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                target = merged[name]
+                for key, value in series:
+                    key = tuple(key)
+                    if metric.kind == 'histogram':
+                        current = target.setdefault(key, [0] * len(value))
+                        target[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = target.get(key, 0) + value
+        return merged
+
+    def expose(self):
+        """Toutes les métriques au format texte Prometheus (0.0.4)"""
+        merged = self.merged_values()
+        lines = []
+        for name, metric in self.metrics.items():
+            series = merged[name]
+            if metric.kind == 'gauge' and metric.collect is not None:
+                series = metric.collect()
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(series.items()):
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{format_labels(metric.labelnames, key)} {format_value(value)}')
+                    continue
+                # Comptes cumulés par borne ; +Inf : toutes les observations
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-2] + [None]):
+                    cumulative = value[-1] if count is None else cumulative + count
+                    labels = format_labels(metric.labelnames, key, [('le', format_value(bound))])
+                    lines.append(f'{name}_bucket{labels} {cumulative}')
+                labels = format_labels(metric.labelnames, key)
+                lines.append(f'{name}_sum{labels} {format_value(value[-2])}')
+                lines.append(f'{name}_count{labels} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+# ===============================
+# MÉTRIQUES DE L'APPLICATION
+# ===============================
+
+def _job_states():
+    counts = {(state,): 0 for state, _ in Job.STATES}
+    for state, count in Job.objects.values_list('state').annotate(count=Count('id')).order_by():
+        counts[(state,)] = count
+    return counts
+
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'docbuilder_http_requests_total', "Requêtes HTTP traitées", ['view', 'method', 'status'],
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'docbuilder_http_request_duration_seconds', "Durée des requêtes HTTP", ['view'],
+)
+HTTP_REQUESTS_IN_PROGRESS = REGISTRY.gauge(
+    'docbuilder_http_requests_in_progress', "Requêtes HTTP en cours de traitement",
+)
+REQUEST_STAGE_SECONDS = REGISTRY.histogram(
+    'docbuilder_request_stage_duration_seconds', "Durée des étapes d'une requête (voir timing.py)",
+    ['view', 'stage'],
+)
+EXPORT_RENDER_SECONDS = REGISTRY.histogram(
+    'docbuilder_export_render_duration_seconds', "Durée de génération d'un fichier exporté",
+    ['format', 'engine'],
+)
+EXPORT_FILES = REGISTRY.counter(
+    'docbuilder_export_files_total', "Fichiers exportés", ['format', 'mode', 'result'],
+)
+EXPORT_CACHE = REGISTRY.counter(
+    'docbuilder_export_cache_total', "Accès au cache disque des exports", ['format', 'result'],
+)
+RENDER_CACHE = REGISTRY.counter(
+    'docbuilder_render_cache_total', "Accès au cache des documents rendus", ['result'],
+)
+RENDER_SECONDS = REGISTRY.histogram(
+    'docbuilder_document_render_duration_seconds', "Durée de substitution des placeholders d'un document",
+)
+JOBS = REGISTRY.gauge(
+    'docbuilder_jobs', "Tâches en arrière-plan par état (file d'attente)", ['state'], collect=_job_states,
+)
+
+
+class MetricsMiddleware:
+    """Nombre, durée et étapes des requêtes, par nom d'URL
+
+    À placer en tête : les étapes (``request.stage_timer``) et le temps SQL
+    sont complets quand ``ServerTimingMiddleware`` a terminé.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with HTTP_REQUESTS_IN_PROGRESS.track_in_progress():
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'none'
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_REQUEST_SECONDS.observe(duration, view=view)
+        timer = getattr(request, 'stage_timer', None)
+        if timer is not None:
+            for stage, (stage_duration, _, _) in timer.stages.items():
+                REQUEST_STAGE_SECONDS.observe(stage_duration, view=view, stage=stage)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('templates_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('batch_export', 'Export par lots'), ('mail_merge', 'Publipostage')], max_length=50, verbose_name='Type de tâche')),
+                ('state', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('succeeded', 'Terminée'), ('failed', 'Échec')], default='pending', max_length=20, verbose_name='État')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Paramètres')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='Éléments traités')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Éléments à traiter')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Résultat')),
+                ('result_file', models.FileField(blank=True, upload_to='jobs/', verbose_name='Fichier résultat')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de création')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Début')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='Créée par')),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['state', 'created_at'], name='templates_a_state_b51b39_idx')],
+            },
+        ),
+    ]
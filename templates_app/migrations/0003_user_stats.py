@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('templates_app', '0002_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+                ('template_count', models.IntegerField(default=0, verbose_name='Templates')),
+                ('public_template_count', models.IntegerField(default=0, verbose_name='Templates publics')),
+                ('document_count', models.IntegerField(default=0, verbose_name='Documents')),
+                ('completed_document_count', models.IntegerField(default=0, verbose_name='Documents terminés')),
+                ('rebuilt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Dernière reconstruction')),
+            ],
+            options={
+                'verbose_name': 'Statistiques utilisateur',
+                'verbose_name_plural': 'Statistiques utilisateurs',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Jour'), ('month', 'Mois')], max_length=5, verbose_name='Période')),
+                ('start', models.DateField(verbose_name='Début de la période')),
+                ('template_count', models.IntegerField(default=0, verbose_name='Templates créés')),
+                ('document_count', models.IntegerField(default=0, verbose_name='Documents créés')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_buckets', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Activité par période',
+                'verbose_name_plural': 'Activité par période',
+                'unique_together': {('user', 'period', 'start')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from templates_app.search import Fts5Backend, fts5_available
+
+    if fts5_available(schema_editor.connection):
+        Fts5Backend(schema_editor.connection).rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    from templates_app.search import Fts5Backend
+
+    if schema_editor.connection.vendor == 'sqlite':
+        Fts5Backend(schema_editor.connection).uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates_app', '0003_user_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
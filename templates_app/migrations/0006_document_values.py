@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates_app', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='values',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Valeurs des champs (copie)'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:19
+
+from django.db import migrations, models
+import templates_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates_app', '0007_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='result_file',
+            field=models.FileField(blank=True, storage=templates_app.models.job_file_storage, upload_to='results/', verbose_name='Fichier résultat'),
+        ),
+    ]
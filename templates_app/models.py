@@ -1,8 +1,11 @@
 # models.py
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 import json
+import os
 
 
 class Template(models.Model):
@@ -19,6 +22,11 @@ class Template(models.Model):
         verbose_name = "Template"
         verbose_name_plural = "Templates"
         ordering = ['-created_at']
+        # Noms explicites : « category » est ajouté après la classe (add_to_class)
+        indexes = [
+            models.Index(fields=['is_public', 'created_at'], name='template_public_created_idx'),
+            models.Index(fields=['created_by', 'category'], name='template_owner_category_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -72,11 +80,19 @@ class Document(models.Model):
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Date de création")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
     is_completed = models.BooleanField(default=False, verbose_name="Document terminé")
+    # Copie {field_name: valeur} des DocumentFieldValue, lue par le rendu sans
+    # jointure ; NULL tant qu'elle n'a pas été calculée (voir field_values.py)
+    values = models.JSONField(null=True, blank=True, editable=False, verbose_name="Valeurs des champs (copie)")
 
     class Meta:
         verbose_name = "Document"
         verbose_name_plural = "Documents"
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['created_by', 'updated_at'], name='document_owner_updated_idx'),
+            models.Index(fields=['created_by', 'is_completed'], name='document_owner_completed_idx'),
+            models.Index(fields=['created_by', 'created_at'], name='document_owner_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} (basé sur {self.template.title})"
@@ -119,4 +135,148 @@ Template.add_to_class('category', models.ForeignKey(
     null=True,
     blank=True,
     verbose_name="Catégorie"
-))
\ No newline at end of file
+))
+
+class JobFileStorage(FileSystemStorage):
+    """Fichiers des tâches sous ``settings.JOBS_DIR``, hors de MEDIA_ROOT : jamais
+    servis publiquement, seulement par la vue job_download (propriétaire vérifié)"""
+
+    @property
+    def base_location(self):
+        return str(settings.JOBS_DIR)
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def job_file_storage():
+    return JobFileStorage()
+
+
+class Job(models.Model):
+    """Tâche longue exécutée en arrière-plan par `manage.py run_workers`"""
+    STATE_PENDING = 'pending'
+    STATE_RUNNING = 'running'
+    STATE_SUCCEEDED = 'succeeded'
+    STATE_FAILED = 'failed'
+    STATES = [
+        (STATE_PENDING, 'En attente'),
+        (STATE_RUNNING, 'En cours'),
+        (STATE_SUCCEEDED, 'Terminée'),
+        (STATE_FAILED, 'Échec'),
+    ]
+
+    KINDS = [
+        ('batch_export', 'Export par lots'),
+        ('mail_merge', 'Publipostage'),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KINDS, verbose_name="Type de tâche")
+    state = models.CharField(max_length=20, choices=STATES, default=STATE_PENDING, verbose_name="État")
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs', verbose_name="Créée par")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Paramètres")
+    progress = models.PositiveIntegerField(default=0, verbose_name="Éléments traités")
+    total = models.PositiveIntegerField(default=0, verbose_name="Éléments à traiter")
+    result = models.JSONField(default=dict, blank=True, verbose_name="Résultat")
+    result_file = models.FileField(
+        upload_to='results/', storage=job_file_storage, blank=True, verbose_name="Fichier résultat"
+    )
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Début")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Dernier signe de vie")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+
+    class Meta:
+        verbose_name = "Tâche"
+        verbose_name_plural = "Tâches"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['state', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_state_display()})"
+
+    @property
+    def is_finished(self):
+        return self.state in (self.STATE_SUCCEEDED, self.STATE_FAILED)
+
+    @property
+    def percent(self):
+        """Progression en pourcentage"""
+        if self.state == self.STATE_SUCCEEDED:
+            return 100
+        if not self.total:
+            return 0
+        return min(100, int(self.progress * 100 / self.total))
+
+    @property
+    def wait_time(self):
+        """Durée passée en file d'attente (timedelta ou None)"""
+        if self.started_at:
+            return self.started_at - self.created_at
+        return None
+
+    @property
+    def run_time(self):
+        """Durée d'exécution (timedelta ou None)"""
+        if self.started_at and self.finished_at:
+            return self.finished_at - self.started_at
+        return None
+
+
+class UserStats(models.Model):
+    """Compteurs d'activité d'un utilisateur, tenus à jour par les signaux
+
+    Reconstruits par `manage.py rebuild_stats` (ou automatiquement si absents).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='activity_stats', verbose_name="Utilisateur")
+    template_count = models.IntegerField(default=0, verbose_name="Templates")
+    public_template_count = models.IntegerField(default=0, verbose_name="Templates publics")
+    document_count = models.IntegerField(default=0, verbose_name="Documents")
+    completed_document_count = models.IntegerField(default=0, verbose_name="Documents terminés")
+    rebuilt_at = models.DateTimeField(default=timezone.now, verbose_name="Dernière reconstruction")
+
+    class Meta:
+        verbose_name = "Statistiques utilisateur"
+        verbose_name_plural = "Statistiques utilisateurs"
+
+    def __str__(self):
+        return f"Statistiques de {self.user}"
+
+    @property
+    def private_template_count(self):
+        return self.template_count - self.public_template_count
+
+    @property
+    def draft_document_count(self):
+        return self.document_count - self.completed_document_count
+
+
+class UserActivityBucket(models.Model):
+    """Créations de templates et documents d'un utilisateur par jour ou par mois"""
+    PERIOD_DAY = 'day'
+    PERIOD_MONTH = 'month'
+    PERIODS = [
+        (PERIOD_DAY, 'Jour'),
+        (PERIOD_MONTH, 'Mois'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_buckets',
+                             verbose_name="Utilisateur")
+    period = models.CharField(max_length=5, choices=PERIODS, verbose_name="Période")
+    start = models.DateField(verbose_name="Début de la période")
+    template_count = models.IntegerField(default=0, verbose_name="Templates créés")
+    document_count = models.IntegerField(default=0, verbose_name="Documents créés")
+
+    class Meta:
+        verbose_name = "Activité par période"
+        verbose_name_plural = "Activité par période"
+        unique_together = ['user', 'period', 'start']
+
+    def __str__(self):
+        return f"{self.user} - {self.get_period_display()} du {self.start}"
@@ -0,0 +1,168 @@
+# templates_app/pagination.py - Pagination par curseur (keyset)
+"""
+Pagination des listes par curseur plutôt que par numéro de page.
+
+``Paginator`` exécute un ``COUNT(*)`` sur la requête filtrée puis un
+``OFFSET`` : les deux coûtent d'autant plus cher que l'archive est grande et
+que l'on avance dans les pages. Ici chaque page repart de la dernière ligne
+affichée (``WHERE (created_at, id) < (...)``) sur l'ordre existant, l'id
+servant à départager les égalités : la page 500 coûte autant que la page 1.
+
+Le curseur est signé (non falsifiable) mais pas chiffré : les valeurs de
+tri qu'il contient restent lisibles côté client. Le total, s'il est
+demandé, est mis en cache quelques instants : c'est une valeur approchée.
+"""
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'templates_app.pagination.cursor'
+
+# Durée de vie du total mis en cache (secondes)
+COUNT_CACHE_TIMEOUT = 60
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """``queryset.count()`` mis en cache par requête SQL (valeur approchée)"""
+    sql, params = queryset.query.sql_with_params()
+    key = 'cursor-count:' + hashlib.sha256(repr((sql, params)).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class CursorPage:
+    """Une page de résultats et les curseurs des pages voisines"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        # Chaînes de requête des liens (voir paginate_by_cursor)
+        self.next_query = ''
+        self.previous_query = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Pagination keyset d'un queryset selon ``ordering``
+
+    ``ordering`` se termine par la clé primaire (``'-id'``) pour que l'ordre
+    soit total ; les champs triés ne doivent pas être NULL.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        ordering = tuple(ordering)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            raise ValueError("L'ordre d'une pagination par curseur doit se terminer par l'id")
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [name.lstrip('-') for name in ordering]
+
+    # Curseurs
+
+    def encode(self, obj, backwards):
+        values = [getattr(obj, field) for field in self.fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        return signing.dumps([values, backwards], salt=CURSOR_SALT, compress=True)
+
+    def decode(self, cursor):
+        """(valeurs, vers l'arrière) ; None pour un curseur absent ou invalide"""
+        if not cursor:
+            return None
+        try:
+            values, backwards = signing.loads(cursor, salt=CURSOR_SALT)
+            if len(values) != len(self.fields):
+                return None
+            meta = self.queryset.model._meta
+            values = [meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        return values, bool(backwards)
+
+    # Requête
+
+    def _seek(self, values, backwards):
+        """Lignes strictement après ``values`` dans l'ordre (ou avant si ``backwards``)"""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def page(self, cursor=None):
+        position = self.decode(cursor)
+        backwards = bool(position and position[1])
+
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if position:
+            queryset = queryset.filter(self._seek(*position))
+
+        # Une ligne de plus pour savoir s'il existe une page au-delà
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows)
+
+        has_next = position is not None if backwards else has_more
+        has_previous = has_more if backwards else position is not None
+        return CursorPage(
+            rows,
+            next_cursor=self.encode(rows[-1], backwards=False) if has_next else None,
+            previous_cursor=self.encode(rows[0], backwards=True) if has_previous else None,
+        )
+
+
+def paginate_by_cursor(request, queryset, per_page, ordering, with_count=False):
+    """Page demandée par ``?cursor=`` avec les liens des pages voisines
+
+    Les autres paramètres de la requête (filtres) sont conservés dans les
+    liens ; ``with_count`` ajoute le total approché (``page.count``).
+    """
+    page = CursorPaginator(queryset, per_page, ordering).page(request.GET.get(CURSOR_PARAM))
+
+    params = request.GET.copy()
+    params.pop('page', None)
+    for cursor, attribute in ((page.next_cursor, 'next_query'), (page.previous_cursor, 'previous_query')):
+        if cursor:
+            params[CURSOR_PARAM] = cursor
+            setattr(page, attribute, params.urlencode())
+
+    if with_count:
+        page.count = cached_count(queryset)
+    return page
@@ -0,0 +1,217 @@
+# templates_app/pdf_service.py - Rendu PDF dans un pool de processus
+"""
+Service de rendu PDF adossé à un ``ProcessPoolExecutor``.
+
+Chaque worker charge une seule fois les styles ReportLab et la CSS WeasyPrint
+(voir ``exports.load_pdf_resources``), puis reçoit des données simples :
+titre du document, contenu rendu et titre du template. Les vues d'export et
+l'export par lots y soumettent leur travail ; si le pool est désactivé
+(``PDF_RENDER_WORKERS = 0``) ou cassé, le rendu se fait dans le processus
+courant.
+
+``render_file`` évite de faire transiter le PDF par le canal du pool : le
+worker l'écrit dans un fichier temporaire et n'en retourne que le chemin.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import exports
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """Initialisation d'un worker : Django configuré et ressources PDF chargées"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    exports.load_pdf_resources()
+
+
+def _render_payload(payload):
+    """Point d'entrée d'un worker : payload = (titre, contenu rendu, titre du template)"""
+    return exports.render_pdf(*payload)
+
+
+def _render_payload_to_file(payload, directory):
+    """Point d'entrée d'un worker : écrit le PDF dans ``directory`` et retourne son chemin"""
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='pdf-', suffix='.pdf', delete=False) as out:
+        try:
+            exports.write_pdf(out, *payload)
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
+    return out.name
+
+
+def _open_unlinked(path):
+    """Ouvrir puis supprimer un fichier : il disparaît à la fermeture du descripteur"""
+    artifact = open(path, 'rb')
+    try:
+        os.unlink(path)
+    except PermissionError:
+        # Windows : un fichier ouvert ne peut pas être supprimé
+        data = artifact.read()
+        artifact.close()
+        os.unlink(path)
+        return io.BytesIO(data)
+    return artifact
+
+
+def _discard_rendered_file(future):
+    if not future.cancelled() and future.exception() is None:
+        try:
+            os.unlink(future.result())
+        except OSError:
+            pass
+
+
+# Workers par défaut : le pool est créé dans chaque processus web
+DEFAULT_WORKERS = 2
+
+
+def get_worker_count():
+    """Nombre de workers PDF par processus web (settings.PDF_RENDER_WORKERS)"""
+    return getattr(settings, 'PDF_RENDER_WORKERS', DEFAULT_WORKERS)
+
+
+def get_executor():
+    """Pool de processus partagé, créé à la première utilisation (None si désactivé)"""
+    global _executor
+
+    workers = get_worker_count()
+    if workers <= 0:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            start_method = getattr(settings, 'PDF_RENDER_START_METHOD', 'spawn')
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def shutdown(wait=True):
+    """Arrêter le pool (il sera recréé à la prochaine soumission)"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def _discard_broken_executor(executor):
+    global _executor
+
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def render(title, content, template_title):
+    """Rendre un PDF via le pool ; retourne les octets du fichier"""
+    executor = get_executor()
+    if executor is not None:
+        try:
+            future = executor.submit(_render_payload, (title, content, template_title))
+            return future.result(timeout=getattr(settings, 'PDF_RENDER_TIMEOUT', 120))
+        except BrokenProcessPool:
+            logger.warning("Pool de rendu PDF cassé : rendu dans le processus courant")
+            _discard_broken_executor(executor)
+    return exports.render_pdf(title, content, template_title)
+
+
+def render_file(title, content, template_title):
+    """Rendre un PDF via le pool ; retourne un fichier ouvert positionné au début"""
+    executor = get_executor()
+    if executor is not None:
+        try:
+            future = executor.submit(_render_payload_to_file, (title, content, template_title), tempfile.gettempdir())
+            try:
+                path = future.result(timeout=getattr(settings, 'PDF_RENDER_TIMEOUT', 120))
+            except FutureTimeoutError:  # distincte de TimeoutError avant Python 3.11
+                # Le worker finira son rendu : son fichier sera supprimé à ce moment
+                future.add_done_callback(_discard_rendered_file)
+                raise
+            return _open_unlinked(path)
+        except BrokenProcessPool:
+            logger.warning("Pool de rendu PDF cassé : rendu dans le processus courant")
+            _discard_broken_executor(executor)
+    return exports.render_export_file('pdf', title, content, template_title)
+
+
+def _render_in_process(key, payload):
+    try:
+        return key, exports.render_pdf(*payload)
+    except Exception as e:
+        return key, e
+
+
+def render_many(jobs, window=None):
+    """Rendre des PDF en parallèle ; ``jobs`` produit des (clé, payload)
+
+    Génère (clé, octets ou exception) dans l'ordre des jobs. Au plus ``window``
+    rendus sont en cours à la fois : la mémoire reste bornée quel que soit le
+    nombre de jobs. Si le pool casse (worker tué), les rendus en attente et
+    restants se font dans le processus courant.
+    """
+    jobs = iter(jobs)
+    executor = get_executor()
+    if executor is None:
+        for key, payload in jobs:
+            yield _render_in_process(key, payload)
+        return
+
+    window = window or get_worker_count() * 2
+    pending = deque()
+
+    def collect():
+        # Retiré de la file seulement une fois le résultat obtenu : un job
+        # interrompu par la casse du pool est rejoué dans le processus courant
+        key, payload, future = pending[0]
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            result = e
+        pending.popleft()
+        return key, result
+
+    try:
+        for key, payload in jobs:
+            # Inscrit avant la soumission : rejoué si submit() trouve le pool cassé
+            pending.append((key, payload, None))
+            pending[-1] = (key, payload, executor.submit(_render_payload, payload))
+            if len(pending) >= window:
+                yield collect()
+        while pending:
+            yield collect()
+    except BrokenProcessPool:
+        logger.warning("Pool de rendu PDF cassé : rendu dans le processus courant")
+        _discard_broken_executor(executor)
+        while pending:
+            key, payload, _ = pending.popleft()
+            yield _render_in_process(key, payload)
+        for key, payload in jobs:
+            yield _render_in_process(key, payload)
@@ -0,0 +1,157 @@
+# templates_app/perf_data.py - Jeu de données de mesure des performances
+"""
+Génération de volumes réalistes pour ``manage.py seed_perf_data`` et
+``manage.py bench_perf`` : utilisateurs, catégories, templates à N
+placeholders et documents remplis.
+
+Les champs des templates sont créés comme par l'interface
+(``extract_fields_from_content`` / ``create_fields_from_content``) et les
+valeurs par ``generate_sample_data``. Les documents sont écrits comme par le
+publipostage : ``bulk_create`` avec la copie ``Document.values``, puis index
+de recherche et compteurs d'activité mis à jour en une fois. La graine
+(``seed``) rend les données reproductibles.
+"""
+import random
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Template, TemplateCategory, Document, DocumentFieldValue
+from .search import get_search_backend
+from .stats import rebuild_user_stats
+
+# Documents écrits par lot (limite de variables SQLite)
+SEED_BATCH_SIZE = 500
+
+FIELD_POOL = [
+    'nom_client', 'nom_entreprise', 'adresse_entreprise', 'nom_representant', 'fonction_representant',
+    'email', 'telephone', 'date_debut', 'salaire', 'poste', 'montant_total', 'numero_reference', 'ville',
+]
+
+SENTENCES = [
+    "Nous vous prions de trouver ci-joint le document demandé",
+    "Conformément à nos échanges, nous confirmons les éléments suivants",
+    "Nous restons à votre disposition pour tout renseignement complémentaire",
+    "Veuillez agréer l'expression de nos salutations distinguées",
+    "Le présent courrier annule et remplace toute correspondance antérieure",
+]
+
+CATEGORY_NAMES = ['Ressources humaines', 'Commercial', 'Juridique', 'Comptabilité', 'Administratif',
+                  'Relation client', 'Immobilier', 'Fournisseurs']
+
+
+def field_names(placeholders):
+    """``placeholders`` noms de champs : ceux du vocabulaire habituel, puis numérotés"""
+    return FIELD_POOL[:placeholders] + [f'champ_{i}' for i in range(len(FIELD_POOL), placeholders)]
+
+
+def build_content(rng, names, paragraphs):
+    """Contenu d'un template : des paragraphes de texte où s'insèrent tous les placeholders"""
+    lines = []
+    for i in range(max(paragraphs, len(names))):
+        sentence = rng.choice(SENTENCES)
+        if i < len(names):
+            sentence += f" : {{{{{names[i]}}}}}"
+        lines.append(sentence + '.')
+    return '\n'.join(lines)
+
+
+def create_categories(count):
+    categories = []
+    for i in range(count):
+        name = CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f'Catégorie {i + 1}'
+        categories.append(TemplateCategory.objects.get_or_create(name=name)[0])
+    return categories
+
+
+def create_templates(rng, user, categories, count, placeholders, paragraphs):
+    """Templates de ``user`` ; les champs sont créés depuis le contenu, comme à la saisie"""
+    # Import local : views importe la plupart des modules de l'application
+    from .views import create_fields_from_content
+
+    names = field_names(placeholders)
+    templates = []
+    for i in range(count):
+        template = Template.objects.create(
+            title=f'Modèle {i + 1} de {user.username}',
+            description=rng.choice(SENTENCES),
+            content=build_content(rng, names, paragraphs),
+            created_by=user,
+            is_public=rng.random() < 0.2,
+            category=rng.choice(categories) if categories else None,
+        )
+        create_fields_from_content(template)
+        templates.append(template)
+    return templates
+
+
+def create_documents(rng, user, templates, count, spread_days=365):
+    """``count`` documents répartis sur les templates et sur ``spread_days`` jours"""
+    from .views import generate_sample_data
+
+    fields = {template.pk: list(template.fields.all()) for template in templates}
+    now = timezone.now()
+    created = 0
+    for start in range(0, count, SEED_BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + SEED_BATCH_SIZE, count)):
+            template = templates[i % len(templates)]
+            # Un document sur cinq n'est que partiellement rempli
+            filled = [field for field in fields[template.pk] if i % 5 or rng.random() < 0.7]
+            values = {field.field_name: generate_sample_data(field.field_name) for field in filled}
+            rows.append((template, filled, values, now - timedelta(seconds=rng.randrange(spread_days * 86400))))
+
+        with transaction.atomic():
+            documents = Document.objects.bulk_create([
+                Document(
+                    template_id=template.pk, title=f'{template.title} n°{start + offset + 1}',
+                    created_by_id=user.pk, created_at=created_at, values=values,
+                    is_completed=all(values.get(field.field_name) for field in fields[template.pk]
+                                     if field.is_required),
+                )
+                for offset, (template, _, values, created_at) in enumerate(rows)
+            ])
+            DocumentFieldValue.objects.bulk_create([
+                DocumentFieldValue(document_id=document.pk, template_field_id=field.pk, value=values[field.field_name])
+                for document, (_, filled, values, _) in zip(documents, rows)
+                for field in filled
+            ], batch_size=SEED_BATCH_SIZE)
+            get_search_backend().index_documents([document.pk for document in documents], replace=False)
+        created += len(documents)
+    return created
+
+
+def seed_perf_data(users=5, categories=8, templates=20, placeholders=10, documents=200,
+                   paragraphs=12, seed=42, prefix='perf'):
+    """Créer ``users`` utilisateurs ``<prefix>-<n>`` avec leurs templates et documents
+
+    ``templates`` et ``documents`` sont comptés par utilisateur. Retourne la
+    liste des utilisateurs créés.
+    """
+    rng = random.Random(seed)
+    created_users = []
+    category_list = create_categories(categories)
+    for n in range(users):
+        user = User.objects.create_user(f'{prefix}-{n + 1}', password=f'{prefix}-password')
+        user_templates = create_templates(rng, user, category_list, templates, placeholders, paragraphs)
+        create_documents(rng, user, user_templates, documents)
+        # bulk_create n'envoie pas post_save : compteurs recalculés en une fois
+        rebuild_user_stats(user.pk)
+        created_users.append(user)
+    return created_users
+
+
+def perf_users(prefix='perf'):
+    """Utilisateurs ``<prefix>-<n>`` créés par seed_perf_data"""
+    return User.objects.filter(username__regex=rf'^{re.escape(prefix)}-\d+$').order_by('pk')
+
+
+def delete_perf_data(prefix='perf'):
+    """Supprimer les utilisateurs ``<prefix>-<n>`` et tout ce qui leur appartient"""
+    users = perf_users(prefix)
+    count = users.count()
+    users.delete()
+    return count
@@ -0,0 +1,217 @@
+# templates_app/profiling.py - Profilage à la demande d'une requête
+"""
+Profilage d'une seule requête en production, sans redéploiement.
+
+Un membre du staff obtient un jeton signé sur la page d'administration
+``/admin/profiles/`` (valable ``PROFILING_TOKEN_MAX_AGE`` secondes, lié à son
+compte) et le joint à la requête à profiler, par l'en-tête ``X-Profile`` ou
+le paramètre ``?_profile=``. La requête s'exécute alors sous ``cProfile``
+et, si le jeton le demande, sous ``tracemalloc`` ; les rapports sont écrits
+dans ``settings.PROFILING_DIR`` :
+
+- ``<nom>.pstats`` : statistiques brutes (``python -m pstats``, snakeviz) ;
+- ``<nom>.txt`` : résumé (fonctions les plus coûteuses, allocations).
+
+Le nom du rapport est renvoyé dans l'en-tête ``X-Profile-Report``. Une seule
+requête est profilée à la fois par processus (``tracemalloc`` est global) ;
+les autres sont servies normalement. Sans jeton, le middleware ne fait
+qu'une recherche dans les en-têtes et la chaîne de requête.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+TOKEN_SALT = 'templates_app.profiling.token'
+
+DEFAULT_TOKEN_MAX_AGE = 3600
+# Rapports conservés (les plus anciens sont supprimés)
+DEFAULT_MAX_REPORTS = 50
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+
+REPORT_NAME = re.compile(r'^[\w.-]+\.(pstats|txt)$')
+
+_profile_lock = threading.Lock()
+_report_counter = 0
+
+
+def profiles_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def make_token(user, memory=False):
+    """Jeton signé déclenchant le profilage des requêtes de ``user``"""
+    return signing.dumps({'user': user.pk, 'memory': bool(memory)}, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token, user):
+    """Options du jeton ({'memory': bool}), ou None s'il est invalide, expiré ou d'un autre compte"""
+    max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    if not (user.is_authenticated and user.is_staff) or data.get('user') != user.pk:
+        return None
+    return {'memory': bool(data.get('memory'))}
+
+
+# ===============================
+# RAPPORTS
+# ===============================
+
+def report_basename(request):
+    global _report_counter
+
+    _report_counter += 1
+    match = getattr(request, 'resolver_match', None)
+    view = re.sub(r'[^\w-]+', '_', match.view_name if match else 'none')
+    return f'{datetime.now():%Y%m%d-%H%M%S}-{view}-{os.getpid()}-{_report_counter}'
+
+
+def write_reports(request, response, profiler, duration, allocations=None):
+    """Écrire ``.pstats`` et ``.txt`` ; retourne le nom de base du rapport"""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = report_basename(request)
+
+    profiler.dump_stats(directory / f'{name}.pstats')
+
+    summary = io.StringIO()
+    summary.write(f'# {request.method} {request.get_full_path()} -> {response.status_code} '
+                  f'en {duration * 1000:.1f} ms ({request.user})\n\n')
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    if allocations is not None:
+        statistics, current, peak = allocations
+        summary.write(f'\n# Mémoire : {current / 1024:.0f} Kio allouées en fin de requête, pic {peak / 1024:.0f} Kio\n')
+        summary.write(f'# {TOP_ALLOCATIONS} principales allocations (fichier:ligne)\n')
+        for statistic in statistics[:TOP_ALLOCATIONS]:
+            summary.write(f'{statistic}\n')
+    (directory / f'{name}.txt').write_text(summary.getvalue())
+
+    prune_reports(directory)
+    return name
+
+
+def prune_reports(directory):
+    max_reports = getattr(settings, 'PROFILING_MAX_REPORTS', DEFAULT_MAX_REPORTS)
+    summaries = sorted(directory.glob('*.txt'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in summaries[max_reports:]:
+        for report in (path, path.with_suffix('.pstats')):
+            try:
+                report.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_reports():
+    """Rapports du plus récent au plus ancien : [{name, title, created_at, size}]"""
+    directory = profiles_dir()
+    if not directory.is_dir():
+        return []
+    reports = []
+    for path in directory.glob('*.txt'):
+        try:
+            stat = path.stat()
+            with open(path) as summary:
+                title = summary.readline().lstrip('# ').strip()
+        except OSError:
+            continue
+        pstats_path = path.with_suffix('.pstats')
+        reports.append({
+            'name': path.stem,
+            'title': title,
+            'created_at': datetime.fromtimestamp(stat.st_mtime),
+            'size': stat.st_size + (pstats_path.stat().st_size if pstats_path.exists() else 0),
+        })
+    return sorted(reports, key=lambda report: report['created_at'], reverse=True)
+
+
+def report_path(filename):
+    """Chemin d'un fichier de rapport, None si le nom est invalide ou absent"""
+    if not REPORT_NAME.match(filename):
+        return None
+    path = profiles_dir() / filename
+    return path if path.is_file() else None
+
+
+# ===============================
+# MIDDLEWARE
+# ===============================
+
+class ProfilingMiddleware:
+    """Profile les requêtes portant un jeton valide d'un membre du staff
+
+    À placer après ``AuthenticationMiddleware`` (``request.user``).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(PROFILE_HEADER)
+        if token is None and PROFILE_PARAM in request.META.get('QUERY_STRING', ''):
+            token = request.GET.get(PROFILE_PARAM)
+        if not token:
+            return self.get_response(request)
+
+        options = read_token(token, request.user)
+        if options is None:
+            logger.warning("Jeton de profilage refusé pour %s (%s)", request.path, request.user)
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            logger.info("Profilage déjà en cours : %s servi sans profilage", request.path)
+            return self.get_response(request)
+        try:
+            return self.profile(request, options['memory'])
+        finally:
+            _profile_lock.release()
+
+    def profile(self, request, memory):
+        start_tracing = memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            allocations = None
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                if start_tracing:
+                    tracemalloc.stop()
+                allocations = (snapshot.statistics('lineno'), current, peak)
+
+        try:
+            name = write_reports(request, response, profiler, duration, allocations)
+        except OSError:
+            logger.exception("Écriture du rapport de profilage impossible")
+            return response
+        logger.info("Profil de %s %s : %s", request.method, request.path, name)
+        response['X-Profile-Report'] = name
+        return response
@@ -0,0 +1,66 @@
+# templates_app/queries.py - Requêtes partagées entre vues, exports et tâches
+from django.db.models import Q, Value
+
+from .models import Document, Template
+
+
+def visible_templates(user):
+    """Templates visibles par ``user`` : les siens et les templates publics
+
+    ``is_public=Value(True)`` produit ``is_public = 1`` au lieu de la colonne
+    booléenne nue : SQLite n'utilise un index (ici is_public, created_at)
+    dans un ``OR`` que pour une égalité.
+    """
+    return Template.objects.filter(Q(created_by=user) | Q(is_public=Value(True)))
+
+
+def filter_documents(documents, search='', selected_template='', selected_status=''):
+    """Appliquer les filtres de la liste des documents"""
+    if search:
+        documents = documents.filter(
+            Q(title__icontains=search) |
+            Q(template__title__icontains=search)
+        )
+
+    if selected_template:
+        documents = documents.filter(template_id=selected_template)
+
+    # Correction: utiliser is_completed au lieu de status
+    if selected_status == 'completed':
+        documents = documents.filter(is_completed=True)
+    elif selected_status == 'draft':
+        documents = documents.filter(is_completed=False)
+
+    return documents
+
+
+def parse_document_ids(values):
+    """Ids de documents à partir de valeurs '1,2,3' (répétables)"""
+    return [
+        int(document_id)
+        for value in values
+        for document_id in str(value).split(',')
+        if document_id.strip().isdigit()
+    ]
+
+
+def select_documents(user, ids=None, search='', template='', status=''):
+    """Documents d'un export par lots : ids explicites, sinon filtres de document_list"""
+    documents = Document.objects.filter(created_by=user)
+
+    if ids:
+        documents = documents.filter(id__in=ids)
+    else:
+        documents = filter_documents(documents, search, template, status)
+
+    return documents.order_by('-updated_at', '-id')
+
+
+def batch_selection_params(query_dict):
+    """Paramètres de sélection d'un export par lots depuis request.GET"""
+    return {
+        'ids': parse_document_ids(query_dict.getlist('ids')),
+        'search': query_dict.get('search', '').strip(),
+        'template': query_dict.get('template', ''),
+        'status': query_dict.get('status', ''),
+    }
@@ -0,0 +1,287 @@
+# templates_app/rendering.py - Moteur de rendu des placeholders
+"""
+Rendu des placeholders {{field_name}} d'un template.
+
+Le contenu d'un template est compilé une seule fois en une liste de segments
+(texte littéral intercalé avec des emplacements de champs), mise en cache par
+(template.id, updated_at). Chaque rendu se fait ensuite en une seule passe
+``''.join`` au lieu d'un ``str.replace`` par champ.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .field_values import normalized_values
+from .metrics import RENDER_CACHE, RENDER_SECONDS
+from .models import Document
+from .timing import stage
+
+# Toute séquence {{...}} sans accolade interne est un emplacement potentiel :
+# les noms de champs ne sont pas contraints par le modèle TemplateField.
+PLACEHOLDER_PATTERN = re.compile(r'\{\{([^{}]+)\}\}')
+
+# Nombre maximum de templates compilés gardés en mémoire par processus
+COMPILED_CACHE_SIZE = 512
+
+# Rendu en flux : taille des morceaux (caractères) et taille de document
+# rendu au-delà de laquelle les vues diffusent la page en flux
+RENDER_CHUNK_SIZE = 64 * 1024
+DEFAULT_STREAMING_THRESHOLD = 1024 * 1024
+
+
+class CompiledTemplate:
+    """Contenu d'un template découpé en segments littéraux et emplacements"""
+    __slots__ = ('literals', 'names', 'raw')
+
+    def __init__(self, literals, names, raw):
+        # len(literals) == len(names) + 1 : littéral, champ, littéral, ...
+        self.literals = literals
+        self.names = names
+        # Texte d'origine de chaque emplacement, conservé si aucune valeur
+        self.raw = raw
+
+    @property
+    def field_names(self):
+        """Noms des champs référencés, sans doublons, dans l'ordre d'apparition"""
+        return list(dict.fromkeys(self.names))
+
+    def render(self, values):
+        """Rendre le contenu avec un dictionnaire {field_name: valeur}"""
+        names = self.names
+        if not names:
+            return self.literals[0]
+
+        parts = [None] * (2 * len(names) + 1)
+        parts[0::2] = self.literals
+        get = values.get
+        parts[1::2] = [
+            raw if (value := get(name)) is None else str(value)
+            for name, raw in zip(names, self.raw)
+        ]
+        return ''.join(parts)
+
+    def iter_render(self, values, chunk_size=None):
+        """Rendre par morceaux d'environ ``chunk_size`` caractères (rendu en flux)
+
+        ``''.join(iter_render(values)) == render(values)`` ; le texte complet
+        n'est jamais construit.
+        """
+        chunk_size = chunk_size or RENDER_CHUNK_SIZE
+        get = values.get
+        pending = []
+        pending_size = 0
+        for index, literal in enumerate(self.literals):
+            pieces = [literal]
+            if index < len(self.names):
+                value = get(self.names[index])
+                pieces.append(self.raw[index] if value is None else str(value))
+            for piece in pieces:
+                # Un littéral ou une valeur plus grand qu'un morceau est découpé
+                for start in range(0, len(piece), chunk_size):
+                    part = piece[start:start + chunk_size]
+                    pending.append(part)
+                    pending_size += len(part)
+                    if pending_size >= chunk_size:
+                        yield ''.join(pending)
+                        pending = []
+                        pending_size = 0
+        if pending:
+            yield ''.join(pending)
+
+    def rendered_size(self, values):
+        """Longueur du texte rendu, sans le construire"""
+        get = values.get
+        size = sum(len(literal) for literal in self.literals)
+        for name, raw in zip(self.names, self.raw):
+            value = get(name)
+            size += len(raw) if value is None else len(str(value))
+        return size
+
+
+def compile_content(content):
+    """Compiler un contenu de template en CompiledTemplate"""
+    content = content or ""
+    literals = []
+    names = []
+    raw = []
+    position = 0
+
+    for match in PLACEHOLDER_PATTERN.finditer(content):
+        literals.append(content[position:match.start()])
+        names.append(match.group(1))
+        raw.append(match.group(0))
+        position = match.end()
+    literals.append(content[position:])
+
+    return CompiledTemplate(tuple(literals), tuple(names), tuple(raw))
+
+
+_compiled_cache = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def get_compiled(template):
+    """Retourner le contenu compilé d'un template, depuis le cache si possible"""
+    if template.pk is None:
+        return compile_content(template.content)
+
+    key = (template.pk, template.updated_at)
+    with _compiled_lock:
+        compiled = _compiled_cache.get(key)
+        if compiled is not None:
+            _compiled_cache.move_to_end(key)
+            return compiled
+
+    compiled = compile_content(template.content)
+
+    with _compiled_lock:
+        _compiled_cache[key] = compiled
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def clear_compiled_cache():
+    """Vider le cache des templates compilés"""
+    with _compiled_lock:
+        _compiled_cache.clear()
+
+
+def render_template(template, values):
+    """Rendre le contenu d'un template avec les valeurs fournies"""
+    return get_compiled(template).render(values)
+
+
+def get_document_field_values(document):
+    """Valeurs des champs d'un document sous forme {field_name: valeur}
+
+    Lues dans la copie ``document.values`` ; si elle manque, calculées depuis
+    DocumentFieldValue puis enregistrées pour les rendus suivants.
+    """
+    if document.values is not None:
+        return dict(document.values)
+
+    values = normalized_values([document.pk])[document.pk]
+    # update() : ni signal ni changement de updated_at (rendu en cache conservé)
+    Document.objects.filter(pk=document.pk).update(values=values)
+    document.values = values
+    return dict(values)
+
+
+def render_document_uncached(document):
+    """Rendre un document sans passer par le cache de rendu"""
+    with RENDER_SECONDS.time():
+        field_values = get_document_field_values(document)
+        return render_template(document.template, field_values), field_values
+
+
+def stream_document(document, chunk_size=None, field_values=None):
+    """Rendu en flux : (générateur de morceaux, valeurs des champs)
+
+    Les valeurs sont lues tout de suite (ou reprises de ``field_values``) : le
+    générateur n'exécute aucune requête SQL pendant l'envoi de la réponse. Le
+    cache de rendu n'est ni lu ni rempli (il conserverait le document entier).
+    """
+    if field_values is None:
+        field_values = get_document_field_values(document)
+    return get_compiled(document.template).iter_render(field_values, chunk_size), field_values
+
+
+def render_or_stream(request, document):
+    """Rendu d'une page de document : (contenu rendu, valeurs des champs), ou
+    (None, valeurs des champs) si la page doit être diffusée en flux
+
+    ``?stream=1`` / ``?stream=0`` forcent le choix ; sinon le seuil est
+    ``settings.STREAMING_RENDER_THRESHOLD`` caractères rendus. Un document en
+    cache est décidé sur la longueur de son contenu (une seule lecture du
+    cache) ; la taille n'est calculée, sans construire le texte, que hors du
+    cache. L'étape « placeholders » couvre la lecture du cache et le rendu,
+    jamais la production d'une page diffusée (faite pendant l'envoi).
+    """
+    forced = request.GET.get('stream')
+    if forced == '1':
+        return None, get_document_field_values(document)
+    if forced == '0':
+        with stage('placeholders'):
+            return render_document(document)
+
+    threshold = getattr(settings, 'STREAMING_RENDER_THRESHOLD', DEFAULT_STREAMING_THRESHOLD)
+    with stage('placeholders'):
+        cached = cached_render(document)
+    if cached is not None:
+        rendered_content, field_values = cached
+        if len(rendered_content) >= threshold:
+            return None, field_values
+        return rendered_content, field_values
+
+    field_values = get_document_field_values(document)
+    if get_compiled(document.template).rendered_size(field_values) >= threshold:
+        return None, field_values
+    with stage('placeholders'):
+        return render_document(document, cached=False)
+
+
+# ===============================
+# CACHE DES DOCUMENTS RENDUS
+# ===============================
+
+def get_render_cache():
+    """Backend de cache utilisé pour les documents rendus (voir settings.CACHES)"""
+    return caches[getattr(settings, 'RENDERED_DOCUMENT_CACHE_ALIAS', 'default')]
+
+
+def rendered_document_key(document_id):
+    return f'templates_app:rendered-document:{document_id}'
+
+
+def document_version(document):
+    """Jeton de version : change dès que le document ou son template est modifié"""
+    return f'{document.updated_at.isoformat()}|{document.template.updated_at.isoformat()}'
+
+
+def cached_render(document):
+    """(contenu rendu, valeurs des champs) depuis le cache, ou None"""
+    cached = get_render_cache().get(rendered_document_key(document.pk))
+    if cached is not None and cached[0] == document_version(document):
+        RENDER_CACHE.inc(result='hit')
+        return cached[1], cached[2]
+    return None
+
+
+def render_document(document, cached=True):
+    """Rendre un document ; retourne (contenu rendu, valeurs des champs)
+
+    Le résultat est mis en cache par document et jeton de version. Les
+    signaux (voir signals.py) suppriment l'entrée dès qu'une valeur de champ,
+    le document ou son template change. ``cached=False`` : le cache vient
+    d'être lu sans succès, seul le rendu est fait (puis mis en cache).
+    """
+    if cached:
+        result = cached_render(document)
+        if result is not None:
+            return result
+
+    RENDER_CACHE.inc(result='miss')
+    rendered_content, field_values = render_document_uncached(document)
+    entry = (document_version(document), rendered_content, field_values)
+    get_render_cache().set(rendered_document_key(document.pk), entry)
+    return rendered_content, field_values
+
+
+def invalidate_rendered_documents(document_ids):
+    """Supprimer du cache le rendu des documents donnés"""
+    keys = [rendered_document_key(document_id) for document_id in document_ids]
+    if keys:
+        get_render_cache().delete_many(keys)
+
+
+def render_with_replace(content, values):
+    """Ancienne implémentation (un str.replace par champ), gardée pour les benchmarks"""
+    rendered_content = content or ""
+    for field_name, field_value in values.items():
+        placeholder = f'{{{{{field_name}}}}}'
+        rendered_content = rendered_content.replace(placeholder, str(field_value))
+    return rendered_content
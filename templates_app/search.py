@@ -0,0 +1,274 @@
+# templates_app/search.py - Index de recherche plein texte
+"""
+Recherche plein texte sur les templates et les documents.
+
+Le backend est choisi par ``settings.SEARCH_BACKEND`` (chemin d'une classe) ;
+par défaut ``Fts5Backend`` sous SQLite quand FTS5 est compilé, sinon
+``LikeBackend`` (``icontains``, sans index). Un backend PostgreSQL
+(``tsvector`` + index GIN) n'aurait qu'à implémenter la même interface.
+
+L'index est tenu à jour par les signaux (voir ``signals.py``) et par les
+chemins d'écriture en masse ; ``manage.py rebuild_search_index`` le
+reconstruit entièrement.
+"""
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+# Délimiteurs des termes trouvés dans les extraits, remplacés par <mark>
+# après échappement HTML (voir highlight)
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SNIPPET_TOKENS = 16
+
+# Paquets d'ids indexés en une requête (limite de variables SQLite)
+INDEX_BATCH_SIZE = 500
+
+
+def highlight(snippet):
+    """Extrait HTML sûr avec les termes trouvés entre <mark>"""
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+class SearchBackend:
+    """Interface d'un backend de recherche
+
+    ``search_templates``/``search_documents`` reçoivent un queryset déjà
+    filtré (droits d'accès, catégorie...) et retournent un queryset restreint
+    aux résultats, trié par pertinence, annoté de ``search_rank`` et
+    ``search_snippet`` (ou None si le backend ne les fournit pas).
+
+    ``connection`` : base où l'index est écrit (par défaut la connexion
+    ``default`` ; une migration passe ``schema_editor.connection``).
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+
+    def install(self):
+        """Créer les structures d'index (migration, reconstruction)"""
+
+    def uninstall(self):
+        """Supprimer les structures d'index"""
+
+    def rebuild(self):
+        """Réindexer tous les templates et documents"""
+
+    def index_templates(self, template_ids, replace=True):
+        """(Ré)indexer des templates ; ``replace=False`` pour des templates neufs"""
+
+    def index_documents(self, document_ids, replace=True):
+        """(Ré)indexer des documents ; ``replace=False`` pour des documents neufs"""
+
+    def index_template_documents(self, template_id):
+        """Réindexer les documents d'un template (titre du template modifié)"""
+
+    def remove_templates(self, template_ids):
+        pass
+
+    def remove_documents(self, document_ids):
+        pass
+
+    def search_templates(self, queryset, query):
+        raise NotImplementedError
+
+    def search_documents(self, queryset, query):
+        raise NotImplementedError
+
+
+class LikeBackend(SearchBackend):
+    """Recherche sans index par ``icontains`` (parcours complet des tables)"""
+
+    def search_templates(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(content__icontains=query)
+        ).extra(select={'search_rank': 'NULL', 'search_snippet': 'NULL'}).order_by('-created_at')
+
+    def search_documents(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(template__title__icontains=query)
+        ).extra(select={'search_rank': 'NULL', 'search_snippet': 'NULL'}).order_by('-updated_at')
+
+
+def fts5_available(connection=None):
+    """FTS5 est-il compilé dans le SQLite de ``connection`` (par défaut ``default``) ?"""
+    connection = connection or default_connection
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def fts5_query(query):
+    """Requête MATCH FTS5 à partir d'une saisie libre
+
+    Chaque mot devient une chaîne entre guillemets (aucune syntaxe FTS5 ne
+    passe), tous les mots sont requis, le dernier en préfixe : la recherche
+    fonctionne pendant la frappe.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = ['"{}"'.format(word.replace('"', '""')) for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class Fts5Backend(SearchBackend):
+    """Tables virtuelles FTS5 (rowid = id de l'objet), classement BM25"""
+
+    TEMPLATE_TABLE = 'templates_app_template_fts'
+    DOCUMENT_TABLE = 'templates_app_document_fts'
+
+    # unicode61 + remove_diacritics : « resilie » trouve « résilié »
+    TABLE_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+    # Pondération BM25 par colonne : le titre compte plus que le corps
+    TEMPLATE_WEIGHTS = (10.0, 4.0, 1.0)
+    DOCUMENT_WEIGHTS = (10.0, 2.0)
+
+    def install(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.TEMPLATE_TABLE} '
+                f'USING fts5(title, description, content, {self.TABLE_OPTIONS})'
+            )
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.DOCUMENT_TABLE} '
+                f'USING fts5(title, template_title, {self.TABLE_OPTIONS})'
+            )
+
+    def uninstall(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.TEMPLATE_TABLE}')
+            cursor.execute(f'DROP TABLE IF EXISTS {self.DOCUMENT_TABLE}')
+
+    def rebuild(self):
+        self.uninstall()
+        self.install()
+        with self.connection.cursor() as cursor:
+            cursor.execute(self._template_insert_sql(''))
+            cursor.execute(self._document_insert_sql(''))
+
+    # Indexation : DELETE puis INSERT ... SELECT, sans passer par Python
+
+    def _template_insert_sql(self, where):
+        return (
+            f"INSERT INTO {self.TEMPLATE_TABLE} (rowid, title, description, content) "
+            f"SELECT id, title, COALESCE(description, ''), content FROM templates_app_template {where}"
+        )
+
+    def _document_insert_sql(self, where):
+        return (
+            f"INSERT INTO {self.DOCUMENT_TABLE} (rowid, title, template_title) "
+            f"SELECT d.id, d.title, t.title FROM templates_app_document d "
+            f"JOIN templates_app_template t ON t.id = d.template_id {where}"
+        )
+
+    def _batches(self, ids):
+        ids = list(ids)
+        for start in range(0, len(ids), INDEX_BATCH_SIZE):
+            batch = ids[start:start + INDEX_BATCH_SIZE]
+            yield batch, ', '.join(['%s'] * len(batch))
+
+    def remove_templates(self, template_ids):
+        with self.connection.cursor() as cursor:
+            for batch, placeholders in self._batches(template_ids):
+                cursor.execute(f'DELETE FROM {self.TEMPLATE_TABLE} WHERE rowid IN ({placeholders})', batch)
+
+    def remove_documents(self, document_ids):
+        with self.connection.cursor() as cursor:
+            for batch, placeholders in self._batches(document_ids):
+                cursor.execute(f'DELETE FROM {self.DOCUMENT_TABLE} WHERE rowid IN ({placeholders})', batch)
+
+    def index_templates(self, template_ids, replace=True):
+        if replace:
+            self.remove_templates(template_ids)
+        with self.connection.cursor() as cursor:
+            for batch, placeholders in self._batches(template_ids):
+                cursor.execute(self._template_insert_sql(f'WHERE id IN ({placeholders})'), batch)
+
+    def index_documents(self, document_ids, replace=True):
+        if replace:
+            self.remove_documents(document_ids)
+        with self.connection.cursor() as cursor:
+            for batch, placeholders in self._batches(document_ids):
+                cursor.execute(self._document_insert_sql(f'WHERE d.id IN ({placeholders})'), batch)
+
+    def index_template_documents(self, template_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.DOCUMENT_TABLE} WHERE rowid IN '
+                f'(SELECT id FROM templates_app_document WHERE template_id = %s)',
+                [template_id],
+            )
+            cursor.execute(self._document_insert_sql('WHERE d.template_id = %s'), [template_id])
+
+    # Recherche : jointure sur le rowid, une seule évaluation de MATCH
+
+    def _search(self, queryset, query, table, weights):
+        match = fts5_query(query)
+        if match is None:
+            return queryset.none()
+
+        model_table = queryset.model._meta.db_table
+        bm25 = f"bm25({table}, {', '.join(str(weight) for weight in weights)})"
+        snippet = f"snippet({table}, -1, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS})"
+        return queryset.extra(
+            tables=[table],
+            where=[f'{table}.rowid = {model_table}.id', f'{table} MATCH %s'],
+            params=[match],
+            select={'search_rank': bm25, 'search_snippet': snippet},
+        ).order_by('search_rank', '-id')
+
+    def search_templates(self, queryset, query):
+        return self._search(queryset, query, self.TEMPLATE_TABLE, self.TEMPLATE_WEIGHTS)
+
+    def search_documents(self, queryset, query):
+        return self._search(queryset, query, self.DOCUMENT_TABLE, self.DOCUMENT_WEIGHTS)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Backend de recherche configuré (instance partagée)"""
+    global _backend
+
+    with _backend_lock:
+        if _backend is None:
+            path = getattr(settings, 'SEARCH_BACKEND', None)
+            if path:
+                _backend = import_string(path)()
+            elif fts5_available():
+                _backend = Fts5Backend()
+            else:
+                logger.warning("FTS5 indisponible : recherche sans index (icontains)")
+                _backend = LikeBackend()
+        return _backend
+
+
+def search_templates(queryset, query):
+    return get_search_backend().search_templates(queryset, query)
+
+
+def search_documents(queryset, query):
+    return get_search_backend().search_documents(queryset, query)
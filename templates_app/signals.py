@@ -0,0 +1,162 @@
+# templates_app/signals.py - Invalidation des caches de rendu, compteurs d'activité, index de recherche
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Template, TemplateField, Document, DocumentFieldValue
+from .rendering import invalidate_rendered_documents
+from .search import get_search_backend
+from .stats import record_activity
+
+
+def invalidate_template_documents(template_id):
+    """Invalider le rendu de tous les documents basés sur un template"""
+    document_ids = Document.objects.filter(template_id=template_id).values_list('id', flat=True)
+    invalidate_rendered_documents(list(document_ids))
+
+
+@receiver([post_save, post_delete], sender=DocumentFieldValue)
+def document_field_value_changed(sender, instance, **kwargs):
+    invalidate_rendered_documents([instance.document_id])
+
+
+@receiver([post_save, post_delete], sender=Document)
+def document_changed(sender, instance, **kwargs):
+    invalidate_rendered_documents([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Template)
+def template_changed(sender, instance, created=False, **kwargs):
+    # Un template qui vient d'être créé n'a encore aucun document
+    if not created:
+        invalidate_template_documents(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=TemplateField)
+def template_field_changed(sender, instance, **kwargs):
+    # Renommer un champ change le rendu de tous les documents du template
+    invalidate_template_documents(instance.template_id)
+
+
+# ===============================
+# COMPTEURS D'ACTIVITÉ (UserStats)
+# ===============================
+
+# Statut au chargement, pour détecter les changements à l'enregistrement.
+# Lu dans __dict__ : un champ différé (only/defer) ne déclenche pas de requête.
+
+@receiver(post_init, sender=Template)
+def remember_template_status(sender, instance, **kwargs):
+    instance._stats_is_public = instance.__dict__.get('is_public')
+    instance._search_title = instance.__dict__.get('title')
+
+
+@receiver(post_init, sender=Document)
+def remember_document_status(sender, instance, **kwargs):
+    instance._stats_is_completed = instance.__dict__.get('is_completed')
+
+
+@receiver(post_save, sender=Template)
+def count_template_saved(sender, instance, created, **kwargs):
+    if created:
+        record_activity(instance.created_by_id, instance.created_at,
+                        templates=1, public_templates=int(instance.is_public))
+    elif instance._stats_is_public is not None and instance._stats_is_public != instance.is_public:
+        record_activity(instance.created_by_id, instance.created_at,
+                        public_templates=1 if instance.is_public else -1)
+    instance._stats_is_public = instance.is_public
+
+
+@receiver(post_delete, sender=Template)
+def count_template_deleted(sender, instance, **kwargs):
+    record_activity(instance.created_by_id, instance.created_at,
+                    templates=-1, public_templates=-int(instance.is_public))
+
+
+@receiver(post_save, sender=Document)
+def count_document_saved(sender, instance, created, **kwargs):
+    if created:
+        record_activity(instance.created_by_id, instance.created_at,
+                        documents=1, completed_documents=int(instance.is_completed))
+    elif instance._stats_is_completed is not None and instance._stats_is_completed != instance.is_completed:
+        record_activity(instance.created_by_id, instance.created_at,
+                        completed_documents=1 if instance.is_completed else -1)
+    instance._stats_is_completed = instance.is_completed
+
+
+@receiver(post_delete, sender=Document)
+def count_document_deleted(sender, instance, **kwargs):
+    record_activity(instance.created_by_id, instance.created_at,
+                    documents=-1, completed_documents=-int(instance.is_completed))
+
+
+# ===============================
+# INDEX DE RECHERCHE
+# ===============================
+
+@receiver(post_save, sender=Template)
+def index_template(sender, instance, created, **kwargs):
+    backend = get_search_backend()
+    backend.index_templates([instance.pk], replace=not created)
+    # Les documents sont indexés avec le titre de leur template
+    if not created and instance._search_title != instance.title:
+        backend.index_template_documents(instance.pk)
+    instance._search_title = instance.title
+
+
+@receiver(post_delete, sender=Template)
+def unindex_template(sender, instance, **kwargs):
+    get_search_backend().remove_templates([instance.pk])
+
+
+@receiver(post_save, sender=Document)
+def index_document(sender, instance, created, **kwargs):
+    get_search_backend().index_documents([instance.pk], replace=not created)
+
+
+@receiver(post_delete, sender=Document)
+def unindex_document(sender, instance, **kwargs):
+    get_search_backend().remove_documents([instance.pk])
+
+
+# ===============================
+# COPIE DES VALEURS (Document.values)
+# ===============================
+
+# Les chemins d'écriture des vues renseignent la copie eux-mêmes ; ces
+# récepteurs couvrent les écritures isolées (admin, shell) en remettant la
+# copie à NULL : elle est recalculée à la lecture suivante (rendering.py).
+
+def _is_direct(origin, model):
+    """Suppression demandée sur ``model`` lui-même, et non en cascade"""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_save, sender=DocumentFieldValue)
+def value_saved(sender, instance, **kwargs):
+    Document.objects.filter(pk=instance.document_id).update(values=None)
+
+
+@receiver(post_delete, sender=DocumentFieldValue)
+def value_deleted(sender, instance, origin=None, **kwargs):
+    # En cascade (document, template ou champ supprimé) : rien à faire ici
+    if _is_direct(origin, DocumentFieldValue):
+        Document.objects.filter(pk=instance.document_id).update(values=None)
+
+
+@receiver(post_init, sender=TemplateField)
+def remember_field_name(sender, instance, **kwargs):
+    instance._snapshot_field_name = instance.__dict__.get('field_name')
+
+
+@receiver(post_save, sender=TemplateField)
+def field_renamed(sender, instance, created, **kwargs):
+    # La copie est indexée par field_name
+    if not created and instance._snapshot_field_name != instance.field_name:
+        Document.objects.filter(template_id=instance.template_id).update(values=None)
+    instance._snapshot_field_name = instance.field_name
+
+
+@receiver(post_delete, sender=TemplateField)
+def field_deleted(sender, instance, origin=None, **kwargs):
+    if _is_direct(origin, TemplateField):
+        Document.objects.filter(template_id=instance.template_id).update(values=None)
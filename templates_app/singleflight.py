@@ -0,0 +1,142 @@
+# templates_app/singleflight.py - Regroupement des calculs identiques simultanés
+"""
+« Single-flight » : quand plusieurs requêtes demandent en même temps le même
+résultat (par exemple l'export PDF d'un document qui vient d'être partagé),
+un seul appelant le calcule et les autres attendent puis réutilisent son
+résultat.
+
+``SingleFlight`` regroupe les threads d'un même processus ; ``file_lock``
+sert de verrou entre processus (workers gunicorn, ``run_workers``) via
+``fcntl.flock``. Sans ``fcntl`` (Windows), seul le regroupement entre
+threads est assuré.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Exécute ``fn`` une seule fois par clé parmi les appels simultanés"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Retourne ``fn()`` ; un appel déjà en cours pour ``key`` est partagé
+
+        Une exception levée par ``fn`` est relancée chez tous les appelants.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Retirer la clé avant de réveiller : un appel ultérieur recalcule
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """Nombre de clés en cours de calcul"""
+        with self._lock:
+            return len(self._calls)
+
+
+# Attente entre deux tentatives d'un verrou avec délai
+LOCK_POLL_INTERVAL = 0.05
+
+
+class LockTimeout(TimeoutError):
+    """Verrou fichier non obtenu dans le délai"""
+
+
+def _acquire(fd, path, deadline):
+    if deadline is None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"Verrou non obtenu : {path}")
+            time.sleep(LOCK_POLL_INTERVAL)
+
+
+@contextmanager
+def file_lock(path, timeout=None, remove=False):
+    """Verrou exclusif entre processus sur un fichier (créé si besoin)
+
+    ``timeout`` : délai maximal d'attente (secondes), LockTimeout au-delà.
+    ``remove`` : supprimer le fichier de verrou en le libérant. Après
+    obtention, on vérifie que le fichier verrouillé est toujours celui du
+    chemin : un verrou supprimé puis recréé entre-temps est repris.
+    """
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _acquire(fd, path, deadline)
+        except BaseException:
+            os.close(fd)
+            raise
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            current = None
+        if current is not None and current.st_ino == os.fstat(fd).st_ino:
+            break
+        # Verrou supprimé par son détenteur précédent : recommencer sur le nouveau fichier
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    try:
+        yield
+    finally:
+        try:
+            if remove:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
@@ -0,0 +1,233 @@
+# templates_app/stats.py - Statistiques du tableau de bord
+"""
+Statistiques d'un utilisateur calculées en un nombre constant de requêtes.
+
+Les compteurs sont matérialisés (``UserStats``, et ``UserActivityBucket`` par
+jour et par mois) et tenus à jour par les signaux avec des expressions
+``F()`` : les pages lisent quelques lignes, quel que soit le nombre de
+documents. ``rebuild_user_stats`` les recalcule par agrégation
+conditionnelle (``Count(..., filter=Q())``) et ``GROUP BY`` sur
+``TruncDay``/``TruncMonth``. La répartition par catégorie reste un
+``GROUP BY`` unique.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from .models import Template, Document, UserStats, UserActivityBucket
+
+RECENT_DAYS = 7
+MONTHS = 6
+
+UNCATEGORIZED_COLOR = '#6c757d'
+
+
+def category_stats(user):
+    """Nombre de templates par catégorie, « Sans catégorie » en dernier (une requête)"""
+    rows = (
+        Template.objects.filter(created_by=user)
+        .values('category_id', 'category__name', 'category__color')
+        .annotate(count=Count('id'))
+        .order_by('category__name')
+    )
+
+    categories, uncategorized = [], None
+    for row in rows:
+        if row['category_id'] is None:
+            uncategorized = row['count']
+            continue
+        categories.append({
+            'category': {'id': row['category_id'], 'name': row['category__name'], 'color': row['category__color']},
+            'count': row['count'],
+            'color': row['category__color'],
+        })
+
+    if uncategorized:
+        categories.append({
+            'category': {'name': 'Sans catégorie', 'color': UNCATEGORIZED_COLOR},
+            'count': uncategorized,
+            'color': UNCATEGORIZED_COLOR,
+        })
+    return categories
+
+
+def month_starts(months, now=None):
+    """Premiers jours des ``months`` derniers mois, du plus ancien au mois courant"""
+    current = timezone.localtime(now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    starts = [current]
+    for _ in range(months - 1):
+        previous = (starts[-1] - timedelta(days=1)).replace(day=1)
+        starts.append(previous)
+    return starts[::-1]
+
+
+# ===============================
+# COMPTEURS MATÉRIALISÉS
+# ===============================
+
+def bucket_starts(created_at):
+    """(période, début) des compartiments jour et mois d'une date de création"""
+    day = timezone.localtime(created_at).date()
+    return [
+        (UserActivityBucket.PERIOD_DAY, day),
+        (UserActivityBucket.PERIOD_MONTH, day.replace(day=1)),
+    ]
+
+
+def _counts_by_period(queryset, trunc):
+    rows = queryset.annotate(start=trunc('created_at')).values('start').annotate(count=Count('id')).order_by()
+    return {timezone.localtime(row['start']).date(): row['count'] for row in rows}
+
+
+def rebuild_user_stats(user_id):
+    """Recalculer compteurs et compartiments d'un utilisateur depuis les tables"""
+    templates = Template.objects.filter(created_by_id=user_id)
+    documents = Document.objects.filter(created_by_id=user_id)
+
+    with transaction.atomic():
+        template_totals = templates.aggregate(
+            template_count=Count('id'),
+            public_template_count=Count('id', filter=Q(is_public=True)),
+        )
+        document_totals = documents.aggregate(
+            document_count=Count('id'),
+            completed_document_count=Count('id', filter=Q(is_completed=True)),
+        )
+        stats, _ = UserStats.objects.update_or_create(
+            user_id=user_id,
+            defaults=dict(template_totals, **document_totals, rebuilt_at=timezone.now()),
+        )
+
+        buckets = []
+        for period, trunc in ((UserActivityBucket.PERIOD_DAY, TruncDay), (UserActivityBucket.PERIOD_MONTH, TruncMonth)):
+            template_counts = _counts_by_period(templates, trunc)
+            document_counts = _counts_by_period(documents, trunc)
+            for start in template_counts.keys() | document_counts.keys():
+                buckets.append(UserActivityBucket(
+                    user_id=user_id, period=period, start=start,
+                    template_count=template_counts.get(start, 0),
+                    document_count=document_counts.get(start, 0),
+                ))
+        UserActivityBucket.objects.filter(user_id=user_id).delete()
+        UserActivityBucket.objects.bulk_create(buckets)
+    return stats
+
+
+def _increment(queryset, deltas):
+    """UPDATE atomique ``champ = champ + delta`` ; retourne le nombre de lignes"""
+    return queryset.update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def record_activity(user_id, created_at, templates=0, public_templates=0, documents=0, completed_documents=0):
+    """Appliquer des variations aux compteurs d'un utilisateur
+
+    ``created_at`` situe les créations/suppressions (``templates``,
+    ``documents``) dans les compartiments jour et mois. Les diminutions ne
+    créent jamais de ligne : l'utilisateur peut être en cours de suppression.
+    """
+    deltas = {
+        'template_count': templates,
+        'public_template_count': public_templates,
+        'document_count': documents,
+        'completed_document_count': completed_documents,
+    }
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    if not _increment(UserStats.objects.filter(user_id=user_id), deltas):
+        # Pas encore de compteurs (données antérieures) : reconstruction complète,
+        # qui inclut déjà la modification en cours
+        if any(delta > 0 for delta in deltas.values()):
+            rebuild_user_stats(user_id)
+        return
+
+    bucket_deltas = {'template_count': templates, 'document_count': documents}
+    bucket_deltas = {name: delta for name, delta in bucket_deltas.items() if delta}
+    if not bucket_deltas:
+        return
+
+    for period, start in bucket_starts(created_at):
+        bucket = UserActivityBucket.objects.filter(user_id=user_id, period=period, start=start)
+        if _increment(bucket, bucket_deltas) or min(bucket_deltas.values()) < 0:
+            continue
+        try:
+            with transaction.atomic():
+                UserActivityBucket.objects.create(user_id=user_id, period=period, start=start, **bucket_deltas)
+        except IntegrityError:
+            # Créé entre-temps par une autre requête
+            _increment(bucket, bucket_deltas)
+
+
+def get_user_stats(user):
+    """Compteurs matérialisés d'un utilisateur (reconstruits s'ils manquent)"""
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        return rebuild_user_stats(user.pk)
+
+
+def recent_counts(user, days=RECENT_DAYS):
+    """Templates et documents créés ces ``days`` derniers jours (calendaires)"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return UserActivityBucket.objects.filter(
+        user=user, period=UserActivityBucket.PERIOD_DAY, start__gte=since,
+    ).aggregate(
+        recent_templates=Sum('template_count', default=0),
+        recent_documents=Sum('document_count', default=0),
+    )
+
+
+def document_list_stats(user):
+    """Compteurs affichés par la liste des documents"""
+    stats = get_user_stats(user)
+    return {
+        'completed_count': stats.completed_document_count,
+        'draft_count': stats.draft_document_count,
+        'recent_count': recent_counts(user)['recent_documents'],
+    }
+
+
+def monthly_stats(user, months=MONTHS):
+    """Templates et documents créés par mois, lus dans les compartiments mensuels"""
+    starts = month_starts(months)
+    buckets = {
+        bucket.start: bucket
+        for bucket in UserActivityBucket.objects.filter(
+            user=user, period=UserActivityBucket.PERIOD_MONTH, start__gte=starts[0].date(),
+        )
+    }
+
+    rows = []
+    for start in starts:
+        bucket = buckets.get(start.date())
+        rows.append({
+            'month': date_format(start, 'F'),
+            'templates': bucket.template_count if bucket else 0,
+            'documents': bucket.document_count if bucket else 0,
+        })
+    return rows
+
+
+def dashboard_stats(user):
+    """Indicateurs, catégories et progression mensuelle du tableau de bord"""
+    counters = get_user_stats(user)
+    stats = {
+        'total_templates': counters.template_count,
+        'public_templates': counters.public_template_count,
+        'private_templates': counters.private_template_count,
+        'total_documents': counters.document_count,
+        'completed_documents': counters.completed_document_count,
+        'draft_documents': counters.draft_document_count,
+    }
+    stats.update(recent_counts(user))
+
+    return {
+        'stats': stats,
+        'categories_stats': category_stats(user),
+        'monthly_stats': monthly_stats(user),
+    }
@@ -1,3 +1,1633 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Template, TemplateField, Document, DocumentFieldValue, Job, TemplateCategory, UserStats, UserActivityBucket,
+)
+from . import jobs, pdf_service
+from .benchmarks import compare_results, run_benchmarks
+from .export_store import LOCKS_DIRNAME, ExportStore, artifact_key, get_export_store, render_shared
+from .exports import (
+    PYTHON_DOCX_AVAILABLE, format_available, render_export_file, render_html, render_to_bytes,
+    write_docx_python_docx, write_docx_xml,
+)
+from .loadtest import UserTargets, run_step, saturation_point
+from .mail_merge import run_mail_merge, MailMergeError
+from .singleflight import SingleFlight, FCNTL_AVAILABLE, file_lock
+from .field_values import stale_value_snapshots
+from .metrics import Registry
+from .instrumentation import QueryBudgetExceeded, QueryBudgetMiddleware, statement_shape
+from .pagination import CursorPaginator
+from .perf_data import delete_perf_data, seed_perf_data
+from .profiling import PROFILE_PARAM, make_token
+from .search import Fts5Backend, LikeBackend, fts5_available, fts5_query, get_search_backend
+from .stats import dashboard_stats, month_starts, rebuild_user_stats
+from .timing import StageTimer, server_timing_header, stage
+from .views import linebreaksbr_chunks
+from .rendering import (
+    CompiledTemplate, compile_content, get_compiled, clear_compiled_cache, render_with_replace,
+    render_document, render_document_uncached, get_render_cache,
+)
+
+
+# Réglages de tout le module de tests. Cache disque des exports hors de
+# MEDIA_ROOT : aucun fichier ne persiste d'une exécution à l'autre (un hit à
+# la place d'un miss). Budgets de requêtes SQL stricts : un dépassement fait
+# échouer la requête au lieu d'être seulement journalisé. Pas de journal des
+# requêtes lentes (comme benchmarks.run_benchmarks).
+_export_cache_dir = None
+_test_settings = None
+
+
+def setUpModule():
+    global _export_cache_dir, _test_settings
+    _export_cache_dir = tempfile.mkdtemp(prefix='docbuilder-test-exports-')
+    _test_settings = override_settings(
+        EXPORT_CACHE_DIR=_export_cache_dir, QUERY_BUDGET_STRICT=True, SERVER_TIMING_LOG_MIN_MS=float('inf'),
+    )
+    _test_settings.enable()
+
+
+def tearDownModule():
+    _test_settings.disable()
+    shutil.rmtree(_export_cache_dir, ignore_errors=True)
+
+
+class RenderingTests(TestCase):
+    """Moteur de rendu compilé des placeholders"""
+
+    def setUp(self):
+        clear_compiled_cache()
+        self.user = User.objects.create_user('alice', password='secret-pass-123')
+        self.template = Template.objects.create(
+            title='Lettre',
+            content='Bonjour {{nom_client}},\nVotre ville : {{ville}}. {{nom_client}} {{inconnu}}',
+            created_by=self.user,
+        )
+
+    def test_render_matches_replace_loop(self):
+        values = {'nom_client': 'Jean Dupont', 'ville': 'Paris', 'absent': 'x'}
+        compiled = compile_content(self.template.content)
+        self.assertEqual(
+            compiled.render(values),
+            render_with_replace(self.template.content, values),
+        )
+
+    def test_missing_values_keep_placeholder(self):
+        compiled = compile_content('A {{x}} B {{{y}}} C')
+        self.assertEqual(compiled.render({}), 'A {{x}} B {{{y}}} C')
+        self.assertEqual(compiled.render({'x': 1, 'y': 'z'}), 'A 1 B {z} C')
+        self.assertEqual(compiled.field_names, ['x', 'y'])
+
+    def test_cache_keyed_by_updated_at(self):
+        first = get_compiled(self.template)
+        self.assertIs(get_compiled(self.template), first)
+
+        self.template.content = 'Nouveau {{ville}}'
+        self.template.save()
+        self.assertIsNot(get_compiled(self.template), first)
+        self.assertEqual(get_compiled(self.template).render({'ville': 'Lyon'}), 'Nouveau Lyon')
+
+    def test_document_views_render_values(self):
+        field = TemplateField.objects.create(
+            template=self.template, field_name='nom_client', field_label='Nom client'
+        )
+        document = Document.objects.create(template=self.template, title='Doc', created_by=self.user)
+        DocumentFieldValue.objects.create(document=document, template_field=field, value='Jean')
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('templates_app:document_preview', args=[document.id]))
+        self.assertEqual(
+            response.json()['content'],
+            'Bonjour Jean,\nVotre ville : {{ville}}. Jean {{inconnu}}',
+        )
+
+
+class RenderCacheTests(TestCase):
+    """Cache des documents rendus et invalidation par signaux"""
+
+    def setUp(self):
+        get_render_cache().clear()
+        self.user = User.objects.create_user('bob', password='secret-pass-123')
+        self.template = Template.objects.create(
+            title='Lettre', content='Cher {{nom}}, {{ville}}', created_by=self.user
+        )
+        self.field = TemplateField.objects.create(
+            template=self.template, field_name='nom', field_label='Nom'
+        )
+        self.document = Document.objects.create(
+            template=self.template, title='Doc', created_by=self.user
+        )
+        self.value = DocumentFieldValue.objects.create(
+            document=self.document, template_field=self.field, value='Jean'
+        )
+
+    def fetch(self):
+        return Document.objects.select_related('template').get(pk=self.document.pk)
+
+    def test_repeat_render_hits_cache(self):
+        render_document(self.fetch())
+        document = self.fetch()
+        with self.assertNumQueries(0):
+            content, values = render_document(document)
+        self.assertEqual(content, 'Cher Jean, {{ville}}')
+        self.assertEqual(values, {'nom': 'Jean'})
+
+    def test_field_value_change_invalidates(self):
+        render_document(self.fetch())
+        self.value.value = 'Paul'
+        self.value.save()
+        self.assertEqual(render_document(self.fetch())[0], 'Cher Paul, {{ville}}')
+
+        self.value.delete()
+        self.assertEqual(render_document(self.fetch())[0], 'Cher {{nom}}, {{ville}}')
+
+    def test_template_and_field_changes_invalidate(self):
+        render_document(self.fetch())
+        self.template.content = 'Madame {{nom}}'
+        self.template.save()
+        self.assertEqual(render_document(self.fetch())[0], 'Madame Jean')
+
+        self.field.field_name = 'prenom'
+        self.field.save()
+        self.assertEqual(render_document(self.fetch())[0], 'Madame {{nom}}')
+
+
+class MailMergeTests(TestCase):
+    """Publipostage CSV"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('carol', password='secret-pass-123')
+        self.template = Template.objects.create(
+            title='Relance', content='{{nom_client}} - {{montant_total}}', created_by=self.user
+        )
+        TemplateField.objects.create(
+            template=self.template, field_name='nom_client', field_label='Nom', is_required=True
+        )
+        TemplateField.objects.create(
+            template=self.template, field_name='montant_total', field_label='Montant'
+        )
+
+    def test_rows_become_documents(self):
+        csv_file = io.StringIO(
+            'document_title,nom_client,montant_total,inutile\n'
+            'Relance A,Alice,10,x\n'
+            ',,20,x\n'
+            'Relance C,Charles,,x\n'
+        )
+        result = run_mail_merge(self.template, csv_file, self.user, chunk_size=1)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.error_count, 1)
+        self.assertEqual(result.errors[0][0], 3)
+        self.assertEqual(result.ignored_columns, ['inutile'])
+        self.assertEqual(
+            sorted(Document.objects.values_list('title', flat=True)), ['Relance A', 'Relance C']
+        )
+        self.assertEqual(DocumentFieldValue.objects.count(), 3)
+        self.assertTrue(all(Document.objects.values_list('is_completed', flat=True)))
+
+    def test_missing_required_column(self):
+        with self.assertRaises(MailMergeError):
+            run_mail_merge(self.template, io.StringIO('montant_total\n1\n'), self.user)
+
+    def test_unreadable_file(self):
+        # Octet invalide en UTF-8 après le premier paquet : déjà écrit, signalé
+        data = b'nom_client\n' + b'Alice\n' * 3 + b'x' * 10000 + b'\nCl\xe9ment\n'
+        csv_file = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', newline='')
+        with self.assertRaises(MailMergeError) as raised:
+            run_mail_merge(self.template, csv_file, self.user, chunk_size=2)
+        self.assertEqual(raised.exception.created, 2)
+        self.assertIn('illisible', str(raised.exception))
+
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as csv_path:
+            csv_path.write('nom_client\nClément\n'.encode('latin-1'))
+        self.addCleanup(os.unlink, csv_path.name)
+        with self.assertRaisesRegex(CommandError, 'illisible'):
+            call_command('mail_merge', self.template.pk, csv_path.name, user='carol')
+
+        # csv.Error : champ plus long que csv.field_size_limit()
+        too_long = 'x' * (csv.field_size_limit() + 1)
+        with self.assertRaises(MailMergeError):
+            run_mail_merge(self.template, io.StringIO(f'nom_client\n{too_long}\n'), self.user)
+
+    def test_constant_queries_per_chunk(self):
+        rows = ''.join(f'Client {i};{i}\n' for i in range(100))
+        csv_file = io.StringIO('nom_client;montant_total\n' + rows)
+        # 1 requête pour les champs + par paquet : savepoint, 2 bulk_create,
+        # 3 mises à jour des compteurs d'activité, indexation, release
+        with self.assertNumQueries(1 + 8):
+            result = run_mail_merge(self.template, csv_file, self.user, delimiter=';', chunk_size=500)
+        self.assertEqual(result.created, 100)
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('clients.csv', 'nom_client;montant_total\nAlice;10\n'.encode('utf-8'))
+        response = self.client.post(
+            reverse('templates_app:document_mail_merge', args=[self.template.id]),
+            {'csv_file': upload, 'delimiter': ';'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 1)
+
+
+class BatchExportTests(TestCase):
+    """Export par lots en archive ZIP"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('dave', password='secret-pass-123')
+        self.template = Template.objects.create(
+            title='Attestation', content='Attestation pour {{nom}}', created_by=self.user
+        )
+        field = TemplateField.objects.create(template=self.template, field_name='nom', field_label='Nom')
+        for i, status in enumerate([True, True, False]):
+            document = Document.objects.create(
+                template=self.template, title='Attestation', created_by=self.user, is_completed=status
+            )
+            DocumentFieldValue.objects.create(document=document, template_field=field, value=f'Nom {i}')
+        self.client.force_login(self.user)
+
+    def download(self, **params):
+        response = self.client.get(reverse('templates_app:document_export_batch'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_filters_and_unique_names(self):
+        archive = self.download(format='html', status='completed')
+        self.assertEqual(archive.namelist(), ['Attestation.html', 'Attestation_2.html'])
+        self.assertIn(b'Attestation pour Nom', archive.read('Attestation.html'))
+
+    def test_explicit_ids(self):
+        document_id = Document.objects.filter(is_completed=False).get().id
+        archive = self.download(format='html', ids=str(document_id))
+        self.assertEqual(len(archive.namelist()), 1)
+        self.assertIn(b'Nom 2', archive.read('Attestation.html'))
+
+
+@skipUnless(format_available('pdf'), "reportlab ou weasyprint requis")
+class PdfServiceTests(TestCase):
+    """Service de rendu PDF (pool de processus)"""
+
+    def tearDown(self):
+        pdf_service.shutdown()
+
+    def check_jobs(self):
+        jobs = [(i, (f'Lettre {i}', f'Contenu {i}\n\nFin', 'Modèle')) for i in range(5)]
+        results = list(pdf_service.render_many(jobs, window=2))
+        self.assertEqual([key for key, _ in results], list(range(5)))
+        for _, data in results:
+            self.assertTrue(data.startswith(b'%PDF'))
+
+    @override_settings(PDF_RENDER_WORKERS=0)
+    def test_in_process_fallback(self):
+        self.assertIsNone(pdf_service.get_executor())
+        self.check_jobs()
+        self.assertTrue(pdf_service.render('Titre', 'Texte', 'Modèle').startswith(b'%PDF'))
+
+    @override_settings(PDF_RENDER_WORKERS=1)
+    def test_broken_pool_falls_back(self):
+        class BrokenAfterTwo:
+            """Pool dont le worker meurt au troisième rendu"""
+            submitted = 0
+
+            def submit(self, fn, payload):
+                self.submitted += 1
+                if self.submitted > 3:
+                    raise BrokenProcessPool('pool cassé')
+                future = Future()
+                if self.submitted <= 2:
+                    future.set_result(pdf_service.exports.render_pdf(*payload))
+                else:
+                    future.set_exception(BrokenProcessPool('worker tué'))
+                return future
+
+            def shutdown(self, wait=True):
+                pass
+
+        with mock.patch.object(pdf_service, 'get_executor', return_value=BrokenAfterTwo()):
+            self.check_jobs()
+
+        self.assertIsNotNone(pdf_service.get_executor())
+        self.check_jobs()
+
+        # Fichier écrit par le worker : déjà supprimé du disque, lisible jusqu'à la fermeture
+        with pdf_service.render_file('Titre', 'Texte', 'Modèle') as artifact:
+            self.assertFalse(os.path.exists(artifact.name))
+            self.assertTrue(artifact.read().startswith(b'%PDF'))
+
+    @override_settings(PDF_RENDER_TIMEOUT=0.01)
+    def test_render_file_timeout(self):
+        future = Future()
+        executor = mock.Mock(submit=mock.Mock(return_value=future))
+        with mock.patch.object(pdf_service, 'get_executor', return_value=executor):
+            with self.assertRaises(FutureTimeoutError):
+                pdf_service.render_file('Titre', 'Texte', 'Modèle')
+
+        # Rendu terminé après l'abandon : son fichier est supprimé
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        future.set_result(path)
+        self.assertFalse(os.path.exists(path))
+
+
+class ExportStoreTests(TestCase):
+    """Cache disque des fichiers exportés"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.calls = 0
+
+    def render(self, title, content, template_title):
+        self.calls += 1
+        return f'{title}|{content}|{template_title}'.encode('utf-8')
+
+    def test_hit_skips_render(self):
+        with override_settings(EXPORT_CACHE_DIR=self.root, EXPORT_CACHE_MAX_BYTES=10 ** 6):
+            store = get_export_store()
+            for expected_found in (False, True):
+                artifact, found = store.open_or_render('html', 'Titre', 'Contenu', 'Modèle', self.render)
+                with artifact:
+                    self.assertEqual(artifact.read(), 'Titre|Contenu|Modèle'.encode('utf-8'))
+                self.assertEqual(found, expected_found)
+            self.assertEqual(self.calls, 1)
+
+            store.open_or_render('html', 'Titre', 'Contenu modifié', 'Modèle', self.render)[0].close()
+            self.assertEqual(self.calls, 2)
+
+    def test_lru_eviction(self):
+        with override_settings(EXPORT_CACHE_DIR=self.root, EXPORT_CACHE_MAX_BYTES=1000):
+            store = get_export_store()
+            paths = [store.put(f'{i:064x}', 'pdf', b'x' * 300) for i in range(3)]
+            # Le premier fichier est relu : c'est le deuxième qui doit partir
+            for path, mtime in zip(paths, (300, 100, 200)):
+                os.utime(path, (mtime, mtime))
+            store.put(f'{3:064x}', 'pdf', b'x' * 300)
+
+            self.assertTrue(paths[0].exists())
+            self.assertFalse(paths[1].exists())
+            self.assertLessEqual(store.total_size(), 1000)
+
+    @skipUnless(FCNTL_AVAILABLE, "fcntl requis")
+    def test_lock_per_key(self):
+        store = ExportStore(self.root, 10 ** 6, lock_timeout=0.2)
+        store.open_or_render('html', 'Titre', 'Contenu', 'Modèle', self.render)[0].close()
+        # Verrou supprimé après l'écriture
+        self.assertEqual(os.listdir(os.path.join(self.root, LOCKS_DIRNAME)), [])
+
+        # Un export bloqué n'arrête pas les autres clés, ni la sienne au-delà du délai
+        key = artifact_key('html', 'Titre', 'Autre', 'Modèle')
+        with file_lock(store.lock_path(key)):
+            store.open_or_render('html', 'Titre', 'Encore', 'Modèle', self.render)[0].close()
+            with self.assertLogs('templates_app.export_store', 'WARNING'):
+                with store.open_or_render('html', 'Titre', 'Autre', 'Modèle', self.render)[0] as artifact:
+                    self.assertEqual(artifact.read(), 'Titre|Autre|Modèle'.encode('utf-8'))
+        self.assertEqual(self.calls, 3)
+
+    def test_spooled_export_files(self):
+        for export_format in ('html', 'docx'):
+            with override_settings(EXPORT_SPOOL_MAX_SIZE=64):
+                with render_export_file(export_format, 'Titre', 'Ligne\n' * 50, 'Modèle') as spool:
+                    data = spool.read()
+            if export_format == 'html':
+                self.assertEqual(data, render_html('Titre', 'Ligne\n' * 50, 'Modèle'))
+            else:
+                self.assertTrue(zipfile.is_zipfile(io.BytesIO(data)))
+
+        # Fichier rendu recopié dans le cache
+        with override_settings(EXPORT_CACHE_DIR=self.root, EXPORT_CACHE_MAX_BYTES=10 ** 6):
+            spool = render_export_file('html', 'Titre', 'Contenu', 'Modèle')
+            path = get_export_store().put('f' * 64, 'html', spool)
+            self.assertTrue(spool.closed)
+            self.assertEqual(path.read_bytes(), render_html('Titre', 'Contenu', 'Modèle'))
+
+    def test_shared_file_readers(self):
+        calls = []
+
+        def render(*args):
+            calls.append(1)
+            time.sleep(0.2)
+            return render_export_file('html', *args)
+
+        readers = []
+        threads = [
+            threading.Thread(target=lambda: readers.append(render_shared('html', 'Titre', 'Contenu', 'Modèle', render)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Un seul rendu ; chaque lecteur a sa propre position dans le fichier partagé
+        self.assertEqual(len(calls), 1)
+        expected = render_html('Titre', 'Contenu', 'Modèle')
+        first = readers[0].read(10)
+        self.assertEqual([reader.read() for reader in readers[1:]], [expected] * 3)
+        self.assertEqual(first + readers[0].read(), expected)
+        for reader in readers:
+            reader.close()
+
+    def test_export_view_serves_file(self):
+        user = User.objects.create_user('erin', password='secret-pass-123')
+        template = Template.objects.create(title='Modèle', content='Bonjour', created_by=user)
+        document = Document.objects.create(template=template, title='Ma lettre', created_by=user)
+        self.client.force_login(user)
+
+        with override_settings(EXPORT_CACHE_DIR=self.root):
+            url = reverse('templates_app:document_export_html', args=[document.id])
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            self.assertIn('Ma_lettre.html', response['Content-Disposition'])
+            self.assertIn(b'Bonjour', b''.join(response.streaming_content))
+            response.close()
+
+
+def _slow_render(title, content, template_title):
+    time.sleep(0.2)
+    return f'{title}|{content}'.encode('utf-8')
+
+
+def _render_from_process(root, counter, barrier):
+    def render(*args):
+        with counter.get_lock():
+            counter.value += 1
+        return _slow_render(*args)
+
+    store = ExportStore(root, 10 ** 6)
+    barrier.wait()
+    store.open_or_render('html', 'Titre', 'Contenu', 'Modèle', render)[0].close()
+
+
+class SingleFlightTests(TestCase):
+    """Regroupement des exports identiques demandés simultanément"""
+
+    def run_concurrently(self, count, target):
+        barrier = threading.Barrier(count)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(target())
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_threads_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return b'pdf'
+
+        results = self.run_concurrently(50, lambda: flight.do('key', compute))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [b'pdf'] * 50)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_error_is_shared_then_retried(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('key', lambda: (_ for _ in ()).throw(ValueError('échec')))
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+    def test_store_renders_once_across_threads(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = ExportStore(root, 10 ** 6)
+        calls = []
+
+        def render(*args):
+            calls.append(1)
+            return _slow_render(*args)
+
+        def download():
+            artifact, found = store.open_or_render('html', 'Titre', 'Contenu', 'Modèle', render)
+            with artifact:
+                return artifact.read(), found
+
+        # Toutes les demandes ont attendu l'unique rendu : aucune n'a trouvé le fichier
+        results = self.run_concurrently(50, download)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(set(results), {(b'Titre|Contenu', False)})
+
+    @skipUnless(FCNTL_AVAILABLE, "fcntl requis")
+    def test_store_renders_once_across_processes(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        context = multiprocessing.get_context('fork')
+        counter = context.Value('i', 0)
+        barrier = context.Barrier(4)
+
+        processes = [context.Process(target=_render_from_process, args=(root, counter, barrier)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual([process.exitcode for process in processes], [0] * 4)
+        self.assertEqual(counter.value, 1)
+
+
+class JobQueueTests(TestCase):
+    """File de tâches en arrière-plan"""
+
+    def setUp(self):
+        self.jobs_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.jobs_dir)
+        jobs_settings = override_settings(JOBS_DIR=self.jobs_dir)
+        jobs_settings.enable()
+        self.addCleanup(jobs_settings.disable)
+        self.user = User.objects.create_user('frank', password='secret-pass-123')
+        self.template = Template.objects.create(
+            title='Relance', content='Relance pour {{nom}}', created_by=self.user
+        )
+        TemplateField.objects.create(template=self.template, field_name='nom', field_label='Nom')
+        self.client.force_login(self.user)
+
+    def test_claim_is_exclusive(self):
+        first = jobs.enqueue('batch_export', self.user, {'format': 'html'})
+        second = jobs.enqueue('batch_export', self.user, {'format': 'html'})
+
+        self.assertEqual(jobs.claim_next('w1').pk, first.pk)
+        self.assertEqual(jobs.claim_next('w2').pk, second.pk)
+        self.assertIsNone(jobs.claim_next('w3'))
+        # Une tâche déjà réclamée ne peut plus l'être
+        self.assertEqual(Job.objects.filter(pk=first.pk, state=Job.STATE_PENDING).update(worker='w3'), 0)
+        self.assertEqual(Job.objects.get(pk=first.pk).worker, 'w1')
+
+    def test_background_batch_export(self):
+        Document.objects.create(template=self.template, title='Relance', created_by=self.user)
+
+        url = reverse('templates_app:document_export_batch') + '?format=html'
+        # Un GET ne crée jamais de tâche
+        self.assertEqual(self.client.get(url + '&background=1').status_code, 405)
+        self.assertFalse(Job.objects.exists())
+
+        response = self.client.post(url)
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('templates_app:job_detail', args=[job.id]))
+        self.assertEqual(job.state, Job.STATE_PENDING)
+
+        self.assertEqual(jobs.work('test', once=True), 1)
+
+        status = self.client.get(reverse('templates_app:job_status', args=[job.id])).json()
+        self.assertEqual(status['state'], Job.STATE_SUCCEEDED)
+        self.assertEqual((status['progress'], status['total'], status['percent']), (1, 1, 100))
+
+        # Archive hors de MEDIA_ROOT, lisible seulement par son propriétaire
+        job.refresh_from_db()
+        self.assertTrue(job.result_file.path.startswith(os.path.abspath(self.jobs_dir)))
+        other = User.objects.create_user('mallory', password='secret-pass-123')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+        self.client.force_login(self.user)
+
+        response = self.client.get(status['download_url'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        response.close()
+        self.assertEqual(archive.namelist(), ['Relance.html'])
+
+    def test_background_mail_merge(self):
+        upload = SimpleUploadedFile('import.csv', 'document_title;nom\nA;Alice\nB;Bob\n'.encode('utf-8'))
+
+        self.client.post(
+            reverse('templates_app:document_mail_merge', args=[self.template.id]),
+            {'csv_file': upload, 'delimiter': ';', 'background': 'on'},
+        )
+        self.assertFalse(Document.objects.exists())
+        # Tâche créée avec tous ses paramètres, CSV déjà enregistré hors de MEDIA_ROOT
+        csv_path = os.path.join(self.jobs_dir, Job.objects.get().params['csv_file'])
+        self.assertTrue(os.path.exists(csv_path))
+        jobs.work('test', once=True)
+
+        job = Job.objects.get()
+        self.assertEqual(job.state, Job.STATE_SUCCEEDED, job.error)
+        self.assertEqual(job.result['created'], 2)
+        self.assertEqual(Document.objects.count(), 2)
+        # CSV supprimé une fois le publipostage terminé
+        self.assertFalse(os.path.exists(csv_path))
+
+    def test_requeue_only_dead_workers(self):
+        export, merge, alive = (
+            jobs.enqueue(kind, self.user, {}) for kind in ('batch_export', 'mail_merge', 'mail_merge')
+        )
+        for job in (export, merge, alive):
+            jobs.claim_next('w1')
+        old = timezone.now() - timedelta(hours=2)
+        Job.objects.filter(pk__in=[export.pk, merge.pk]).update(heartbeat_at=old)
+        # Démarrée il y a longtemps mais toujours vivante : pas touchée
+        Job.objects.filter(pk=alive.pk).update(started_at=old)
+
+        self.assertEqual(jobs.requeue_stale(300), (1, 1))
+        states = dict(Job.objects.values_list('pk', 'state'))
+        self.assertEqual(states[export.pk], Job.STATE_PENDING)
+        self.assertEqual(states[merge.pk], Job.STATE_FAILED)
+        self.assertEqual(states[alive.pk], Job.STATE_RUNNING)
+
+    def test_failure_is_recorded(self):
+        csv_file = jobs.save_upload(SimpleUploadedFile('import.csv', b'document_title\nA\n'), 'csv')
+        job = jobs.enqueue('mail_merge', self.user, {'template_id': 0, 'csv_file': csv_file})
+        with self.assertLogs('templates_app.jobs', 'ERROR'):
+            jobs.work('test', once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.STATE_FAILED)
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.finished_at)
+        # CSV supprimé même en cas d'échec
+        self.assertFalse(os.path.exists(os.path.join(self.jobs_dir, csv_file)))
+
+
+class DashboardStatsTests(TestCase):
+    """Statistiques du tableau de bord en nombre constant de requêtes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('grace', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def add_data(self, categories):
+        now = timezone.now()
+        for i in range(categories):
+            category = TemplateCategory.objects.create(name=f'Catégorie {len(TemplateCategory.objects.all())}')
+            template = Template.objects.create(
+                title=f'Modèle {i}', content='x', created_by=self.user, category=category, is_public=i % 2 == 0
+            )
+            document = Document.objects.create(
+                template=template, title='Doc', created_by=self.user, is_completed=i % 3 == 0
+            )
+            # Répartir les créations sur plusieurs mois
+            Document.objects.filter(pk=document.pk).update(created_at=now - timedelta(days=30 * (i % 6)))
+        Template.objects.create(title='Sans catégorie', content='x', created_by=self.user)
+        # update() contourne les signaux : recalculer les compteurs
+        rebuild_user_stats(self.user.pk)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('templates_app:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_constant_query_count(self):
+        self.add_data(2)
+        few = self.dashboard_queries()
+        self.add_data(12)
+        self.assertEqual(self.dashboard_queries(), few)
+        # 8 requêtes du tableau de bord + session et utilisateur (lecture, mise à jour)
+        self.assertLessEqual(few, 13)
+
+    def test_values(self):
+        self.add_data(6)
+        dashboard = dashboard_stats(self.user)
+        stats = dashboard['stats']
+
+        self.assertEqual(stats['total_templates'], 7)
+        self.assertEqual(stats['public_templates'], 3)
+        self.assertEqual(stats['private_templates'], 4)
+        self.assertEqual(stats['total_documents'], 6)
+        self.assertEqual((stats['completed_documents'], stats['draft_documents']), (2, 4))
+
+        self.assertEqual([c['count'] for c in dashboard['categories_stats']], [1] * 7)
+        self.assertEqual(dashboard['categories_stats'][-1]['category']['name'], 'Sans catégorie')
+
+        self.assertEqual(len(dashboard['monthly_stats']), 6)
+        self.assertEqual(sum(month['documents'] for month in dashboard['monthly_stats']),
+                         Document.objects.filter(created_at__gte=month_starts(6)[0]).count())
+        self.assertEqual(dashboard['monthly_stats'][-1]['templates'], 7)
+
+
+class UserStatsTests(TestCase):
+    """Compteurs d'activité matérialisés"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('heidi', password='secret-pass-123')
+        self.template = Template.objects.create(title='Devis', content='x', created_by=self.user)
+
+    def counters(self):
+        stats = UserStats.objects.get(user=self.user)
+        return (stats.template_count, stats.public_template_count,
+                stats.document_count, stats.completed_document_count)
+
+    def test_signals_keep_counters_in_sync(self):
+        documents = [
+            Document.objects.create(template=self.template, title=f'Devis {i}', created_by=self.user)
+            for i in range(3)
+        ]
+        documents[0].is_completed = True
+        documents[0].save()
+        documents[1].delete()
+        self.template.is_public = True
+        self.template.save()
+        self.assertEqual(self.counters(), (1, 1, 2, 1))
+
+        # Suppression en cascade des documents avec le template
+        self.template.delete()
+        self.assertEqual(self.counters(), (0, 0, 0, 0))
+
+        before = self.counters()
+        rebuild_user_stats(self.user.pk)
+        self.assertEqual(self.counters(), before)
+
+    def test_buckets_and_rebuild(self):
+        for _ in range(2):
+            Document.objects.create(template=self.template, title='Devis', created_by=self.user)
+        day = UserActivityBucket.objects.get(user=self.user, period=UserActivityBucket.PERIOD_DAY)
+        self.assertEqual((day.template_count, day.document_count), (1, 2))
+
+        # Écart volontaire, corrigé par la reconstruction
+        UserStats.objects.filter(user=self.user).update(document_count=99)
+        UserActivityBucket.objects.all().delete()
+        rebuild_user_stats(self.user.pk)
+        self.assertEqual(self.counters(), (1, 0, 2, 0))
+        month = UserActivityBucket.objects.get(user=self.user, period=UserActivityBucket.PERIOD_MONTH)
+        self.assertEqual((month.template_count, month.document_count), (1, 2))
+
+    def test_list_reads_counters(self):
+        Document.objects.create(template=self.template, title='Devis', created_by=self.user, is_completed=True)
+        UserStats.objects.filter(user=self.user).update(completed_document_count=42)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('templates_app:document_list'))
+        self.assertEqual(response.context['completed_count'], 42)
+        self.assertEqual(response.context['recent_count'], 1)
+        # Nombre de documents par template compté en SQL
+        counts = {template.pk: template.document_count for template in response.context['templates']}
+        self.assertEqual(counts[self.template.pk], Document.objects.filter(template=self.template).count())
+
+    def test_deleting_user(self):
+        Document.objects.create(template=self.template, title='Devis', created_by=self.user)
+        self.user.delete()
+        self.assertFalse(UserStats.objects.exists())
+        self.assertFalse(UserActivityBucket.objects.exists())
+
+
+class SearchTests(TestCase):
+    """Index de recherche plein texte"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('ivan', password='secret-pass-123')
+        self.other = User.objects.create_user('judy', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def test_query_escaping(self):
+        self.assertEqual(fts5_query('résilier "bail" OR'), '"résilier" "bail" "OR"*')
+        self.assertIsNone(fts5_query('  *** '))
+
+    @skipUnless(fts5_available(), "FTS5 requis")
+    def test_ranked_results_with_snippets(self):
+        in_body = Template.objects.create(
+            title='Courrier', content='Nous souhaitons résilier le contrat.', created_by=self.user
+        )
+        in_title = Template.objects.create(title='Résiliation de bail', content='Madame,', created_by=self.user)
+        Template.objects.create(title='Résiliation privée', content='x', created_by=self.other)
+        Template.objects.create(title='Sans rapport', content='Bonjour', created_by=self.user)
+
+        response = self.client.get(reverse('templates_app:template_list'), {'search': 'resili'})
+        results = list(response.context['templates'])
+        # Titre pondéré plus fort que le contenu ; template privé d'un autre exclu
+        self.assertEqual([template.pk for template in results], [in_title.pk, in_body.pk])
+        self.assertIn('<mark>résilier</mark>', results[1].search_highlight)
+
+    @skipUnless(fts5_available(), "FTS5 requis")
+    def test_index_follows_changes(self):
+        template = Template.objects.create(title='Attestation', content='x', created_by=self.user)
+        document = Document.objects.create(template=template, title='Pour Alice', created_by=self.user)
+        search = lambda query: [d.pk for d in get_search_backend().search_documents(Document.objects.all(), query)]
+
+        self.assertEqual(search('attestation'), [document.pk])
+        template.title = 'Certificat'
+        template.save()
+        self.assertEqual(search('attestation'), [])
+        self.assertEqual(search('certificat'), [document.pk])
+
+        document.delete()
+        self.assertEqual(search('alice'), [])
+
+        # Reconstruction complète
+        Template.objects.filter(pk=template.pk).update(title='Modifié hors signaux')
+        Fts5Backend().rebuild()
+        templates = get_search_backend().search_templates(Template.objects.all(), 'signaux')
+        self.assertEqual([t.pk for t in templates], [template.pk])
+
+    @skipUnless(fts5_available(), "FTS5 requis")
+    def test_migration_uses_schema_editor_connection(self):
+        migration = importlib.import_module('templates_app.migrations.0004_search_index')
+        with mock.patch('templates_app.search.default_connection') as default:
+            migration.create_search_index(None, SimpleNamespace(connection=connection))
+        default.cursor.assert_not_called()
+        self.assertFalse(fts5_available(SimpleNamespace(vendor='postgresql')))
+
+    def test_like_backend_and_global_search(self):
+        Template.objects.create(title='Relance client', content='x', created_by=self.user)
+        with override_settings(SEARCH_BACKEND='templates_app.search.LikeBackend'):
+            results = LikeBackend().search_templates(Template.objects.all(), 'relance')
+            self.assertEqual(len(results), 1)
+
+        response = self.client.get(reverse('templates_app:search_global'), {'q': 'relance'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['templates']), 1)
+
+
+class CursorPaginationTests(TestCase):
+    """Pagination par curseur des listes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('kate', password='secret-pass-123')
+        self.client.force_login(self.user)
+        template = Template.objects.create(title='Lettre', content='x', created_by=self.user)
+        Document.objects.bulk_create([
+            Document(template=template, title=f'Doc {i}', created_by=self.user) for i in range(25)
+        ])
+        # Dates identiques par groupes de 4 : l'id départage
+        now = timezone.now()
+        for document in Document.objects.all():
+            Document.objects.filter(pk=document.pk).update(updated_at=now - timedelta(minutes=document.pk // 4))
+        self.expected = list(Document.objects.order_by('-updated_at', '-id').values_list('pk', flat=True))
+
+    def walk(self, paginator, cursor=None, backwards=False):
+        seen = []
+        while True:
+            page = paginator.page(cursor)
+            ids = [document.pk for document in page]
+            seen = ids + seen if backwards else seen + ids
+            cursor = page.previous_cursor if backwards else page.next_cursor
+            if cursor is None:
+                return seen, page
+
+    def test_walks_forward_and_backward(self):
+        paginator = CursorPaginator(Document.objects.all(), 10, ('-updated_at', '-id'))
+        forward, last_page = self.walk(paginator)
+        self.assertEqual(forward, self.expected)
+        self.assertEqual(len(last_page), 5)
+
+        backward, first_page = self.walk(paginator, last_page.previous_cursor, backwards=True)
+        self.assertEqual(backward, self.expected[:20])
+        self.assertFalse(first_page.has_previous())
+
+    def test_invalid_cursor_and_constant_cost(self):
+        paginator = CursorPaginator(Document.objects.all(), 10, ('-updated_at', '-id'))
+        self.assertEqual([d.pk for d in paginator.page('altéré')], self.expected[:10])
+
+        cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            paginator.page(cursor)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+        with self.assertRaises(ValueError):
+            CursorPaginator(Document.objects.all(), 10, ('-updated_at',))
+
+    def test_list_views(self):
+        response = self.client.get(reverse('templates_app:document_list'), {'status': 'draft'})
+        page = response.context['documents']
+        self.assertEqual(len(page), 12)
+        self.assertIn('status=draft', page.next_query)
+
+        response = self.client.get(reverse('templates_app:document_list') + '?' + page.next_query)
+        self.assertEqual([d.pk for d in response.context['documents']], self.expected[12:24])
+
+        response = self.client.get(reverse('templates_app:template_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_count'], 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN propre à SQLite")
+class QueryPlanTests(TestCase):
+    """Aucune requête des listes, du tableau de bord et de la recherche ne parcourt une table entière"""
+
+    # Tables de référence de quelques lignes : un parcours complet est normal
+    SMALL_TABLES = {'templates_app_templatecategory'}
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(f'plan{i}', password='secret-pass-123') for i in range(5)]
+        categories = [TemplateCategory.objects.create(name=f'Catégorie {i}') for i in range(5)]
+        now = timezone.now()
+        Template.objects.bulk_create([
+            Template(
+                title=f'Modèle {i}', content=f'Objet : relance numéro {i}', created_by=users[i % 5],
+                category=categories[i % 5], is_public=i % 7 == 0, created_at=now - timedelta(hours=i),
+            )
+            for i in range(500)
+        ])
+        templates = list(Template.objects.all())
+        Document.objects.bulk_create([
+            Document(
+                template=templates[i % 500], title=f'Courrier {i}', created_by=users[i % 5],
+                is_completed=i % 3 == 0, created_at=now - timedelta(minutes=i),
+            )
+            for i in range(5000)
+        ])
+        for user in users:
+            rebuild_user_stats(user.pk)
+        # Pas d'ANALYZE : Django ne le lance jamais, les plans de production
+        # reposent sur les estimations par défaut de SQLite
+        get_search_backend().rebuild()
+        cls.user = users[0]
+        cls.category = categories[0]
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[-1] for row in cursor.fetchall()]
+        scans = []
+        for detail in details:
+            match = re.match(r'SCAN (\w+)', detail)
+            if not match or match.group(1) in self.SMALL_TABLES:
+                continue
+            # « SCAN t » ou « SCAN t USING INDEX » : toutes les lignes sont lues
+            # (« USING COVERING INDEX » aussi) ; les tables FTS5 sont virtuelles
+            if 'VIRTUAL TABLE' not in detail:
+                scans.append(detail)
+        return scans
+
+    def assertNoFullScan(self, url, params=None):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with self.subTest(url=url, params=params, sql=sql):
+                self.assertEqual(self.full_scans(sql), [])
+
+    def test_template_list(self):
+        url = reverse('templates_app:template_list')
+        self.assertNoFullScan(url)
+        self.assertNoFullScan(url, {'my_templates': 'on'})
+        self.assertNoFullScan(url, {'category': self.category.pk})
+        self.assertNoFullScan(url, {'search': 'relance'})
+
+        response = self.client.get(url)
+        self.assertNoFullScan(url + '?' + response.context['templates'].next_query)
+
+    def test_document_list(self):
+        url = reverse('templates_app:document_list')
+        self.assertNoFullScan(url)
+        self.assertNoFullScan(url, {'status': 'completed'})
+        self.assertNoFullScan(url, {'search': 'courrier'})
+
+        response = self.client.get(url)
+        self.assertNoFullScan(url + '?' + response.context['documents'].next_query)
+
+    def test_dashboard_and_search(self):
+        self.assertNoFullScan(reverse('templates_app:dashboard'))
+        self.assertNoFullScan(reverse('templates_app:search_global'), {'q': 'courrier'})
+
+
+class DocumentEditTests(TestCase):
+    """Enregistrement des valeurs par différence dans document_edit"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('leo', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.template = Template.objects.create(title='Contrat', content='{{champ_0}}', created_by=self.user)
+        self.fields = [
+            TemplateField.objects.create(
+                template=self.template, field_name=f'champ_{i}', field_label=f'Champ {i}',
+                is_required=i < 2, order=i,
+            )
+            for i in range(60)
+        ]
+        self.document = Document.objects.create(template=self.template, title='Contrat Dupont', created_by=self.user)
+        DocumentFieldValue.objects.bulk_create([
+            DocumentFieldValue(document=self.document, template_field=field, value=f'valeur {i}')
+            for i, field in enumerate(self.fields)
+        ])
+        self.url = reverse('templates_app:document_edit', args=[self.document.pk])
+
+    def post(self, changes=None):
+        data = {'document_title': 'Contrat Dupont'}
+        data.update({f'field_{field.id}': f'valeur {i}' for i, field in enumerate(self.fields)})
+        data.update({f'field_{self.fields[i].id}': value for i, value in (changes or {}).items()})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        return [
+            query['sql'] for query in queries
+            if 'templates_app_documentfieldvalue' in query['sql']
+            and query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+
+    def test_writes_only_changed_values(self):
+        ids_before = set(self.document.field_values.values_list('id', flat=True))
+
+        self.assertEqual(self.post(), [])
+        writes = self.post({5: 'nouvelle valeur'})
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+
+        self.assertEqual(set(self.document.field_values.values_list('id', flat=True)), ids_before)
+        self.assertEqual(self.document.field_values.get(template_field=self.fields[5]).value, 'nouvelle valeur')
+
+    def test_cleared_fields_and_completion(self):
+        self.document.is_completed = True
+        self.document.save()
+
+        # Un champ obligatoire vidé : une suppression, document incomplet
+        writes = self.post({1: ''})
+        self.assertEqual([sql.split()[0] for sql in writes], ['DELETE'])
+        self.document.refresh_from_db()
+        self.assertFalse(self.document.is_completed)
+        self.assertFalse(self.document.field_values.filter(template_field=self.fields[1]).exists())
+
+        # Rempli de nouveau, avec une autre modification : un INSERT, un UPDATE
+        writes = self.post({1: 'retour', 7: 'modifiée'})
+        self.assertEqual(sorted(sql.split()[0] for sql in writes), ['INSERT', 'UPDATE'])
+        self.document.refresh_from_db()
+        self.assertTrue(self.document.is_completed)
+        self.assertEqual(self.document.field_values.count(), 60)
+
+
+class BulkWritePathTests(TestCase):
+    """Création et copies en nombre constant de requêtes, quel que soit le nombre de champs"""
+
+    SIZES = (5, 50, 500)
+
+    def setUp(self):
+        self.user = User.objects.create_user('mia', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def make_template(self, size):
+        template = Template.objects.create(title=f'Modèle {size}', content='{{champ_0}}', created_by=self.user)
+        TemplateField.objects.bulk_create([
+            TemplateField(template=template, field_name=f'champ_{i}', field_label=f'Champ {i}',
+                          is_required=i == 0, order=i)
+            for i in range(size)
+        ])
+        return template
+
+    def count_queries(self, url, data=None):
+        """(requêtes hors INSERT en lot, nombre d'INSERT en lot)"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data or {})
+        self.assertEqual(response.status_code, 302)
+        bulk = [
+            query for query in queries
+            if query['sql'].startswith(('INSERT INTO "templates_app_documentfieldvalue"',
+                                        'INSERT INTO "templates_app_templatefield"'))
+        ]
+        return len(queries) - len(bulk), len(bulk)
+
+    def assertConstant(self, make_request):
+        counts = {}
+        for size in self.SIZES:
+            template = self.make_template(size)
+            counts[size], inserts = make_request(template)
+            # Un INSERT par lot de paramètres SQLite, pas un par ligne
+            self.assertLessEqual(inserts, 5, size)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_document_create(self):
+        def create(template):
+            fields = list(template.fields.all())
+            data = {f'field_{field.id}': 'x' for field in fields}
+            data['document_title'] = 'Lettre'
+            result = self.count_queries(reverse('templates_app:document_create', args=[template.pk]), data)
+            document = Document.objects.filter(template=template).get()
+            self.assertTrue(document.is_completed)
+            self.assertEqual(document.field_values.count(), len(fields))
+            return result
+
+        self.assertConstant(create)
+
+    def test_document_duplicate(self):
+        def duplicate(template):
+            document = Document.objects.create(template=template, title='Original', created_by=self.user)
+            DocumentFieldValue.objects.bulk_create([
+                DocumentFieldValue(document=document, template_field=field, value='x')
+                for field in template.fields.all()
+            ])
+            result = self.count_queries(reverse('templates_app:document_duplicate', args=[document.pk]))
+            copy = Document.objects.get(template=template, title='Copie de Original')
+            self.assertEqual(copy.field_values.count(), template.fields.count())
+            return result
+
+        self.assertConstant(duplicate)
+
+    def test_template_duplicate(self):
+        def duplicate(template):
+            result = self.count_queries(reverse('templates_app:template_duplicate', args=[template.pk]))
+            copy = Template.objects.get(title=f'Copie de {template.title}')
+            self.assertEqual(
+                list(copy.fields.values_list('field_name', 'field_label')),
+                list(template.fields.values_list('field_name', 'field_label')),
+            )
+            return result
+
+        self.assertConstant(duplicate)
+
+
+class DocumentValuesSnapshotTests(TestCase):
+    """Copie dénormalisée Document.values"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('noah', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.template = Template.objects.create(
+            title='Lettre', content='Bonjour {{nom}} de {{ville}}', created_by=self.user
+        )
+        self.nom = TemplateField.objects.create(template=self.template, field_name='nom', field_label='Nom')
+        self.ville = TemplateField.objects.create(template=self.template, field_name='ville', field_label='Ville')
+
+    def create_document(self, title='Lettre Dupont'):
+        self.client.post(reverse('templates_app:document_create', args=[self.template.pk]), {
+            'document_title': title, f'field_{self.nom.id}': 'Dupont', f'field_{self.ville.id}': 'Lyon',
+        })
+        return Document.objects.select_related('template').get(title=title)
+
+    def test_write_paths_fill_snapshot(self):
+        document = self.create_document()
+        self.assertEqual(document.values, {'nom': 'Dupont', 'ville': 'Lyon'})
+
+        # Rendu : la ligne du document et le template compilé suffisent
+        render_document_uncached(document)
+        with self.assertNumQueries(0):
+            rendered, _ = render_document_uncached(document)
+        self.assertEqual(rendered, 'Bonjour Dupont de Lyon')
+
+        self.client.post(reverse('templates_app:document_edit', args=[document.pk]), {
+            'document_title': 'Lettre Dupont', f'field_{self.nom.id}': 'Durand', f'field_{self.ville.id}': '',
+        })
+        self.client.post(reverse('templates_app:document_duplicate', args=[document.pk]))
+        for copy in Document.objects.filter(template=self.template):
+            self.assertEqual(copy.values, {'nom': 'Durand'})
+        self.assertEqual(stale_value_snapshots(Document.objects.values_list('pk', flat=True)), [])
+
+    def test_isolated_changes_reset_snapshot(self):
+        document = self.create_document()
+
+        # Modification directe d'une valeur (admin) : copie recalculée au rendu
+        value = document.field_values.get(template_field=self.nom)
+        value.value = 'Martin'
+        value.save()
+        document.refresh_from_db()
+        self.assertIsNone(document.values)
+        self.assertEqual(render_document_uncached(document)[0], 'Bonjour Martin de Lyon')
+        self.assertEqual(Document.objects.get(pk=document.pk).values['nom'], 'Martin')
+
+        # Champ renommé : la copie, indexée par nom, est recalculée
+        self.ville.field_name = 'commune'
+        self.ville.save()
+        document.refresh_from_db()
+        self.assertIsNone(document.values)
+        self.assertEqual(render_document_uncached(document)[1], {'nom': 'Martin', 'commune': 'Lyon'})
+
+    def test_backfill_command(self):
+        document = self.create_document()
+        Document.objects.filter(pk=document.pk).update(values={'nom': 'Faux'})
+        other = self.create_document('Lettre Durand')
+        Document.objects.filter(pk=other.pk).update(values=None)
+
+        out = io.StringIO()
+        call_command('backfill_document_values', '--check', stdout=out)
+        self.assertIn('1 copie(s) divergente(s), 1 manquante(s)', out.getvalue())
+        self.assertEqual(Document.objects.get(pk=document.pk).values, {'nom': 'Faux'})
+
+        call_command('backfill_document_values', stdout=io.StringIO())
+        self.assertEqual(
+            dict(Document.objects.values_list('pk', 'values')),
+            {document.pk: {'nom': 'Dupont', 'ville': 'Lyon'}, other.pk: {'nom': 'Dupont', 'ville': 'Lyon'}},
+        )
+
+
+class QueryBudgetTests(TestCase):
+    """Budgets de requêtes par vue et détection des N+1"""
+
+    def run_middleware(self, queries, view_name='templates_app:document_list'):
+        def view(request):
+            for _ in range(queries):
+                list(Template.objects.filter(pk=1))
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = SimpleNamespace(view_name=view_name)
+        return QueryBudgetMiddleware(view)(request)
+
+    def test_shapes_ignore_parameter_counts(self):
+        self.assertEqual(
+            statement_shape('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            statement_shape('SELECT * FROM t WHERE id IN (%s)'),
+        )
+        self.assertEqual(statement_shape('INSERT INTO t (a) VALUES (%s), (%s)'), ('INSERT INTO t (a) VALUES (...)', True))
+
+    def test_strict_and_logging_modes(self):
+        self.run_middleware(3)
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'N+1 probable (6 fois)'):
+            self.run_middleware(6, view_name='templates_app:unknown')
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'pour un budget de 12'):
+            self.run_middleware(13)
+
+        with override_settings(QUERY_BUDGET_STRICT=False):
+            with self.assertLogs('templates_app.instrumentation', 'WARNING') as logs:
+                self.run_middleware(13)
+        self.assertIn('13 requêtes SQL pour un budget de 12', logs.output[0])
+
+    def test_pages_within_budget(self):
+        # En mode strict, toute vue hors budget ou avec un N+1 lève une exception
+        user = User.objects.create_user('olga', password='secret-pass-123')
+        other = User.objects.create_user('paul', password='secret-pass-123')
+        category = TemplateCategory.objects.create(name='Courriers')
+        for owner in (user, other):
+            for i in range(15):
+                template = Template.objects.create(
+                    title=f'Modèle {i}', content='{{nom}}', created_by=owner, is_public=True, category=category,
+                )
+                field = TemplateField.objects.create(template=template, field_name='nom', field_label='Nom')
+                for j in range(2):
+                    document = Document.objects.create(template=template, title=f'Courrier {i}-{j}', created_by=owner)
+                    DocumentFieldValue.objects.create(document=document, template_field=field, value='Dupont')
+
+        self.client.force_login(user)
+        document = Document.objects.filter(created_by=user).first()
+        for url in [
+            reverse('templates_app:template_list'),
+            reverse('templates_app:document_list'),
+            reverse('templates_app:dashboard'),
+            reverse('templates_app:template_detail', args=[document.template_id]),
+            reverse('templates_app:document_detail', args=[document.pk]),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ServerTimingTests(TestCase):
+    """En-tête Server-Timing et journal des durées par étape"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('rita', password='secret-pass-123')
+        template = Template.objects.create(title='Relance', content='Bonjour {{nom}}', created_by=self.user)
+        field = TemplateField.objects.create(template=template, field_name='nom', field_label='Nom')
+        self.document = Document.objects.create(template=template, title='Relance Dupont', created_by=self.user)
+        DocumentFieldValue.objects.create(document=self.document, template_field=field, value='Dupont')
+        self.client.force_login(self.user)
+
+    def stage_names(self, response):
+        return [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+
+    def test_export_stages(self):
+        with self.settings(EXPORT_CACHE_ENABLED=False):
+            response = self.client.get(reverse('templates_app:document_export_html', args=[self.document.pk]))
+        self.assertEqual(self.stage_names(response), ['placeholders', 'html', 'sql', 'total'])
+
+        response = self.client.get(reverse('templates_app:document_detail', args=[self.document.pk]))
+        self.assertEqual(self.stage_names(response), ['placeholders', 'template', 'sql', 'total'])
+        self.assertRegex(response['Server-Timing'], r'sql;dur=\d+\.\d;desc="\d+ SQL"')
+
+        # Rendu diffusé : fait pendant l'envoi, aucune étape « placeholders » mesurée
+        response = self.client.get(reverse('templates_app:document_detail', args=[self.document.pk]), {'stream': '1'})
+        self.assertNotIn('placeholders', self.stage_names(response))
+
+    def test_log_line(self):
+        with self.settings(SERVER_TIMING_LOG_MIN_MS=0):
+            with self.assertLogs('templates_app.timing', 'INFO') as logs:
+                self.client.get(reverse('templates_app:document_detail', args=[self.document.pk]))
+        self.assertRegex(
+            logs.output[0],
+            r'method=GET view=templates_app:document_detail status=200 total_ms=[\d.]+ placeholders_ms=[\d.]+ ',
+        )
+
+    def test_stage_outside_request_and_repeats(self):
+        with stage('docx'):
+            pass  # hors requête : aucun chronomètre, aucune erreur
+
+        timer = StageTimer()
+        timer.add('pdf', 0.010, 'reportlab')
+        timer.add('docx', 0.002)
+        timer.add('docx', 0.003)
+        self.assertEqual(
+            server_timing_header(timer, 0.020),
+            'pdf;dur=10.0;desc="reportlab", docx;dur=5.0;desc="x2", total;dur=20.0',
+        )
+
+
+class MetricsTests(TestCase):
+    """Registre de métriques, agrégation entre processus et vue /metrics"""
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+
+    def test_exposition_format(self):
+        registry = Registry()
+        requests = registry.counter('app_requests_total', 'Requêtes', ['view'])
+        latency = registry.histogram('app_latency_seconds', 'Durée', buckets=(0.1, 1.0))
+        requests.inc(view='liste "a"')
+        requests.inc(2, view='liste "a"')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(3)
+
+        text = registry.expose()
+        self.assertIn('# TYPE app_requests_total counter\napp_requests_total{view="liste \\"a\\""} 3\n', text)
+        self.assertIn(
+            'app_latency_seconds_bucket{le="0.1"} 1\n'
+            'app_latency_seconds_bucket{le="1"} 2\n'
+            'app_latency_seconds_bucket{le="+Inf"} 3\n'
+            'app_latency_seconds_sum 3.55\n'
+            'app_latency_seconds_count 3\n',
+            text,
+        )
+        with self.assertRaises(ValueError):
+            requests.inc(page='liste')
+
+    def test_processes_share_directory(self):
+        # Fichier laissé par un worker terminé (pid inexistant)
+        with open(os.path.join(self.metrics_dir, 'metrics-999999999.json'), 'w') as file:
+            file.write('{"pid": 999999999, "values": {"app_exports_total": [[[], 4]], "app_in_progress": [[[], 7]]}}')
+        # Fichier d'un autre format : ignoré
+        with open(os.path.join(self.metrics_dir, 'metrics-legacy.json'), 'w') as file:
+            file.write('{"values": {"app_exports_total": [[[], 100]]}}')
+
+        registry = Registry()
+        counter = registry.counter('app_exports_total', 'Exports')
+        gauge = registry.gauge('app_in_progress', 'En cours')
+        with self.settings(METRICS_DIR=self.metrics_dir):
+            counter.inc()
+            gauge.set(2)
+            text = registry.expose()
+
+        # Compteur : processus terminé compris ; jauge : processus vivants seulement
+        self.assertIn('app_exports_total 5\n', text)
+        self.assertIn('app_in_progress 2\n', text)
+        self.assertTrue(os.path.exists(os.path.join(self.metrics_dir, f'metrics-{os.getpid()}.json')))
+
+    def test_endpoint_is_protected_and_instrumented(self):
+        user = User.objects.create_user('sara', password='secret-pass-123')
+        template = Template.objects.create(title='Avis', content='Bonjour {{nom}}', created_by=user)
+        document = Document.objects.create(template=template, title='Avis Durand', created_by=user)
+        self.client.force_login(user)
+        with self.settings(EXPORT_CACHE_ENABLED=False):
+            self.client.get(reverse('templates_app:document_export_html', args=[document.pk]))
+
+        url = reverse('templates_app:metrics')
+        self.assertEqual(url, '/metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with self.settings(METRICS_TOKEN='jeton'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer autre').status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer jeton')
+
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertRegex(text, r'docbuilder_http_requests_total\{view="templates_app:document_export_html",'
+                               r'method="GET",status="200"\} \d+')
+        self.assertRegex(text, r'docbuilder_export_render_duration_seconds_count\{format="html",engine="html"\} \d+')
+        self.assertRegex(text, r'docbuilder_request_stage_duration_seconds_count\{view="[^"]+",stage="sql"\}')
+        self.assertIn('docbuilder_jobs{state="pending"} 0\n', text)
+
+
+class ProfilingTests(TestCase):
+    """Profilage d'une requête à la demande du staff"""
+
+    def setUp(self):
+        profiles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profiles_dir, ignore_errors=True)
+        self.enterContext(self.settings(PROFILING_DIR=profiles_dir))
+        self.profiles_dir = profiles_dir
+
+        self.staff = User.objects.create_user('tom', password='secret-pass-123', is_staff=True)
+        self.user = User.objects.create_user('ugo', password='secret-pass-123')
+        template = Template.objects.create(title='Bail', content='Locataire : {{nom}}', created_by=self.staff)
+        self.document = Document.objects.create(template=template, title='Bail Martin', created_by=self.staff)
+        self.url = reverse('templates_app:document_detail', args=[self.document.pk])
+
+    def test_profile_with_signed_token(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {PROFILE_PARAM: make_token(self.staff, memory=True)})
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile-Report']
+        self.assertIn('templates_app_document_detail', name)
+        self.assertEqual(sorted(os.listdir(self.profiles_dir)), [f'{name}.pstats', f'{name}.txt'])
+
+        with open(os.path.join(self.profiles_dir, f'{name}.txt')) as summary:
+            text = summary.read()
+        self.assertTrue(text.startswith(f'# GET {self.url}?{PROFILE_PARAM}='))
+        self.assertIn('function calls', text)
+        self.assertIn('principales allocations', text)
+
+        # Page d'administration et téléchargement
+        response = self.client.get(reverse('admin_profiles'))
+        self.assertContains(response, f'{name}.pstats')
+        response = self.client.get(reverse('admin_profile_download', args=[f'{name}.txt']))
+        self.assertEqual(b''.join(response.streaming_content).decode(), text)
+        self.assertEqual(self.client.get(reverse('admin_profile_download', args=['..passwd.txt'])).status_code, 404)
+
+    def test_refused_tokens(self):
+        # Jeton d'un autre compte, compte sans staff, jeton falsifié : pas de profil
+        self.client.force_login(self.staff)
+        with self.assertLogs('templates_app.profiling', 'WARNING'):
+            response = self.client.get(self.url, HTTP_X_PROFILE=make_token(self.user))
+        self.assertNotIn('X-Profile-Report', response)
+        with self.assertLogs('templates_app.profiling', 'WARNING'):
+            response = self.client.get(self.url, HTTP_X_PROFILE=make_token(self.staff) + 'x')
+        self.assertNotIn('X-Profile-Report', response)
+
+        self.user.is_staff = False
+        self.client.force_login(self.user)
+        with self.assertLogs('templates_app.profiling', 'WARNING'):
+            self.client.get(self.url, {PROFILE_PARAM: make_token(self.user)})
+        self.assertEqual(os.listdir(self.profiles_dir), [])
+        self.assertEqual(self.client.get(reverse('admin_profiles')).status_code, 302)
+
+
+class PerfBenchmarkTests(TestCase):
+    """Jeu de données de mesure et suite de benchmarks"""
+
+    def test_seed_perf_data(self):
+        users = seed_perf_data(users=2, categories=3, templates=4, placeholders=15, documents=30)
+        self.assertEqual([user.username for user in users], ['perf-1', 'perf-2'])
+        self.assertEqual(TemplateCategory.objects.count(), 3)
+
+        template = Template.objects.filter(created_by=users[0]).first()
+        # Champs créés depuis le contenu : vocabulaire habituel puis champs numérotés
+        self.assertEqual(template.fields.count(), 15)
+        self.assertTrue(template.fields.filter(field_name='nom_client', is_required=True).exists())
+        self.assertTrue(template.fields.filter(field_name='champ_14').exists())
+
+        documents = Document.objects.filter(created_by=users[0])
+        self.assertEqual(documents.count(), 30)
+        self.assertEqual(stale_value_snapshots(documents.values_list('pk', flat=True)), [])
+        self.assertEqual(UserStats.objects.get(user=users[0]).document_count, 30)
+        self.assertIn('Jean Dupont', render_document_uncached(documents.first())[0])
+
+        self.assertEqual(delete_perf_data(), 2)
+        self.assertFalse(Document.objects.exists())
+
+    def test_run_and_compare(self):
+        data = run_benchmarks([5], repeat=1, users=1, templates=2, placeholders=3)
+        results = data['results']['5']
+        for name in ('template_list', 'document_list', 'dashboard', 'document_detail',
+                     'document_export_html', 'document_export_batch_html', 'render_uncached'):
+            self.assertIn(name, results)
+        self.assertGreater(results['document_detail']['queries'], 0)
+        # Données de mesure annulées
+        self.assertFalse(User.objects.exists())
+
+        baseline = {'results': {'5': {'dashboard': {'median_ms': 10.0}, 'document_list': {'median_ms': 10.0},
+                                      'document_detail': {'median_ms': 0.5}}}}
+        current = {'results': {'5': {'dashboard': {'median_ms': 11.0}, 'document_list': {'median_ms': 15.0},
+                                     'document_detail': {'median_ms': 1.5}, 'template_list': {'median_ms': 9.0}}}}
+        rows = {name: regression for _, name, _, _, _, regression in compare_results(baseline, current, 0.2, 2.0)}
+        # +10 % toléré, +50 % signalé, x3 sur 0.5 ms sous le bruit, mesure nouvelle ignorée
+        self.assertEqual(rows, {'dashboard': False, 'document_list': True, 'document_detail': False})
+
+
+class LoadTestTests(LiveServerTestCase):
+    """Générateur de charge contre un vrai serveur HTTP"""
+
+    def test_weighted_mix_against_live_server(self):
+        users = seed_perf_data(users=1, categories=2, templates=2, placeholders=4, documents=10)
+        targets = [UserTargets(users[0])]
+        mix = {'document_list': 1, 'document_detail': 1, 'document_edit': 1, 'document_export_html': 1}
+
+        # Un seul utilisateur : les threads du serveur de test partagent la connexion
+        # SQLite en mémoire, et donc les compteurs de requêtes des budgets
+        report = asyncio.run(run_step(self.live_server_url, targets, 'perf-password', 1, 1.0, mix=mix))
+        total = report['TOTAL']
+        self.assertGreater(total['requests'], 0)
+        self.assertEqual(total['errors'], 0, report)
+        self.assertEqual(total['failed_logins'], 0)
+        self.assertEqual(set(report) - {'TOTAL'}, set(mix))
+
+    def test_saturation_point(self):
+        steps = [{'TOTAL': {'concurrency': c, 'rps': rps}} for c, rps in ((1, 10), (2, 19), (4, 30), (8, 31), (16, 40))]
+        self.assertEqual(saturation_point(steps), 4)
+
+
+class StreamingRenderTests(TestCase):
+    """Rendu en flux des très grandes lettres"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('sven', password='secret-pass-123')
+        paragraph = 'Ligne {{nom}} é\r\nsuite\n' * 50
+        template = Template.objects.create(title='Long', content=paragraph, created_by=self.user)
+        field = TemplateField.objects.create(template=template, field_name='nom', field_label='Nom')
+        self.document = Document.objects.create(template=template, title='Long Dupont', created_by=self.user)
+        DocumentFieldValue.objects.create(document=self.document, template_field=field, value='Dupont')
+        self.client.force_login(self.user)
+
+    def test_iter_render_matches_render(self):
+        compiled = compile_content('a{{x}}' * 100 + 'fin {{manquant}}')
+        values = {'x': 'valeur-longue' * 3}
+        chunks = list(compiled.iter_render(values, chunk_size=16))
+        self.assertEqual(''.join(chunks), compiled.render(values))
+        self.assertLessEqual(max(map(len, chunks)), 2 * 16)
+        self.assertEqual(compiled.rendered_size(values), len(compiled.render(values)))
+
+    def test_export_html_streamed(self):
+        url = reverse('templates_app:document_export_html', args=[self.document.pk])
+        with self.settings(STREAMING_RENDER_THRESHOLD=100):
+            response = self.client.get(url)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertIn('attachment; filename="Long_Dupont.html"', response['Content-Disposition'])
+        content, _ = render_document(self.document)
+        expected = render_html(self.document.title, content, self.document.template.title)
+        streamed = b''.join(response.streaming_content)
+        generated = re.compile(rb'G\xc3\xa9n\xc3\xa9r\xc3\xa9 le [^<]*')
+        self.assertEqual(generated.sub(b'', streamed), generated.sub(b'', expected))
+
+        # Sous le seuil, fichier exporté classique ; ?stream=1 force le flux
+        with self.settings(EXPORT_CACHE_ENABLED=False):
+            self.assertIsInstance(self.client.get(url), FileResponse)
+        self.assertNotIsInstance(self.client.get(url + '?stream=1'), FileResponse)
+
+    def test_detail_streamed(self):
+        url = reverse('templates_app:document_detail', args=[self.document.pk])
+        page = self.client.get(url).content.decode()
+        response = self.client.get(url + '?stream=1')
+        self.assertTrue(response.streaming)
+        streamed = b''.join(response.streaming_content).decode()
+
+        def content_block(html):
+            return re.search(r'Ligne Dupont.*suite<br>(?=\s*</)', html, re.S).group(0)
+
+        self.assertEqual(content_block(streamed), content_block(page))
+        self.assertNotIn('\r', content_block(streamed))
+
+        # Document en cache : décidé sur la longueur du contenu, sans calcul de taille
+        render_document(self.document)
+        with mock.patch.object(CompiledTemplate, 'rendered_size', side_effect=AssertionError):
+            self.assertFalse(self.client.get(url).streaming)
+            with self.settings(STREAMING_RENDER_THRESHOLD=100):
+                self.assertTrue(self.client.get(url).streaming)
+
+        # \r\n coupé entre deux morceaux : un seul saut de ligne
+        self.assertEqual(''.join(linebreaksbr_chunks(['a\r', '\nb\r', 'c\r'])), 'a<br>b<br>c<br>')
+
+
+class DocxWriterTests(TestCase):
+    """Écriture directe des DOCX"""
+
+    content = 'Première ligne\n\n  Montant : 10 € <net> & "TTC"  \r\nColonne\tvaleur\x01\n'
+
+    def test_package(self):
+        data = render_to_bytes(write_docx_xml, 'Titre & co', self.content, 'Modèle')
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.testzip(), None)
+            names = archive.namelist()
+            document = archive.read('word/document.xml').decode('utf-8')
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn('[Content_Types].xml', names)
+        self.assertIn('<w:pStyle w:val="Title"/><w:jc w:val="center"/>', document)
+        self.assertIn('10 € &lt;net&gt; &amp; "TTC"', document)
+        self.assertIn('<w:tab/>', document)
+        self.assertNotIn('\x01', document)
+
+    @skipUnless(PYTHON_DOCX_AVAILABLE, "python-docx requis")
+    def test_same_paragraphs_as_python_docx(self):
+        import docx
+
+        def paragraphs(write, content):
+            document = docx.Document(io.BytesIO(render_to_bytes(write, 'Titre', content, 'Modèle')))
+            return [(p.text, p.style.name, p.alignment) for p in document.paragraphs]
+
+        # python-docx refuse les caractères de contrôle : comparaison sans eux
+        content = self.content.replace('\x01', '')
+        self.assertEqual(paragraphs(write_docx_xml, content), paragraphs(write_docx_python_docx, content))
+
+    @skipUnless(PYTHON_DOCX_AVAILABLE, "python-docx requis")
+    def test_engine_setting(self):
+        with override_settings(DOCX_ENGINE='python-docx'):
+            python_docx_key = artifact_key('docx', 'Titre', 'Contenu', 'Modèle')
+            with render_export_file('docx', 'Titre', 'Contenu', 'Modèle') as spool:
+                with zipfile.ZipFile(spool) as archive:
+                    self.assertIn('word/stylesWithEffects.xml', archive.namelist())
+        # Changer de moteur ne sert pas un fichier produit par l'autre
+        self.assertNotEqual(artifact_key('docx', 'Titre', 'Contenu', 'Modèle'), python_docx_key)
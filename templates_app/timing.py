@@ -0,0 +1,136 @@
+# templates_app/timing.py - Durée des étapes d'une requête HTTP
+"""
+Découpage du temps de réponse par étape : SQL, substitution des
+placeholders, mise en page PDF (ReportLab ou WeasyPrint), sérialisation
+DOCX/HTML, rendu du gabarit Django.
+
+Les vues entourent chaque étape de ``stage(nom)`` (gestionnaire de contexte
+ou décorateur) ; ``ServerTimingMiddleware`` ouvre un chronomètre par requête
+(``contextvars``), ajoute le temps SQL mesuré par ``QueryBudgetMiddleware``
+(voir instrumentation.py) puis :
+
+- émet l'en-tête ``Server-Timing`` (onglet Réseau des navigateurs) ;
+- journalise une ligne ``clé=valeur`` par requête au moins aussi longue que
+  ``settings.SERVER_TIMING_LOG_MIN_MS`` (0 : toutes).
+
+Le coût est de deux ``perf_counter()`` par étape : le chronométrage reste
+actif en production ; ``settings.SERVER_TIMING = False`` le désactive. Hors
+requête (commandes, tâches), ``stage`` ne mesure rien.
+
+Les étapes peuvent se chevaucher : le SQL exécuté pendant la substitution
+compte dans les deux. Le corps d'une réponse en flux est produit après le
+passage du middleware et n'est pas mesuré.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+_current_timer = ContextVar('templates_app_stage_timer', default=None)
+
+
+class StageTimer:
+    """Durées cumulées par étape pour une requête"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # {nom: [durée (s), nombre de passages, description]}, ordre d'apparition
+        self.stages = {}
+
+    def add(self, name, duration, description=None):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [duration, 1, description]
+        else:
+            entry[0] += duration
+            entry[1] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def stage(name, description=None):
+    """Chronométrer une étape de la requête en cours
+
+    ``with stage('docx'): ...`` ou ``@stage('docx')`` ; ``name`` est un
+    jeton HTTP (lettres, chiffres, ``-``, ``_``).
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start, description)
+
+
+def server_timing_header(timer, total):
+    """Valeur de l'en-tête ``Server-Timing`` (durées en millisecondes)"""
+    metrics = []
+    for name, (duration, count, description) in timer.stages.items():
+        metric = f'{name};dur={duration * 1000:.1f}'
+        if count > 1 and description is None:
+            description = f'x{count}'
+        if description:
+            metric += f';desc="{description}"'
+        metrics.append(metric)
+    metrics.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+def timing_log_line(request, response, timer, total):
+    """Ligne ``clé=valeur`` : vue, statut, durée totale et durée de chaque étape (ms)"""
+    match = getattr(request, 'resolver_match', None)
+    parts = [
+        f'method={request.method}',
+        f'view={match.view_name if match else request.path}',
+        f'status={response.status_code}',
+        f'total_ms={total * 1000:.1f}',
+    ]
+    for name, (duration, count, _) in timer.stages.items():
+        parts.append(f'{name}_ms={duration * 1000:.1f}')
+        if count > 1:
+            parts.append(f'{name}_count={count}')
+    return ' '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """Chronomètre chaque requête : en-tête ``Server-Timing`` et journal
+
+    À placer juste après ``QueryBudgetMiddleware`` pour reprendre le temps SQL
+    qu'il mesure (``request.sql_queries``).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log_min_duration = getattr(settings, 'SERVER_TIMING_LOG_MIN_MS', 0) / 1000
+
+    def __call__(self, request):
+        timer = request.stage_timer = StageTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        total = timer.elapsed()
+
+        recorder = getattr(request, 'sql_queries', None)
+        if recorder is not None and recorder.count:
+            timer.stages['sql'] = [recorder.duration, recorder.count, f'{recorder.count} SQL']
+
+        response['Server-Timing'] = server_timing_header(timer, total)
+        if total >= self.log_min_duration:
+            logger.info(timing_log_line(request, response, timer, total),
+                        extra={'stage_timings': {name: entry[0] for name, entry in timer.stages.items()},
+                               'total_duration': total})
+        return response
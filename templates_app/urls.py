@@ -17,6 +17,7 @@ urlpatterns = [
     # ===============================
     path('', views.home_view, name='home'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('search/', views.search_global, name='search_global'),
     path('complete-tutorial/', views.complete_tutorial, name='complete_tutorial'),
 
     # ===============================
@@ -42,6 +43,7 @@ urlpatterns = [
     # ===============================
     path('documents/', views.document_list, name='document_list'),
     path('documents/create/<int:template_id>/', views.document_create, name='document_create'),
+    path('documents/mail-merge/<int:template_id>/', views.document_mail_merge, name='document_mail_merge'),
     path('documents/<int:document_id>/', views.document_detail, name='document_detail'),
     path('documents/<int:document_id>/edit/', views.document_edit, name='document_edit'),
     path('documents/<int:document_id>/delete/', views.document_delete, name='document_delete'),
@@ -51,6 +53,16 @@ urlpatterns = [
     # Export de documents
     path('documents/<int:document_id>/export/pdf/', views.document_export_pdf, name='document_export_pdf'),
     path('documents/<int:document_id>/export/docx/', views.document_export_docx, name='document_export_docx'),
+    path('documents/<int:document_id>/export/html/', views.document_export_html, name='document_export_html'),
+    path('documents/export/batch/', views.document_export_batch, name='document_export_batch'),
+
+    # ===============================
+    # TÂCHES EN ARRIÈRE-PLAN
+    # ===============================
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/<int:job_id>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:job_id>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
 
     # ===============================
     # CATÉGORIES
@@ -59,4 +71,10 @@ urlpatterns = [
     path('categories/create/', views.category_create, name='category_create'),
     path('categories/<int:category_id>/edit/', views.category_edit, name='category_edit'),
     path('categories/<int:category_id>/delete/', views.category_delete, name='category_delete'),
+
+    # ===============================
+    # SUPERVISION
+    # ===============================
+    # Sans barre finale : chemin attendu par les collecteurs Prometheus
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,58 +1,53 @@
 # templates_app/views.py - Fichier complet avec exports fonctionnels
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib import admin
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse, Http404, FileResponse
+from django.conf import settings
+from django.http import (
+    HttpResponse, HttpResponseNotAllowed, JsonResponse, Http404, FileResponse, StreamingHttpResponse,
+)
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_protect
+from django.utils.crypto import constant_time_compare
 from django.urls import reverse, NoReverseMatch
 from django.template.loader import render_to_string
-from .models import Template, Document, TemplateField, DocumentFieldValue, TemplateCategory
-from .forms import TemplateForm, DocumentForm, TemplateFieldForm, TemplateCategoryForm
+from .models import Template, Document, TemplateField, DocumentFieldValue, TemplateCategory, Job
+from .forms import TemplateForm, DocumentForm, TemplateFieldForm, TemplateCategoryForm, MailMergeForm
+from .mail_merge import run_mail_merge, MailMergeError, TITLE_COLUMN
+from .rendering import render_document, render_or_stream, render_template, stream_document
+from .queries import filter_documents, select_documents, batch_selection_params, visible_templates
+from .pagination import paginate_by_cursor
+from .field_values import posted_field_values, is_document_complete, save_field_values, values_snapshot
+from .stats import dashboard_stats, document_list_stats
+from .search import search_templates, search_documents, highlight
 import re
+from functools import partial
 import logging
 import io
 import os
-from datetime import timedelta
 from .forms import CustomUserCreationForm, CustomAuthenticationForm
 
-# Imports pour les exports
-# Imports pour PDF
-try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib import colors
-    from reportlab.pdfgen import canvas
-
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-
-# Imports pour DOCX
-try:
-    from docx import Document as DocxDocument
-    from docx.shared import Inches, Pt
-    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-
-    PYTHON_DOCX_AVAILABLE = True
-except ImportError:
-    PYTHON_DOCX_AVAILABLE = False
-
-# Alternative avec WeasyPrint - AVEC GESTION D'ERREUR
-try:
-    import weasyprint
-
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    print("WeasyPrint non disponible - utilisation de ReportLab pour les PDFs")
+# Imports pour les exports (bibliothèques optionnelles, voir exports.py)
+from .exports import (
+    REPORTLAB_AVAILABLE, WEASYPRINT_AVAILABLE, CONTENT_TYPES,
+    export_filename, format_available, export_engine, render_export_file, iter_html,
+)
+from . import pdf_service
+from .export_store import get_export_store, render_shared
+from .batch_export import stream_zip_export
+from . import jobs
+from .timing import stage
+from . import metrics
+from . import profiling
 
 # Configuration du logging pour debug
 logger = logging.getLogger(__name__)
@@ -144,43 +139,38 @@ def template_list(request):
     category_filter = request.GET.get('category', '')
     my_templates = request.GET.get('my_templates', '') == 'on'
 
-    # Construction de la requête
-    templates = Template.objects.all()
-
     # Filtre par propriétaire
     if my_templates:
-        templates = templates.filter(created_by=request.user)
+        templates = Template.objects.filter(created_by=request.user)
     else:
         # Sinon, afficher les templates publics ou ceux de l'utilisateur
-        templates = templates.filter(
-            Q(created_by=request.user) | Q(is_public=True)
-        )
-
-    # Filtre par recherche
-    if search:
-        templates = templates.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(content__icontains=search)
-        )
+        templates = visible_templates(request.user)
 
     # Filtre par catégorie
     if category_filter:
         templates = templates.filter(category_id=category_filter)
 
-    # Tri par date de création (plus récent en premier)
-    templates = templates.order_by('-created_at')
+    # Catégorie, auteur et champs affichés sur chaque carte
+    templates = templates.select_related('category', 'created_by').prefetch_related('fields')
 
-    # Pagination
-    paginator = Paginator(templates, 12)  # 12 templates par page
-    page_number = request.GET.get('page')
-    templates = paginator.get_page(page_number)
+    # Recherche plein texte : triée par pertinence, pagination numérotée.
+    # Sinon pagination par curseur sur la date de création (coût constant)
+    if search:
+        paginator = Paginator(search_templates(templates, search), 12)  # 12 templates par page
+        templates = paginator.get_page(request.GET.get('page'))
+        total_count = paginator.count
+        add_search_highlights(templates)
+    else:
+        templates = paginate_by_cursor(request, templates, 12, ('-created_at', '-id'), with_count=True)
+        total_count = templates.count
+    add_document_counts(templates)
 
     # Catégories pour le filtre
     categories = TemplateCategory.objects.all().order_by('name')
 
     context = {
         'templates': templates,
+        'total_count': total_count,
         'categories': categories,
         'search': search,
         'category_filter': category_filter,
@@ -192,29 +182,28 @@ def template_list(request):
 @login_required
 def template_detail(request, template_id):
     """Détail d'un template avec ses champs"""
-    template = get_object_or_404(Template, id=template_id)
+    template = get_object_or_404(Template.objects.select_related('category', 'created_by'), id=template_id)
 
     # Vérifier les permissions
-    if not template.is_public and template.created_by != request.user:
+    if not template.is_public and template.created_by_id != request.user.id:
         messages.error(request, "Vous n'avez pas accès à ce template.")
         return redirect('templates_app:template_list')
 
     # Récupérer les champs du template
     fields = template.fields.all().order_by('order', 'field_name')
 
-    # Compter les documents créés avec ce template
-    documents_count = Document.objects.filter(template=template).count()
-    user_documents_count = Document.objects.filter(
-        template=template,
-        created_by=request.user
-    ).count() if request.user.is_authenticated else 0
+    # Compter les documents créés avec ce template (tous, et ceux de l'utilisateur)
+    counts = Document.objects.filter(template=template).aggregate(
+        documents_count=Count('id'),
+        user_documents_count=Count('id', filter=Q(created_by_id=request.user.id)),
+    )
 
     context = {
         'template': template,
         'fields': fields,
-        'documents_count': documents_count,
-        'user_documents_count': user_documents_count,
-        'can_edit': request.user == template.created_by,
+        'documents_count': counts['documents_count'],
+        'user_documents_count': counts['user_documents_count'],
+        'can_edit': request.user.id == template.created_by_id,
     }
     return render(request, 'templates_app/template_detail.html', context)
 
@@ -284,43 +273,29 @@ def document_create(request, template_id):
     template = get_object_or_404(Template, id=template_id)
 
     # Vérifier les permissions
-    if not template.is_public and template.created_by != request.user:
+    if not template.is_public and template.created_by_id != request.user.id:
         messages.error(request, "Vous n'avez pas accès à ce template.")
         return redirect('templates_app:template_list')
 
     # Récupérer les champs du template
-    fields = template.fields.all().order_by('order', 'field_name')
+    fields = list(template.fields.all().order_by('order', 'field_name'))
 
     if request.method == 'POST':
-        # Créer le document
+        values = posted_field_values(request.POST, fields)
         document_title = request.POST.get('document_title', f'Document basé sur {template.title}')
-        document = Document.objects.create(
-            title=document_title,
-            template=template,
-            created_by=request.user,
-            is_completed=False
-        )
 
-        # Sauvegarder les valeurs des champs
-        for field in fields:
-            field_value = request.POST.get(f'field_{field.id}', '')
-            if field_value:  # Ne sauvegarder que si il y a une valeur
-                DocumentFieldValue.objects.create(
-                    document=document,
-                    template_field=field,
-                    value=field_value
-                )
-
-        # Marquer comme complété si tous les champs requis sont remplis
-        required_fields = fields.filter(is_required=True)
-        filled_required = 0
-        for field in required_fields:
-            if request.POST.get(f'field_{field.id}'):
-                filled_required += 1
+        with transaction.atomic():
+            # Statut connu avant la création : un seul enregistrement du document
+            document = Document.objects.create(
+                title=document_title,
+                template=template,
+                created_by=request.user,
+                is_completed=is_document_complete(fields, values),
+                values=values_snapshot(fields, values)
+            )
 
-        if filled_required == required_fields.count():
-            document.is_completed = True
-            document.save()
+            # Sauvegarder les valeurs des champs (ne sauvegarder que si il y a une valeur)
+            save_field_values(document, fields, {}, values)
 
         messages.success(request, f'Document "{document.title}" créé avec succès!')
         return redirect('templates_app:document_detail', document_id=document.id)
@@ -333,10 +308,60 @@ def document_create(request, template_id):
     return render(request, 'templates_app/document_form.html', context)
 
 
+@login_required
+def document_mail_merge(request, template_id):
+    """Créer un document par ligne d'un fichier CSV (publipostage)"""
+    template = get_object_or_404(Template, id=template_id)
+
+    # Vérifier les permissions
+    if not template.is_public and template.created_by_id != request.user.id:
+        messages.error(request, "Vous n'avez pas accès à ce template.")
+        return redirect('templates_app:template_list')
+
+    fields = template.fields.all().order_by('order', 'field_name')
+    result = None
+
+    if request.method == 'POST':
+        form = MailMergeForm(request.POST, request.FILES)
+        if form.is_valid() and form.cleaned_data['background']:
+            # Gros fichiers : traitement par `manage.py run_workers`
+            job = enqueue_mail_merge(template, form.cleaned_data, request.user)
+            messages.info(request, 'Publipostage mis en file d\'attente.')
+            return redirect('templates_app:job_detail', job_id=job.id)
+        if form.is_valid():
+            csv_file = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = run_mail_merge(
+                    template, csv_file, request.user,
+                    delimiter=form.cleaned_data['delimiter'],
+                )
+            except MailMergeError as e:
+                messages.error(request, str(e))
+            else:
+                if result.created:
+                    messages.success(request, f'{result.created} document(s) créé(s) avec succès!')
+                if result.error_count:
+                    messages.warning(request, f'{result.error_count} ligne(s) ignorée(s) car invalides.')
+    else:
+        form = MailMergeForm()
+
+    context = {
+        'template': template,
+        'fields': fields,
+        'form': form,
+        'result': result,
+        'title_column': TITLE_COLUMN,
+    }
+    return render(request, 'templates_app/document_mail_merge.html', context)
+
+
 @login_required
 def document_detail(request, document_id):
     """Détail d'un document"""
-    document = get_object_or_404(Document, id=document_id, created_by=request.user)
+    document = get_object_or_404(
+        Document.objects.select_related('template__category', 'template__created_by'),
+        id=document_id, created_by=request.user
+    )
 
     # Vérifier que le document a bien un template
     if not document.template:
@@ -345,17 +370,12 @@ def document_detail(request, document_id):
 
     template = document.template
 
-    # Récupérer les valeurs des champs
-    field_values = {}
-    for field_value in document.field_values.all():
-        field_name = field_value.template_field.field_name
-        field_values[field_name] = field_value.value
+    # Générer le contenu rendu à partir des valeurs des champs
+    rendered_content, field_values = render_or_stream(request, document)
 
-    # Générer le contenu rendu
-    rendered_content = document.template.content
-    for field_name, field_value in field_values.items():
-        placeholder = f'{{{{{field_name}}}}}'
-        rendered_content = rendered_content.replace(placeholder, str(field_value))
+    # Très grande lettre : page diffusée en flux, le contenu n'est jamais construit en entier
+    if rendered_content is None:
+        return stream_document_detail(request, document, field_values)
 
     context = {
         'document': document,
@@ -363,7 +383,49 @@ def document_detail(request, document_id):
         'rendered_content': rendered_content,
         'field_values': field_values,
     }
-    return render(request, 'templates_app/document_detail.html', context)
+    with stage('template'):
+        return render(request, 'templates_app/document_detail.html', context)
+
+
+# Repère remplacé par le contenu dans la page de détail diffusée en flux
+STREAMED_CONTENT_MARKER = '\x00docbuilder-streamed-content\x00'
+
+
+def linebreaksbr_chunks(chunks):
+    """Équivalent de ``|linebreaksbr`` (sans échappement) appliqué morceau par morceau"""
+    carry = ''
+    for chunk in chunks:
+        chunk = carry + chunk
+        # Un \r en fin de morceau peut être suivi d'un \n dans le suivant
+        carry = '\r' if chunk.endswith('\r') else ''
+        if carry:
+            chunk = chunk[:-1]
+        yield chunk.replace('\r\n', '\n').replace('\r', '\n').replace('\n', '<br>')
+    if carry:
+        yield '<br>'
+
+
+def stream_document_detail(request, document, field_values):
+    """Page de détail diffusée en flux : gabarit rendu autour d'un repère, puis le contenu par morceaux"""
+    # Le rendu a lieu pendant l'envoi de la réponse, hors étapes Server-Timing
+    chunks, field_values = stream_document(document, field_values=field_values)
+
+    context = {
+        'document': document,
+        'template': document.template,
+        'rendered_content': STREAMED_CONTENT_MARKER,
+        'field_values': field_values,
+    }
+    with stage('template'):
+        page = render_to_string('templates_app/document_detail.html', context, request=request)
+    head, tail = page.split(STREAMED_CONTENT_MARKER, 1)
+
+    def stream():
+        yield head
+        yield from linebreaksbr_chunks(chunks)
+        yield tail
+
+    return StreamingHttpResponse(stream(), content_type='text/html; charset=utf-8')
 
 
 @login_required
@@ -371,42 +433,29 @@ def document_edit(request, document_id):
     """Éditer un document existant"""
     document = get_object_or_404(Document, id=document_id, created_by=request.user)
     template = document.template
-    fields = template.fields.all().order_by('order', 'field_name')
+    fields = list(template.fields.all().order_by('order', 'field_name'))
 
     # Récupérer les valeurs existantes
-    existing_values = {}
-    for field_value in document.field_values.all():
-        existing_values[field_value.template_field.id] = field_value.value
+    existing_rows = {row.template_field_id: row for row in document.field_values.all()}
+    existing_values = {field_id: row.value for field_id, row in existing_rows.items()}
 
     if request.method == 'POST':
-        # Mettre à jour le titre si fourni
-        new_title = request.POST.get('document_title')
-        if new_title and new_title != document.title:
-            document.title = new_title
-            document.save()
+        values = posted_field_values(request.POST, fields)
 
-        # Supprimer les anciennes valeurs
-        document.field_values.all().delete()
-
-        # Sauvegarder les nouvelles valeurs
-        for field in fields:
-            field_value = request.POST.get(f'field_{field.id}', '')
-            if field_value:
-                DocumentFieldValue.objects.create(
-                    document=document,
-                    template_field=field,
-                    value=field_value
-                )
+        with transaction.atomic():
+            # Mettre à jour le titre si fourni
+            new_title = request.POST.get('document_title')
+            if new_title:
+                document.title = new_title
 
-        # Mettre à jour le statut
-        required_fields = fields.filter(is_required=True)
-        filled_required = 0
-        for field in required_fields:
-            if request.POST.get(f'field_{field.id}'):
-                filled_required += 1
+            # N'écrire que les valeurs qui ont changé
+            save_field_values(document, fields, existing_rows, values)
 
-        document.is_completed = filled_required == required_fields.count()
-        document.save()
+            # Statut calculé sur les valeurs soumises, sans nouvelle requête ;
+            # l'enregistrement du document invalide aussi son rendu en cache
+            document.is_completed = is_document_complete(fields, values)
+            document.values = values_snapshot(fields, values)
+            document.save()
 
         messages.success(request, f'Document "{document.title}" modifié avec succès!')
         return redirect('templates_app:document_detail', document_id=document.id)
@@ -430,44 +479,21 @@ def document_list(request):
 
     # Requête de base
     documents = Document.objects.filter(created_by=request.user)
-    all_documents = documents  # Pour les statistiques
 
     # Filtres
-    if search:
-        documents = documents.filter(
-            Q(title__icontains=search) |
-            Q(template__title__icontains=search)
-        )
-
-    if selected_template:
-        documents = documents.filter(template_id=selected_template)
-
-    # Correction: utiliser is_completed au lieu de status
-    if selected_status == 'completed':
-        documents = documents.filter(is_completed=True)
-    elif selected_status == 'draft':
-        documents = documents.filter(is_completed=False)
-
-    # Tri par date de modification
-    documents = documents.order_by('-updated_at')
-
-    # Statistiques - Correction: utiliser is_completed
-    completed_count = all_documents.filter(is_completed=True).count()
-    draft_count = all_documents.filter(is_completed=False).count()
-
-    # Documents créés cette semaine
-    week_ago = timezone.now() - timedelta(days=7)
-    recent_count = all_documents.filter(created_at__gte=week_ago).count()
-
-    # Pagination
-    paginator = Paginator(documents, 12)
-    page_number = request.GET.get('page')
-    documents = paginator.get_page(page_number)
-
-    # Templates pour le filtre
-    templates = Template.objects.filter(
-        Q(created_by=request.user) | Q(is_public=True)
-    ).order_by('title')
+    documents = filter_documents(documents, search, selected_template, selected_status)
+
+    # Pagination par curseur sur la date de modification
+    documents = paginate_by_cursor(request, documents.select_related('template'), 12, ('-updated_at', '-id'))
+
+    # Templates pour le filtre, avec leur catégorie, auteur, nombre de champs et
+    # de documents (comptés en SQL)
+    templates = (
+        visible_templates(request.user)
+        .select_related('category', 'created_by')
+        .annotate(field_count=Count('fields'), document_count=document_count_subquery())
+        .order_by('title')
+    )
 
     context = {
         'documents': documents,
@@ -475,9 +501,8 @@ def document_list(request):
         'search': search,
         'selected_template': selected_template,
         'selected_status': selected_status,
-        'completed_count': completed_count,
-        'draft_count': draft_count,
-        'recent_count': recent_count,
+        # Statistiques : compteurs matérialisés (terminés, brouillons, semaine)
+        **document_list_stats(request.user),
     }
     return render(request, 'templates_app/document_list.html', context)
 
@@ -506,22 +531,24 @@ def document_duplicate(request, document_id):
         # Récupérer le document original
         original_document = get_object_or_404(Document, id=document_id, created_by=request.user)
 
-        # Créer une copie du document
-        new_document = Document.objects.create(
-            title=f"Copie de {original_document.title}",
-            template=original_document.template,
-            created_by=request.user,
-            is_completed=False  # Nouveau document en brouillon
-        )
+        rows = list(original_document.field_values.values_list('template_field_id', 'template_field__field_name', 'value'))
 
-        # Copier toutes les valeurs des champs
-        for field_value in original_document.field_values.all():
-            DocumentFieldValue.objects.create(
-                document=new_document,
-                template_field=field_value.template_field,
-                value=field_value.value
+        with transaction.atomic():
+            # Créer une copie du document
+            new_document = Document.objects.create(
+                title=f"Copie de {original_document.title}",
+                template_id=original_document.template_id,
+                created_by=request.user,
+                is_completed=False,  # Nouveau document en brouillon
+                values={field_name: value for _, field_name, value in rows}
             )
 
+            # Copier toutes les valeurs des champs
+            DocumentFieldValue.objects.bulk_create([
+                DocumentFieldValue(document=new_document, template_field_id=template_field_id, value=value)
+                for template_field_id, _, value in rows
+            ])
+
         messages.success(request, f'Document dupliqué avec succès : "{new_document.title}"')
         return redirect('templates_app:document_detail', document_id=new_document.id)
 
@@ -538,7 +565,9 @@ def document_duplicate(request, document_id):
 def document_export_pdf(request, document_id):
     """Export PDF avec ReportLab ou WeasyPrint"""
     try:
-        document = get_object_or_404(Document, id=document_id, created_by=request.user)
+        document = get_object_or_404(
+            Document.objects.select_related('template'), id=document_id, created_by=request.user
+        )
 
         if not REPORTLAB_AVAILABLE and not WEASYPRINT_AVAILABLE:
             messages.error(request,
@@ -551,24 +580,12 @@ def document_export_pdf(request, document_id):
             messages.error(request, "Ce document n'a pas de template associé.")
             return redirect('templates_app:document_detail', document_id=document_id)
 
-        # Récupérer les données du document
-        template = document.template
-        field_values = {}
-
-        for field_value in document.field_values.all():
-            field_name = field_value.template_field.field_name
-            field_values[field_name] = field_value.value
-
         # Remplacer les placeholders
-        rendered_content = template.content or ""
-        for field_name, field_value in field_values.items():
-            placeholder = f'{{{{{field_name}}}}}'
-            rendered_content = rendered_content.replace(placeholder, str(field_value))
+        with stage('placeholders'):
+            rendered_content, _ = render_document(document)
 
-        if WEASYPRINT_AVAILABLE:
-            return export_pdf_weasyprint(document, rendered_content)
-        else:
-            return export_pdf_reportlab(document, rendered_content)
+        # Mise en page dans le pool de processus PDF (WeasyPrint ou ReportLab)
+        return export_download('pdf', document, rendered_content, pdf_service.render_file)
 
     except Exception as e:
         # Log l'erreur pour debugging
@@ -582,66 +599,18 @@ def document_export_pdf(request, document_id):
 
 @login_required
 def document_export_docx(request, document_id):
-    """Export DOCX avec python-docx"""
-    document = get_object_or_404(Document, id=document_id, created_by=request.user)
-
-    if not PYTHON_DOCX_AVAILABLE:
-        messages.error(request,
-                       "La bibliothèque python-docx n'est pas installée. "
-                       "Installez-la avec: pip install python-docx")
-        return redirect('templates_app:document_detail', document_id=document_id)
+    """Export DOCX (écriture directe, ou python-docx selon settings.DOCX_ENGINE)"""
+    document = get_object_or_404(
+        Document.objects.select_related('template'), id=document_id, created_by=request.user
+    )
 
     try:
-        # Récupérer les données du document
-        template = document.template
-        field_values = {}
-
-        for field_value in document.field_values.all():
-            field_name = field_value.template_field.field_name
-            field_values[field_name] = field_value.value
-
         # Remplacer les placeholders
-        rendered_content = template.content
-        for field_name, field_value in field_values.items():
-            placeholder = f'{{{{{field_name}}}}}'
-            rendered_content = rendered_content.replace(placeholder, str(field_value))
+        with stage('placeholders'):
+            rendered_content, _ = render_document(document)
 
         # Créer le document DOCX
-        doc = DocxDocument()
-
-        # Titre
-        title = doc.add_heading(document.title, 0)
-        title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        # Date
-        date_para = doc.add_paragraph(f"Généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}")
-        date_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        # Contenu principal
-        lines = rendered_content.split('\n')
-        for line in lines:
-            if line.strip():
-                doc.add_paragraph(line.strip())
-
-        # Footer
-        doc.add_paragraph()
-        footer = doc.add_paragraph(f"Document généré par DocBuilder - {template.title}")
-        footer.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        # Sauvegarder dans un buffer
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-
-        # Créer la réponse
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
-        filename = f"{document.title.replace(' ', '_')}.docx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        return response
+        return export_download('docx', document, rendered_content, partial(render_export_file, 'docx'))
 
     except Exception as e:
         messages.error(request, f'Erreur lors de l\'export DOCX : {str(e)}')
@@ -651,241 +620,189 @@ def document_export_docx(request, document_id):
 @login_required
 def document_export_html(request, document_id):
     """Export HTML avec styles intégrés"""
-    document = get_object_or_404(Document, id=document_id, created_by=request.user)
+    document = get_object_or_404(
+        Document.objects.select_related('template'), id=document_id, created_by=request.user
+    )
 
     try:
-        # Récupérer les données du document
-        template = document.template
-        field_values = {}
-
-        for field_value in document.field_values.all():
-            field_name = field_value.template_field.field_name
-            field_values[field_name] = field_value.value
-
         # Remplacer les placeholders
-        rendered_content = template.content
-        for field_name, field_value in field_values.items():
-            placeholder = f'{{{{{field_name}}}}}'
-            rendered_content = rendered_content.replace(placeholder, str(field_value))
+        rendered_content, field_values = render_or_stream(request, document)
+
+        # Très grande lettre : page diffusée en flux, sans passer par le cache d'export
+        if rendered_content is None:
+            # Rendu pendant l'envoi de la réponse : hors étapes Server-Timing
+            chunks, _ = stream_document(document, field_values=field_values)
+            response = StreamingHttpResponse(
+                iter_html(document.title, chunks, document.template.title), content_type=CONTENT_TYPES['html']
+            )
+            response['Content-Disposition'] = f'attachment; filename="{export_filename(document.title, "html")}"'
+            metrics.EXPORT_FILES.inc(format='html', mode='stream', result='ok')
+            return response
 
         # Créer le HTML avec styles
-        html_content = f"""<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{document.title}</title>
-    <style>
-        body {{
-            font-family: 'Times New Roman', serif;
-            line-height: 1.6;
-            max-width: 800px;
-            margin: 2em auto;
-            padding: 2em;
-            color: #333;
-        }}
-        .document-header {{
-            text-align: center;
-            margin-bottom: 2em;
-            padding-bottom: 1em;
-            border-bottom: 2px solid #3498db;
-        }}
-        .document-header h1 {{
-            color: #2c3e50;
-            margin-bottom: 0.5em;
-            font-size: 2em;
-        }}
-        .document-content {{
-            margin: 2em 0;
-            text-align: justify;
-        }}
-        .document-footer {{
-            margin-top: 3em;
-            padding-top: 1em;
-            border-top: 1px solid #bdc3c7;
-            font-size: 0.9em;
-            color: #7f8c8d;
-            text-align: center;
-        }}
-        h1, h2, h3 {{ color: #2c3e50; }}
-        p {{ margin-bottom: 1em; }}
-
-        @media print {{
-            body {{ margin: 1cm; }}
-            .no-print {{ display: none; }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="document-header">
-        <h1>{document.title}</h1>
-        <p><em>Généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}</em></p>
-    </div>
-
-    <div class="document-content">
-        {rendered_content.replace(chr(10), '<br>')}
-    </div>
-
-    <div class="document-footer">
-        <p><strong>Document généré par DocBuilder</strong></p>
-        <p>Template source : {document.template.title}</p>
-        <p class="no-print">
-            <button onclick="window.print()" style="padding: 10px 20px; background: #3498db; color: white; border: none; border-radius: 5px; cursor: pointer;">
-                Imprimer ce document
-            </button>
-        </p>
-    </div>
-</body>
-</html>"""
-
-        # Créer la réponse
-        response = HttpResponse(html_content, content_type='text/html')
-        filename = f"{document.title.replace(' ', '_')}.html"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        return response
+        return export_download('html', document, rendered_content, partial(render_export_file, 'html'))
 
     except Exception as e:
         messages.error(request, f'Erreur lors de l\'export HTML : {str(e)}')
         return redirect('templates_app:document_detail', document_id=document_id)
 
 
-# ===============================
-# FONCTIONS UTILITAIRES POUR EXPORTS
-# ===============================
+@login_required
+def document_export_batch(request):
+    """Export d'une sélection de documents dans une archive ZIP diffusée en continu"""
+    export_format = request.GET.get('format', 'pdf')
+    if export_format not in CONTENT_TYPES:
+        messages.error(request, f'Format d\'export inconnu : {export_format}')
+        return redirect('templates_app:document_list')
 
-def export_pdf_weasyprint(document, content):
-    """Export PDF avec WeasyPrint (recommandé pour le CSS)"""
-    # Créer le HTML avec styles
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @page {{
-                margin: 2cm;
-                size: A4;
-            }}
-            body {{
-                font-family: 'Times New Roman', serif;
-                font-size: 12pt;
-                line-height: 1.6;
-                color: #333;
-            }}
-            h1, h2, h3 {{
-                color: #2c3e50;
-                margin-top: 1em;
-                margin-bottom: 0.5em;
-            }}
-            h1 {{ font-size: 18pt; }}
-            h2 {{ font-size: 16pt; }}
-            h3 {{ font-size: 14pt; }}
-            p {{ margin-bottom: 1em; }}
-            .header {{
-                text-align: center;
-                margin-bottom: 2em;
-                padding-bottom: 1em;
-                border-bottom: 2px solid #3498db;
-            }}
-            .footer {{
-                margin-top: 3em;
-                padding-top: 1em;
-                border-top: 1px solid #bdc3c7;
-                font-size: 10pt;
-                color: #7f8c8d;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>{document.title}</h1>
-            <p>Généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}</p>
-        </div>
-
-        <div class="content">
-            {content.replace(chr(10), '<br>')}
-        </div>
-
-        <div class="footer">
-            <p>Document généré par DocBuilder - {document.template.title}</p>
-        </div>
-    </body>
-    </html>
-    """
+    if not format_available(export_format):
+        messages.error(request, f'Les bibliothèques nécessaires à l\'export {export_format.upper()} ne sont pas installées.')
+        return redirect('templates_app:document_list')
 
-    # Générer le PDF
-    pdf_file = weasyprint.HTML(string=html_content).write_pdf()
+    documents = select_documents(request.user, **batch_selection_params(request.GET))
+    if not documents.exists():
+        messages.warning(request, "Aucun document ne correspond à la sélection.")
+        return redirect('templates_app:document_list')
 
-    # Créer la réponse HTTP
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    filename = f"{document.title.replace(' ', '_')}.pdf"
+    # Arrière-plan : POST uniquement (un GET ne doit pas créer de tâche)
+    if request.GET.get('background') and request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if request.method == 'POST':
+        params = dict(batch_selection_params(request.GET), format=export_format)
+        job = jobs.enqueue('batch_export', request.user, params)
+        messages.info(request, 'Export mis en file d\'attente.')
+        return redirect('templates_app:job_detail', job_id=job.id)
+
+    response = StreamingHttpResponse(
+        stream_zip_export(documents, export_format),
+        content_type='application/zip'
+    )
+    filename = f"documents_{timezone.now().strftime('%Y%m%d_%H%M')}_{export_format}.zip"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
     return response
 
 
-def export_pdf_reportlab(document, content):
-    """Export PDF avec ReportLab (plus basique)"""
-    buffer = io.BytesIO()
+# ===============================
+# TÂCHES EN ARRIÈRE-PLAN
+# ===============================
 
-    # Créer le document PDF
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1 * inch)
+def enqueue_mail_merge(template, cleaned_data, user):
+    """Enregistrer le CSV déposé puis créer la tâche de publipostage, complète"""
+    csv_file = jobs.save_upload(cleaned_data['csv_file'], 'csv')
+    return jobs.enqueue('mail_merge', user, {
+        'template_id': template.id,
+        'delimiter': cleaned_data['delimiter'],
+        'csv_file': csv_file,
+    })
 
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Title'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1  # Centré
-    )
 
-    normal_style = styles['Normal']
-    normal_style.fontSize = 12
-    normal_style.leading = 18
+@login_required
+def job_list(request):
+    """Tâches en arrière-plan de l'utilisateur"""
+    user_jobs = Job.objects.filter(created_by=request.user)
 
-    # Contenu
-    story = []
+    paginator = Paginator(user_jobs, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    # Titre
-    title = Paragraph(document.title, title_style)
-    story.append(title)
+    return render(request, 'templates_app/job_list.html', {'page_obj': page_obj})
 
-    # Date
-    date_para = Paragraph(f"Généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}", styles['Normal'])
-    story.append(date_para)
-    story.append(Spacer(1, 20))
 
-    # Contenu principal (diviser par lignes)
-    lines = content.split('\n')
-    for line in lines:
-        if line.strip():
-            para = Paragraph(line.strip(), normal_style)
-            story.append(para)
-        else:
-            story.append(Spacer(1, 12))
+@login_required
+def job_detail(request, job_id):
+    """Suivi d'une tâche (la page interroge job_status jusqu'à la fin)"""
+    job = get_object_or_404(Job, id=job_id, created_by=request.user)
+    return render(request, 'templates_app/job_detail.html', {'job': job})
 
-    # Footer
-    story.append(Spacer(1, 30))
-    footer = Paragraph(f"Document généré par DocBuilder - {document.template.title}", styles['Normal'])
-    story.append(footer)
 
-    # Construire le PDF
-    doc.build(story)
+@never_cache
+@login_required
+def job_status(request, job_id):
+    """État d'une tâche en JSON"""
+    job = get_object_or_404(Job, id=job_id, created_by=request.user)
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'state': job.state,
+        'state_display': job.get_state_display(),
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'finished': job.is_finished,
+        'error': job.error,
+        'result': job.result,
+        'download_url': None,
+    }
+    if job.state == Job.STATE_SUCCEEDED and job.result_file:
+        data['download_url'] = reverse('templates_app:job_download', args=[job.id])
+    return JsonResponse(data)
 
-    # Réponse
-    pdf = buffer.getvalue()
-    buffer.close()
 
-    response = HttpResponse(pdf, content_type='application/pdf')
-    filename = f"{document.title.replace(' ', '_')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+@login_required
+def job_download(request, job_id):
+    """Télécharger le fichier produit par une tâche terminée"""
+    job = get_object_or_404(Job, id=job_id, created_by=request.user)
+    if job.state != Job.STATE_SUCCEEDED or not job.result_file:
+        raise Http404("Aucun fichier disponible pour cette tâche.")
+
+    try:
+        result_file = job.result_file.open('rb')
+    except FileNotFoundError:
+        raise Http404("Le fichier de cette tâche n'existe plus.")
+    return FileResponse(result_file, as_attachment=True, filename=os.path.basename(job.result_file.name))
+
 
+# ===============================
+# FONCTIONS UTILITAIRES POUR EXPORTS
+# ===============================
+
+def export_response(data, export_format, title):
+    """Réponse HTTP de téléchargement pour un fichier exporté (octets ou fichier ouvert)
+
+    Un fichier est envoyé par ``FileResponse`` : par blocs, ou par
+    ``sendfile`` quand le serveur fournit ``wsgi.file_wrapper`` et que le
+    fichier est sur disque.
+    """
+    if not isinstance(data, bytes):
+        return FileResponse(
+            data,
+            as_attachment=True,
+            filename=export_filename(title, export_format),
+            content_type=CONTENT_TYPES[export_format],
+        )
+    response = HttpResponse(data, content_type=CONTENT_TYPES[export_format])
+    filename = export_filename(title, export_format)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
+def export_download(export_format, document, rendered_content, render):
+    """Téléchargement d'un export, servi depuis le cache disque si déjà généré
+
+    Les demandes simultanées du même export attendent un rendu unique.
+    """
+    title = document.title
+    template_title = document.template.title
+    engine = export_engine(export_format)
+
+    # Mise en page / sérialisation chronométrée (absente si servie du cache)
+    @stage(export_format, engine if engine != export_format else None)
+    @metrics.EXPORT_RENDER_SECONDS.time(format=export_format, engine=engine)
+    def timed_render(*args):
+        return render(*args)
+
+    store = get_export_store()
+    if store is None:
+        data = render_shared(export_format, title, rendered_content, template_title, timed_render)
+        metrics.EXPORT_FILES.inc(format=export_format, mode='single', result='ok')
+        return export_response(data, export_format, title)
+
+    # Hit : fichier déjà présent ; miss : rendu attendu, même fait par une autre demande
+    artifact, found = store.open_or_render(export_format, title, rendered_content, template_title, timed_render)
+    metrics.EXPORT_CACHE.inc(format=export_format, result='hit' if found else 'miss')
+    metrics.EXPORT_FILES.inc(format=export_format, mode='single', result='ok')
+    return export_response(artifact, export_format, title)
+
+
 # ===============================
 # GESTION DES CATÉGORIES
 # ===============================
@@ -1047,15 +964,14 @@ def template_preview(request, template_id):
     template = get_object_or_404(Template, id=template_id)
 
     # Vérifier les permissions
-    if not template.is_public and template.created_by != request.user:
+    if not template.is_public and template.created_by_id != request.user.id:
         return JsonResponse({'error': 'Accès refusé'}, status=403)
 
     # Remplacer les placeholders par des exemples
-    content = template.content
     fields = template.fields.all()
+    sample_values = {}
 
     for field in fields:
-        placeholder = f'{{{{{field.field_name}}}}}'
         # CORRECTION : Utiliser getattr pour éviter l'erreur AttributeError
         if hasattr(field, 'default_value') and field.default_value:
             example_value = field.default_value
@@ -1072,7 +988,9 @@ def template_preview(request, template_id):
             }
             example_value = examples.get(field.field_type, f'[Exemple {field.field_name}]')
 
-        content = content.replace(placeholder, example_value)
+        sample_values[field.field_name] = example_value
+
+    content = render_template(template, sample_values)
 
     return JsonResponse({
         'content': content,
@@ -1087,7 +1005,7 @@ def template_preview_page(request, template_id):
     template = get_object_or_404(Template, id=template_id)
 
     # Vérifier les permissions
-    if not template.is_public and template.created_by != request.user:
+    if not template.is_public and template.created_by_id != request.user.id:
         messages.error(request, "Vous n'avez pas accès à ce template.")
         return redirect('templates_app:template_list')
 
@@ -1095,12 +1013,9 @@ def template_preview_page(request, template_id):
     fields = template.fields.all().order_by('order', 'field_name')
 
     # Générer le contenu avec des exemples
-    rendered_content = template.content or ""
     preview_data = {}
 
     for field in fields:
-        placeholder = f'{{{{{field.field_name}}}}}'
-
         # Générer une valeur d'exemple
         if hasattr(field, 'default_value') and field.default_value:
             example_value = field.default_value
@@ -1118,37 +1033,33 @@ def template_preview_page(request, template_id):
                 }
                 example_value = examples.get(field.field_type, f'[Exemple {field.field_name}]')
 
-        # Remplacer dans le contenu
-        rendered_content = rendered_content.replace(placeholder, str(example_value))
-
         # Ajouter aux données de preview
         preview_data[field.field_name] = example_value
 
+    # Remplacer dans le contenu en une seule passe
+    with stage('placeholders'):
+        rendered_content = render_template(template, preview_data)
+
     context = {
         'template': template,
         'fields': fields,
         'rendered_content': rendered_content,
         'preview_data': preview_data,
     }
-    return render(request, 'templates_app/template_preview.html', context)
+    with stage('template'):
+        return render(request, 'templates_app/template_preview.html', context)
 
 
 @login_required
 def document_preview(request, document_id):
     """Prévisualiser un document avec ses valeurs actuelles"""
-    document = get_object_or_404(Document, id=document_id, created_by=request.user)
-
-    # Récupérer les valeurs des champs
-    field_values = {}
-    for field_value in document.field_values.all():
-        field_name = field_value.template_field.field_name
-        field_values[field_name] = field_value.value
+    document = get_object_or_404(
+        Document.objects.select_related('template'), id=document_id, created_by=request.user
+    )
 
     # Générer le contenu rendu
-    rendered_content = document.template.content
-    for field_name, field_value in field_values.items():
-        placeholder = f'{{{{{field_name}}}}}'
-        rendered_content = rendered_content.replace(placeholder, str(field_value))
+    with stage('placeholders'):
+        rendered_content, _ = render_document(document)
 
     return JsonResponse({
         'content': rendered_content,
@@ -1166,32 +1077,36 @@ def template_duplicate(request, template_id):
     original_template = get_object_or_404(Template, id=template_id)
 
     # Vérifier les permissions
-    if not original_template.is_public and original_template.created_by != request.user:
+    if not original_template.is_public and original_template.created_by_id != request.user.id:
         messages.error(request, "Vous n'avez pas accès à ce template.")
         return redirect('templates_app:template_list')
 
-    # Créer une copie du template
-    new_template = Template.objects.create(
-        title=f"Copie de {original_template.title}",
-        description=original_template.description,
-        content=original_template.content,
-        category=original_template.category,
-        created_by=request.user,
-        is_public=False  # Les copies sont privées par défaut
-    )
-
-    # Copier les champs
-    for field in original_template.fields.all():
-        TemplateField.objects.create(
-            template=new_template,
-            field_name=field.field_name,
-            field_type=field.field_type,
-            order=field.order,
-            is_required=field.is_required,
-            field_options=field.field_options,
-            placeholder_text=field.placeholder_text
+    with transaction.atomic():
+        # Créer une copie du template
+        new_template = Template.objects.create(
+            title=f"Copie de {original_template.title}",
+            description=original_template.description,
+            content=original_template.content,
+            category_id=original_template.category_id,
+            created_by=request.user,
+            is_public=False  # Les copies sont privées par défaut
         )
 
+        # Copier les champs
+        TemplateField.objects.bulk_create([
+            TemplateField(
+                template=new_template,
+                field_name=field.field_name,
+                field_label=field.field_label,
+                field_type=field.field_type,
+                order=field.order,
+                is_required=field.is_required,
+                field_options=field.field_options,
+                placeholder_text=field.placeholder_text
+            )
+            for field in original_template.fields.all()
+        ])
+
     messages.success(request, f'Template dupliqué avec succès : "{new_template.title}"')
     return redirect('templates_app:template_detail', template_id=new_template.id)
 
@@ -1222,6 +1137,51 @@ def template_delete(request, template_id):
     return render(request, 'templates_app/template_confirm_delete.html', context)
 
 
+# ===============================
+# SUPERVISION
+# ===============================
+
+def metrics_view(request):
+    """Métriques au format texte Prometheus (voir metrics.py)
+
+    Réservé aux membres du staff connectés, ou à un collecteur présentant
+    ``Authorization: Bearer <settings.METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    bearer_ok = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+    if not bearer_ok and not request.user.is_staff:
+        return HttpResponse("Accès refusé\n", status=403, content_type='text/plain; charset=utf-8')
+
+    return HttpResponse(metrics.REGISTRY.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile_list(request):
+    """Page d'administration : rapports de profilage récents et jetons de déclenchement"""
+    context = dict(
+        admin.site.each_context(request),
+        title='Profils de requêtes',
+        reports=profiling.list_reports(),
+        cpu_token=profiling.make_token(request.user),
+        memory_token=profiling.make_token(request.user, memory=True),
+        profile_param=profiling.PROFILE_PARAM,
+        token_max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', profiling.DEFAULT_TOKEN_MAX_AGE) // 60,
+    )
+    return render(request, 'templates_app/admin_profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, filename):
+    """Résumé (.txt, affiché) ou statistiques brutes (.pstats, téléchargées) d'un profil"""
+    path = profiling.report_path(filename)
+    if path is None:
+        raise Http404("Rapport de profilage introuvable.")
+    if filename.endswith('.txt'):
+        return FileResponse(open(path, 'rb'), content_type='text/plain; charset=utf-8')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
 # ===============================
 # GESTION DES ERREURS
 # ===============================
@@ -1252,22 +1212,19 @@ def search_global(request):
             'documents': [],
         })
 
-    # Recherche dans les templates
-    templates = Template.objects.filter(
-        Q(created_by=request.user) | Q(is_public=True)
-    ).filter(
-        Q(title__icontains=query) |
-        Q(description__icontains=query) |
-        Q(content__icontains=query)
-    ).order_by('-created_at')[:10]
+    # Recherche dans les templates (index plein texte, par pertinence)
+    templates = search_templates(
+        visible_templates(request.user), query
+    )[:10]
 
     # Recherche dans les documents
-    documents = Document.objects.filter(
-        created_by=request.user
-    ).filter(
-        Q(title__icontains=query) |
-        Q(template__title__icontains=query)
-    ).order_by('-updated_at')[:10]
+    documents = search_documents(
+        Document.objects.filter(created_by=request.user).select_related('template'), query
+    )[:10]
+
+    templates, documents = list(templates), list(documents)
+    add_search_highlights(templates)
+    add_search_highlights(documents)
 
     context = {
         'query': query,
@@ -1279,80 +1236,23 @@ def search_global(request):
 
 @login_required
 def dashboard_view(request):
-    """Tableau de bord utilisateur avec statistiques détaillées - CORRIGÉ"""
+    """Tableau de bord utilisateur avec statistiques détaillées"""
     user = request.user
 
-    # Récupérer les objets de l'utilisateur
-    user_templates = Template.objects.filter(created_by=user)
-    user_documents = Document.objects.filter(created_by=user)
-
-    # Statistiques générales - CORRECTION: utiliser is_completed
-    stats = {
-        'total_templates': user_templates.count(),
-        'public_templates': user_templates.filter(is_public=True).count(),
-        'private_templates': user_templates.filter(is_public=False).count(),
-        'total_documents': user_documents.count(),
-        'completed_documents': user_documents.filter(is_completed=True).count(),  # CORRIGÉ
-        'draft_documents': user_documents.filter(is_completed=False).count(),  # CORRIGÉ
-    }
-
-    # Activité récente (7 derniers jours)
-    week_ago = timezone.now() - timedelta(days=7)
-    stats['recent_templates'] = user_templates.filter(created_at__gte=week_ago).count()
-    stats['recent_documents'] = user_documents.filter(created_at__gte=week_ago).count()
+    # Indicateurs, catégories et progression mensuelle : nombre de requêtes constant
+    dashboard = dashboard_stats(user)
+    stats = dashboard['stats']
 
     # Activité récente détaillée
+    user_templates = Template.objects.filter(created_by=user)
     recent_templates = user_templates.order_by('-created_at')[:5]
-    recent_documents = user_documents.order_by('-updated_at')[:5]
+    recent_documents = Document.objects.filter(created_by=user).order_by('-updated_at')[:5]
 
     # Templates les plus utilisés
-    template_usage = user_templates.annotate(
+    template_usage = user_templates.select_related('category').annotate(
         doc_count=Count('documents')
     ).order_by('-doc_count')[:5]
 
-    # Statistiques par catégorie
-    categories_stats = []
-    if TemplateCategory.objects.exists():
-        for category in TemplateCategory.objects.all():
-            category_templates = user_templates.filter(category=category)
-            if category_templates.exists():
-                categories_stats.append({
-                    'category': category,
-                    'count': category_templates.count(),
-                    'color': category.color,
-                })
-
-    # Templates sans catégorie
-    uncategorized_count = user_templates.filter(category__isnull=True).count()
-    if uncategorized_count > 0:
-        categories_stats.append({
-            'category': {'name': 'Sans catégorie', 'color': '#6c757d'},
-            'count': uncategorized_count,
-            'color': '#6c757d',
-        })
-
-    # Progression mensuelle (derniers 6 mois)
-    monthly_stats = []
-    for i in range(6):
-        month_start = timezone.now().replace(day=1) - timedelta(days=30 * i)
-        month_end = month_start + timedelta(days=31)
-
-        templates_count = user_templates.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-
-        documents_count = user_documents.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-
-        monthly_stats.insert(0, {
-            'month': month_start.strftime('%B'),
-            'templates': templates_count,
-            'documents': documents_count,
-        })
-
     # Suggestions d'amélioration
     suggestions = []
     if stats['total_templates'] == 0:
@@ -1389,8 +1289,8 @@ def dashboard_view(request):
         'recent_templates': recent_templates,
         'recent_documents': recent_documents,
         'template_usage': template_usage,
-        'categories_stats': categories_stats,
-        'monthly_stats': monthly_stats,
+        'categories_stats': dashboard['categories_stats'],
+        'monthly_stats': dashboard['monthly_stats'],
         'suggestions': suggestions,
         'user': user,
     }
@@ -1402,6 +1302,33 @@ def dashboard_view(request):
 # FONCTIONS UTILITAIRES
 # ===============================
 
+def add_document_counts(templates):
+    """Nombre de documents de chaque template (``document_count``), en une requête"""
+    templates = list(templates)
+    counts = dict(
+        Document.objects.filter(template_id__in=[template.pk for template in templates])
+        .order_by().values('template_id').annotate(count=Count('id'))
+        .values_list('template_id', 'count')
+    )
+    for template in templates:
+        template.document_count = counts.get(template.pk, 0)
+
+
+def document_count_subquery():
+    """Nombre de documents du template, en sous-requête corrélée (pour ``annotate``)"""
+    counts = (
+        Document.objects.filter(template=OuterRef('pk'))
+        .order_by().values('template').annotate(count=Count('id')).values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def add_search_highlights(results):
+    """Extrait HTML (termes trouvés surlignés) des résultats d'une recherche"""
+    for result in results:
+        result.search_highlight = highlight(getattr(result, 'search_snippet', None))
+
+
 def extract_fields_from_content(content):
     """Extraire les champs dynamiques du contenu du template"""
     if not content:
@@ -1519,7 +1446,7 @@ def template_export(request, template_id):
     template = get_object_or_404(Template, id=template_id)
 
     # Vérifier les permissions
-    if not template.is_public and template.created_by != request.user:
+    if not template.is_public and template.created_by_id != request.user.id:
         messages.error(request, "Vous n'avez pas accès à ce template.")
         return redirect('templates_app:template_list')
 
@@ -1560,127 +1487,6 @@ def template_delete_field(request, template_id, field_id):
     return render(request, 'templates_app/template_field_confirm_delete.html', context)
 
 
-@login_required
-def dashboard_view(request):
-    """Tableau de bord utilisateur avec statistiques détaillées"""
-    user = request.user
-
-    # Récupérer les objets de l'utilisateur
-    user_templates = Template.objects.filter(created_by=user)
-    user_documents = Document.objects.filter(created_by=user)
-
-    # Statistiques générales
-    stats = {
-        'total_templates': user_templates.count(),
-        'public_templates': user_templates.filter(is_public=True).count(),
-        'private_templates': user_templates.filter(is_public=False).count(),
-        'total_documents': user_documents.count(),
-        'completed_documents': user_documents.filter(is_completed=True).count(),
-        'draft_documents': user_documents.filter(is_completed=False).count(),
-    }
-
-    # Activité récente (7 derniers jours)
-    week_ago = timezone.now() - timedelta(days=7)
-    stats['recent_templates'] = user_templates.filter(created_at__gte=week_ago).count()
-    stats['recent_documents'] = user_documents.filter(created_at__gte=week_ago).count()
-
-    # Activité récente détaillée
-    recent_templates = user_templates.order_by('-created_at')[:5]
-    recent_documents = user_documents.order_by('-updated_at')[:5]
-
-    # Templates les plus utilisés
-    template_usage = user_templates.annotate(
-        doc_count=Count('documents')
-    ).order_by('-doc_count')[:5]
-
-    # Statistiques par catégorie
-    categories_stats = []
-    if TemplateCategory.objects.exists():
-        for category in TemplateCategory.objects.all():
-            category_templates = user_templates.filter(category=category)
-            if category_templates.exists():
-                categories_stats.append({
-                    'category': category,
-                    'count': category_templates.count(),
-                    'color': category.color,
-                })
-
-    # Templates sans catégorie
-    uncategorized_count = user_templates.filter(category__isnull=True).count()
-    if uncategorized_count > 0:
-        categories_stats.append({
-            'category': {'name': 'Sans catégorie', 'color': '#6c757d'},
-            'count': uncategorized_count,
-            'color': '#6c757d',
-        })
-
-    # Progression mensuelle (derniers 6 mois)
-    monthly_stats = []
-    for i in range(6):
-        month_start = timezone.now().replace(day=1) - timedelta(days=30 * i)
-        month_end = month_start + timedelta(days=31)
-
-        templates_count = user_templates.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-
-        documents_count = user_documents.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-
-        monthly_stats.insert(0, {
-            'month': month_start.strftime('%B'),
-            'templates': templates_count,
-            'documents': documents_count,
-        })
-
-    # Suggestions d'amélioration
-    suggestions = []
-    if stats['total_templates'] == 0:
-        suggestions.append({
-            'type': 'info',
-            'title': 'Créez votre premier template',
-            'message': 'Commencez par créer un template pour vos documents récurrents.',
-            'action_url': reverse('templates_app:template_create'),
-            'action_text': 'Créer un template',
-            'icon': 'fas fa-plus'
-        })
-    elif stats['public_templates'] == 0 and stats['total_templates'] > 0:
-        suggestions.append({
-            'type': 'success',
-            'title': 'Partagez vos templates',
-            'message': 'Rendez vos templates publics pour que d\'autres utilisateurs puissent en bénéficier.',
-            'action_url': reverse('templates_app:template_list'),
-            'action_text': 'Voir mes templates',
-            'icon': 'fas fa-share'
-        })
-
-    if stats['draft_documents'] > stats['completed_documents'] and stats['draft_documents'] > 0:
-        suggestions.append({
-            'type': 'warning',
-            'title': 'Finalisez vos brouillons',
-            'message': f'Vous avez {stats["draft_documents"]} documents en brouillon qui attendent d\'être finalisés.',
-            'action_url': reverse('templates_app:document_list') + '?status=draft',
-            'action_text': 'Voir les brouillons',
-            'icon': 'fas fa-clock'
-        })
-
-    context = {
-        'stats': stats,
-        'recent_templates': recent_templates,
-        'recent_documents': recent_documents,
-        'template_usage': template_usage,
-        'categories_stats': categories_stats,
-        'monthly_stats': monthly_stats,
-        'suggestions': suggestions,
-        'user': user,
-    }
-
-    return render(request, 'templates_app/dashboard.html', context)
-
-
 def complete_tutorial(request):
     """Marquer le tutoriel comme terminé (AJAX)"""
     if request.method == 'POST':